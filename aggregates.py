@@ -0,0 +1,257 @@
+import io
+import numpy as np
+import pandas as pd
+
+import kernel
+import schema
+import fraud_rules
+import topk
+import traffic
+import anomaly
+
+FRAUD_PREVIEW_ROWS = 5
+TOP_FRAUD_ROWS = 5
+TOP_FRAUD_RANK = 'anomaly'
+TOP_ANOMALY_RANK = 'zscore'
+TOP_ANOMALY_CANDIDATES = 50  # kept by their one-pass score, re-scored against the final baseline for the report
+
+
+def mask_chunk(df):
+    """
+    Same rules as main.clean_data, result in the compact schema; returns
+    (df, valid, na_removed, duration_removed). A chunk that is already compact
+    (a mapped .tlog store) is not filtered: `valid` marks the clean rows and the
+    columns stay views of the map. Any other chunk is parsed data anyway, its
+    dirty rows are dropped before compacting and `valid` is None.
+    """
+    df = schema.normalize_columns(df)
+    valid = df.notna().all(axis=1).to_numpy()
+    na_removed = len(df) - int(np.count_nonzero(valid))
+    positive = (df['Duration'] > 0).to_numpy()
+    duration_removed = int(np.count_nonzero(valid & ~positive))
+    if not na_removed and not duration_removed:
+        return schema.compact_frame(df), None, 0, 0
+    valid = valid & positive
+    if schema.is_compact(df):
+        return df, valid, na_removed, duration_removed
+    return schema.compact_frame(df[valid]), None, na_removed, duration_removed
+
+
+def clean_chunk(df):
+    """mask_chunk with the dirty rows dropped; returns (clean_df, na_removed, duration_removed)."""
+    df, valid, na_removed, duration_removed = mask_chunk(df)
+    return (df if valid is None else df[valid]), na_removed, duration_removed
+
+
+def with_dates(df):
+    """The clean chunk with Date parsed (CSV ranges are read without parse_dates)."""
+    if pd.api.types.is_datetime64_any_dtype(df['Date']):
+        return df
+    return df.assign(Date=schema.parse_dates(df['Date']))
+
+
+def anomalous_rows(df, scores, threshold):
+    """Rows of a clean chunk scored above `threshold`, with their score in anomaly.SCORE_COLUMN."""
+    flagged = scores > threshold
+    return df[flagged].assign(**{anomaly.SCORE_COLUMN: scores[flagged]})
+
+
+def hourly_series(hour_counts):
+    """24-bucket histogram -> Series shaped like df.groupby('Hour').size() (empty hours omitted)."""
+    hours = np.flatnonzero(hour_counts)
+    return pd.Series(hour_counts[hours], index=pd.Index(hours, name='Hour'))
+
+
+class ReportAggregate:
+    """
+    Running state of every main.py report, fed one chunk at a time.
+    Memory use is independent of the number of rows: only counters, the
+    24-bucket hour histogram and the first few fraud rows are kept.
+    """
+
+    def __init__(self, rules=None, approx=None, traffic=None, anomaly=None):
+        self.rules = rules or fraud_rules.load_rules()
+        self.approx = approx  # optional sketches.ApproxSummary, fed with every clean chunk
+        self.traffic = traffic  # optional traffic.TrafficBins (busy hour / Erlangs), likewise
+        self.anomaly = anomaly  # optional anomaly.AnomalyScorer; scores every clean chunk as it is added
+        self.rows_read = 0
+        self.na_removed = 0
+        self.duration_removed = 0
+        self.clean_rows = 0
+        self.usage_sum = {}
+        self.intl_sum = 0.0
+        self.intl_count = 0
+        self.hour_counts = np.zeros(24, dtype=np.int64)
+        self.segment_counts = {}
+        self.fraud_count = 0
+        self.rule_hits = dict.fromkeys(self.rules.rule_names, 0)
+        self.fraud_preview = None
+        self.top_fraud = topk.TopK(TOP_FRAUD_ROWS, TOP_FRAUD_RANK)
+        self.anomaly_count = 0
+        self.top_anomalies = topk.TopK(TOP_ANOMALY_CANDIDATES, TOP_ANOMALY_RANK)
+
+    def update(self, chunk):
+        """
+        Folds a raw (uncleaned) chunk into the state; returns (chunk, fraud_rows), the
+        chunk in the compact schema with its dirty rows dropped or masked (see mask_chunk).
+        """
+        self.rows_read += len(chunk)
+        df, valid, na_removed, duration_removed = mask_chunk(chunk)
+        self.na_removed += na_removed
+        self.duration_removed += duration_removed
+        self.clean_rows += len(df) if valid is None else int(np.count_nonzero(valid))
+
+        df = with_dates(df)
+        fraud_mask, hits = self.rules.evaluate(df, valid)
+        result = kernel.analyze_frame(df, fraud_mask, valid)
+        for name, count in hits.items():
+            self.rule_hits[name] += count
+
+        # only the types present in the chunk, like groupby(observed=True) (the schema fixes all categories)
+        for call_type, total, calls in zip(result.categories, result.usage_by_type, result.calls_by_type):
+            if calls:
+                self.usage_sum[call_type] = self.usage_sum.get(call_type, 0.0) + total
+        self.intl_sum += kernel.type_total(result, 'International')
+        self.intl_count += int(kernel.type_total(result, 'International', 'calls_by_type'))
+        self.hour_counts += result.hour_counts
+        for label, count in zip(kernel.SEGMENT_CODES, result.segment_counts):
+            if count:
+                self.segment_counts[label] = self.segment_counts.get(label, 0) + int(count)
+
+        fraud = df[result.fraud_mask]
+        self.fraud_count += len(fraud)
+        if self.fraud_preview is None:
+            self.fraud_preview = fraud.head(FRAUD_PREVIEW_ROWS)
+        elif len(self.fraud_preview) < FRAUD_PREVIEW_ROWS:
+            self.fraud_preview = pd.concat([self.fraud_preview, fraud]).head(FRAUD_PREVIEW_ROWS)
+        self.top_fraud.update(fraud)
+        if self.approx is not None:
+            self.approx.update(df, valid)
+        if self.traffic is not None:
+            self.traffic.update(df, valid)
+        if self.anomaly is not None:
+            anomalies = anomalous_rows(df, self.anomaly.update(df, valid), self.anomaly.threshold)
+            self.anomaly_count += len(anomalies)
+            self.top_anomalies.update(anomalies)
+        return df, fraud
+
+    def anomaly_table(self, rows=TOP_FRAUD_ROWS):
+        """
+        The `rows` strongest anomalies. Each chunk (or parallel range) was scored in the
+        same pass against the statistics seen so far; the kept candidates are re-scored
+        here against the final baseline, so the table does not depend on how the input
+        was split. anomaly_count stays the one-pass count.
+        """
+        candidates = self.top_anomalies.to_frame()
+        if not len(candidates):
+            return candidates
+        candidates = candidates.sort_index()  # ties go to the earlier row, as in TopK
+        candidates[anomaly.SCORE_COLUMN] = self.anomaly.score(candidates)
+        candidates = candidates[candidates[anomaly.SCORE_COLUMN] > self.anomaly.threshold]
+        return topk.top_k(candidates, rows, TOP_ANOMALY_RANK)
+
+    def shift_index(self, offset):
+        """
+        Renumbers the kept rows (fraud preview, top-K tables) as if the chunk had
+        started at row `offset` of the input; for ranges parsed with their own RangeIndex.
+        """
+        if self.fraud_preview is not None:
+            self.fraud_preview = self.fraud_preview.set_axis(self.fraud_preview.index + offset)
+        self.top_fraud.shift_index(offset)
+        self.top_anomalies.shift_index(offset)
+        return self
+
+    def merge(self, other):
+        """Adds another partial state (e.g. from a parallel worker) that covers the rows after this one."""
+        self.rows_read += other.rows_read
+        self.na_removed += other.na_removed
+        self.duration_removed += other.duration_removed
+        self.clean_rows += other.clean_rows
+        for call_type, total in other.usage_sum.items():
+            self.usage_sum[call_type] = self.usage_sum.get(call_type, 0.0) + total
+        self.intl_sum += other.intl_sum
+        self.intl_count += other.intl_count
+        self.hour_counts += other.hour_counts
+        for label, count in other.segment_counts.items():
+            self.segment_counts[label] = self.segment_counts.get(label, 0) + count
+        self.fraud_count += other.fraud_count
+        for name, count in other.rule_hits.items():
+            self.rule_hits[name] = self.rule_hits.get(name, 0) + count
+        if other.fraud_preview is not None:
+            previews = [p for p in (self.fraud_preview, other.fraud_preview) if p is not None]
+            self.fraud_preview = pd.concat(previews).head(FRAUD_PREVIEW_ROWS)
+        self.top_fraud.merge(other.top_fraud)
+        if self.approx is not None and other.approx is not None:
+            self.approx.merge(other.approx)
+        if self.traffic is not None and other.traffic is not None:
+            self.traffic.merge(other.traffic)
+        if self.anomaly is not None and other.anomaly is not None:
+            self.anomaly.merge(other.anomaly)
+        self.anomaly_count += other.anomaly_count
+        self.top_anomalies.merge(other.top_anomalies)
+        return self
+
+    def to_dict(self, traffic_days=True):
+        """JSON-serialisable snapshot of the state (see from_dict); traffic_days=False leaves out the traffic arrays."""
+        preview = self.fraud_preview
+        return {
+            'rows_read': self.rows_read,
+            'na_removed': self.na_removed,
+            'duration_removed': self.duration_removed,
+            'clean_rows': self.clean_rows,
+            'usage_sum': {str(k): float(v) for k, v in self.usage_sum.items()},
+            'intl_sum': float(self.intl_sum),
+            'intl_count': self.intl_count,
+            'hour_counts': self.hour_counts.tolist(),
+            'segment_counts': dict(self.segment_counts),
+            'fraud_count': self.fraud_count,
+            'rule_profile': self.rules.name,
+            'rule_hits': dict(self.rule_hits),
+            'fraud_preview': None if preview is None else preview.to_csv(index=True),
+            'top_fraud': self.top_fraud.to_dict(),
+            'traffic': None if self.traffic is None else self.traffic.to_dict(days=traffic_days),
+            'anomaly': None if self.anomaly is None else self.anomaly.to_dict(),
+            'anomaly_count': self.anomaly_count,
+            'top_anomalies': self.top_anomalies.to_dict(),
+        }
+
+    @classmethod
+    def from_dict(cls, data):
+        state = cls(fraud_rules.load_rules(data.get('rule_profile', fraud_rules.DEFAULT_PROFILE)))
+        for name in ('rows_read', 'na_removed', 'duration_removed', 'clean_rows',
+                     'intl_sum', 'intl_count', 'fraud_count'):
+            setattr(state, name, data[name])
+        state.usage_sum = dict(data['usage_sum'])
+        state.hour_counts = np.asarray(data['hour_counts'], dtype=np.int64)
+        state.segment_counts = dict(data['segment_counts'])
+        state.rule_hits.update(data.get('rule_hits', {}))
+        if data['fraud_preview'] is not None:
+            preview = pd.read_csv(io.StringIO(data['fraud_preview']), index_col=0, parse_dates=['Date'])
+            state.fraud_preview = schema.compact_frame(preview)
+        if data.get('top_fraud') is not None:
+            state.top_fraud = topk.TopK.from_dict(data['top_fraud'])
+        if data.get('traffic') is not None:
+            state.traffic = traffic.TrafficBins.from_dict(data['traffic'])
+        if data.get('anomaly') is not None:
+            state.anomaly = anomaly.AnomalyScorer.from_dict(data['anomaly'])
+            state.anomaly_count = data['anomaly_count']
+            state.top_anomalies = topk.TopK.from_dict(data['top_anomalies'])
+        return state
+
+    # --- Report views (same shapes as the pandas results in main.py) ---
+
+    def intl_average(self):
+        return self.intl_sum / self.intl_count if self.intl_count else float('nan')
+
+    def usage_summary(self):
+        summary = pd.Series(self.usage_sum, name='Data_Usage', dtype='float64').sort_index()
+        summary.index.name = 'Call_Type'
+        return summary
+
+    def hourly_traffic(self):
+        return hourly_series(self.hour_counts)
+
+    def segment_summary(self):
+        counts = pd.Series(self.segment_counts, name='count', dtype='int64').sort_values(ascending=False)
+        counts.index.name = 'Segment'
+        return counts
@@ -0,0 +1,202 @@
+"""
+Streaming anomaly scoring against per-Call_Type / per-hour baselines.
+
+    scorer = anomaly.AnomalyScorer()
+    for chunk in chunks:                            # or once, over an in-memory frame
+        scores = scorer.update(chunk)               # statistics updated, then the chunk scored
+        flagged = chunk[scores > scorer.threshold]
+
+For every (Call_Type, hour of day) group and measure (Duration, Data_Usage)
+the scorer keeps:
+  - count, mean and M2 (Welford). A chunk is folded in with the pairwise
+    update of Chan et al., from one set of bincounts over its rows.
+  - a sketches.QuantileSketch, for the approximate median and quartiles.
+    The MAD is estimated as (Q3 - Q1) / 2. That is exact for symmetric
+    distributions, and the true MAD would need a second pass.
+All of it merges, so parallel workers and incremental states combine like
+the other aggregates.
+
+A row's score is its largest robust z-score over the measures:
+0.6745 x (x - median) / MAD (the Iglewicz-Hoaglin modified z-score). Only
+values above the baseline count. Where the MAD is 0 the Welford z-score
+(x - mean) / std is used. Groups with fewer than MIN_COUNT rows score 0.
+Rows are scored right after their chunk has been added, so a chunk is judged
+against everything seen so far, itself included, in the same pass as the
+other analyses: there is no second scan. An in-memory frame is one chunk and
+is scored against its full baseline; a parallel range is scored against its
+own statistics, which are then merged. The anomaly count therefore depends on
+how the input was chunked; ReportAggregate.anomaly_table() re-scores the
+kept top candidates against the final baseline with score(), which does not
+update it.
+"""
+import numpy as np
+import pandas as pd
+
+import kernel
+import sketches
+
+MEASURES = ['Duration', 'Data_Usage']
+SCORE_COLUMN = 'Z_Score'
+DEFAULT_THRESHOLD = 3.5  # Iglewicz & Hoaglin's cut-off for the modified z-score
+MIN_COUNT = 30  # rows a group needs before its rows are scored
+MAD_SCALE = 0.6745  # MAD of the standard normal distribution
+SKETCH_ACCURACY = 0.02
+
+
+class AnomalyScorer:
+    def __init__(self, threshold=DEFAULT_THRESHOLD, relative_accuracy=SKETCH_ACCURACY):
+        self.threshold = threshold
+        self.relative_accuracy = relative_accuracy
+        self.call_types = []
+        self.count = np.zeros(0, dtype=np.int64)  # per group: call type x 24 + hour
+        self.mean = {measure: np.zeros(0) for measure in MEASURES}
+        self.m2 = {measure: np.zeros(0) for measure in MEASURES}
+        self.sketches = {measure: sketches.QuantileSketch(relative_accuracy, 0) for measure in MEASURES}
+
+    @property
+    def groups(self):
+        return len(self.count)
+
+    def _resize(self):
+        groups = len(self.call_types) * 24
+        extra = groups - self.groups
+        if extra <= 0:
+            return
+        self.count = np.concatenate([self.count, np.zeros(extra, dtype=np.int64)])
+        for measure in MEASURES:
+            self.mean[measure] = np.concatenate([self.mean[measure], np.zeros(extra)])
+            self.m2[measure] = np.concatenate([self.m2[measure], np.zeros(extra)])
+            self.sketches[measure].resize(groups)
+
+    def _row(self, label):
+        if label not in self.call_types:
+            self.call_types.append(label)
+        return self.call_types.index(label)
+
+    def _groups(self, df):
+        """Group number of every row (Call_Type x 24 + hour), registering unseen labels."""
+        call_types = df['Call_Type']
+        if not isinstance(call_types.dtype, pd.CategoricalDtype):
+            call_types = call_types.astype('category')
+        lookup = np.asarray([self._row(label) for label in call_types.cat.categories], dtype=np.int64)
+        self._resize()
+        return lookup[call_types.cat.codes.to_numpy()] * 24 + kernel.hour_of(df['Date'])
+
+    def _combine(self, measure, count, mean, m2):
+        """Chan et al.'s pairwise update: adds groups with (count, mean, M2) to the running statistics."""
+        total = self.count + count
+        safe = np.maximum(total, 1)
+        delta = mean - self.mean[measure]
+        self.mean[measure] = self.mean[measure] + delta * count / safe
+        self.m2[measure] = self.m2[measure] + m2 + delta ** 2 * self.count * count / safe
+
+    def update(self, df, valid=None):
+        """
+        Folds a cleaned frame (Date, Duration, Data_Usage, Call_Type) into the
+        statistics and returns the anomaly score of each of its rows. With a
+        `valid` mask only those rows are folded in; the others score 0.
+        """
+        if not len(df):
+            return np.zeros(0)
+        groups = kernel.masked(self._groups(df), valid)
+        count = np.bincount(groups, minlength=self.groups)
+        values = {}
+        for measure in MEASURES:
+            x = values[measure] = kernel.masked(df[measure], valid).astype(np.float64)
+            mean = np.bincount(groups, weights=x, minlength=self.groups) / np.maximum(count, 1)
+            m2 = np.bincount(groups, weights=(x - mean[groups]) ** 2, minlength=self.groups)
+            self._combine(measure, count, mean, m2)
+            self.sketches[measure].add(x, groups)
+        self.count += count
+        if valid is None:
+            return self._score(groups, values)
+        score = np.zeros(len(df))
+        score[valid] = self._score(groups, values)
+        return score
+
+    def score(self, df):
+        """Anomaly scores of a cleaned frame against the current baseline (the statistics are not updated)."""
+        if not len(df):
+            return np.zeros(0)
+        groups = self._groups(df)
+        return self._score(groups, {measure: df[measure].to_numpy(dtype=np.float64) for measure in MEASURES})
+
+    def _score(self, groups, values):
+        score = np.zeros(len(groups))
+        for measure in MEASURES:
+            median, spread, mean, std = (array[groups] for array in self._baseline(measure))
+            robust = np.divide(MAD_SCALE * (values[measure] - median), spread,
+                               out=np.zeros(len(groups)), where=spread > 0)
+            classic = np.divide(values[measure] - mean, std, out=np.zeros(len(groups)), where=std > 0)
+            score = np.maximum(score, np.where(spread > 0, robust, classic))
+        score[self.count[groups] < MIN_COUNT] = 0.0
+        return score
+
+    def _baseline(self, measure):
+        """Per group: median, MAD estimate, mean and standard deviation of `measure`."""
+        q1, median, q3 = self.sketches[measure].quantile_table([0.25, 0.5, 0.75]).T
+        mad = np.nan_to_num((q3 - q1) / 2)
+        std = np.sqrt(self.m2[measure] / np.maximum(self.count - 1, 1))
+        return np.nan_to_num(median), mad, self.mean[measure], std
+
+    def merge(self, other):
+        """Adds another scorer's statistics (e.g. from a parallel worker)."""
+        rows = [self._row(label) for label in other.call_types]
+        self._resize()
+        index = (np.asarray(rows, dtype=np.int64)[:, None] * 24 + np.arange(24)).ravel()
+        count = np.zeros(self.groups, dtype=np.int64)
+        count[index] = other.count
+        for measure in MEASURES:
+            mean, m2 = np.zeros(self.groups), np.zeros(self.groups)
+            mean[index], m2[index] = other.mean[measure], other.m2[measure]
+            self._combine(measure, count, mean, m2)
+            remapped = sketches.QuantileSketch(other.relative_accuracy, self.groups)
+            remapped.counts[index] = other.sketches[measure].counts
+            self.sketches[measure].merge(remapped)
+        self.count += count
+        return self
+
+    def baseline(self):
+        """Per Call_Type and hour: rows, then mean / std / median / MAD of each measure."""
+        columns = {'count': self.count}
+        for measure in MEASURES:
+            median, mad, mean, std = self._baseline(measure)
+            columns.update({f'{measure}_mean': mean, f'{measure}_std': std,
+                            f'{measure}_median': median, f'{measure}_mad': mad})
+        index = pd.MultiIndex.from_product([self.call_types, range(24)], names=['Call_Type', 'Hour'])
+        table = pd.DataFrame(columns, index=index)
+        return table[table['count'] > 0]
+
+    def describe(self):
+        return (f"robust z-score > {self.threshold:g} over the Call_Type/hour baseline "
+                f"(median, MAD ≈ IQR/2; groups with < {MIN_COUNT} rows not scored)")
+
+    def to_dict(self):
+        """JSON-serialisable snapshot (see from_dict)."""
+        return {
+            'threshold': self.threshold,
+            'relative_accuracy': self.relative_accuracy,
+            'call_types': [str(label) for label in self.call_types],
+            'count': self.count.tolist(),
+            'mean': {measure: values.tolist() for measure, values in self.mean.items()},
+            'm2': {measure: values.tolist() for measure, values in self.m2.items()},
+            'sketches': {measure: sketch.counts.tolist() for measure, sketch in self.sketches.items()},
+        }
+
+    @classmethod
+    def from_dict(cls, data):
+        scorer = cls(data['threshold'], data['relative_accuracy'])
+        scorer.call_types = list(data['call_types'])
+        scorer.count = np.asarray(data['count'], dtype=np.int64)
+        for measure in MEASURES:
+            scorer.mean[measure] = np.asarray(data['mean'][measure], dtype=np.float64)
+            scorer.m2[measure] = np.asarray(data['m2'][measure], dtype=np.float64)
+            counts = np.asarray(data['sketches'][measure], dtype=np.int64)
+            scorer.sketches[measure].counts = counts.reshape(-1, scorer.sketches[measure].buckets)
+        return scorer
+
+
+def score_frame(df, threshold=DEFAULT_THRESHOLD, valid=None):
+    """(scores, scorer) of an in-memory cleaned frame: one update over all of it (or its `valid` rows)."""
+    scorer = AnomalyScorer(threshold)
+    return scorer.update(df, valid), scorer
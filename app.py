@@ -1,10 +1,18 @@
 import streamlit as st
 import pandas as pd
 import numpy as np
-import matplotlib.pyplot as plt
-import matplotlib.ticker as mticker
-import matplotlib.patheffects as path_effects
-from datetime import datetime, timedelta
+import os
+import csv
+import schema
+import aggregates
+import data_generator
+import partition
+import topk
+import fraud_rules
+import anomaly
+import instrumentation
+import charts
+import export
 
 # --- 1. CONFIGURATION & SETUP ---
 st.set_page_config(page_title="Telecom Log Analyzer", layout="wide", page_icon="📡")
@@ -25,178 +33,232 @@ st.markdown("""
 
 # --- 2. HELPER FUNCTIONS ---
 
-@st.cache_data
 def generate_random_data():
-    """Generates demo data if no file is uploaded."""
-    # Generate dates for the last 30 days
-    end_date = datetime.now()
-    start_date = end_date - timedelta(days=30)
-
-    # 200,000 records
-    num_records = 200000
-
-    # Random timestamps
-    start_ts = start_date.timestamp()
-    end_ts = end_date.timestamp()
-    random_timestamps = np.random.uniform(start_ts, end_ts, num_records)
-    dates = pd.to_datetime(random_timestamps, unit='s')
-
-    # Random attributes
-    types = ['Internal', 'International', 'Roaming', 'Emergency']
-    call_types = np.random.choice(types, size=num_records, p=[0.60, 0.30, 0.05, 0.05])
-    durations = np.random.randint(10, 3600, size=num_records)
-    usage_raw = np.random.uniform(5, 500, num_records)
-    zero_mask = np.random.random(num_records) < 0.3
-    data_usage = np.where(zero_mask, 0.0, usage_raw)
-
-    return pd.DataFrame({
-        'Date': dates,
-        'Duration': durations,
-        'Data_Usage': np.round(data_usage, 2),
-        'Call_Type': call_types
-    })
-
-
-def load_data(uploaded_file):
-    """Loads, validates, and cleans user uploaded CSV."""
-    try:
-        df = pd.read_csv(uploaded_file)
+    """Generates demo data if no file is uploaded (200,000 records over the last 30 days, no noise)."""
+    return schema.compact_frame(data_generator.generate_dataframe(200000, noise=False))
+
 
-        # 1. Check Columns
-        required_cols = {'Date', 'Duration', 'Data_Usage', 'Call_Type'}
-        if not required_cols.issubset(df.columns):
-            return None, f"Missing columns! File must contain: {', '.join(required_cols)}"
+# Uploads are parsed this many rows at a time; the cleaned, compacted result must fit the budget
+UPLOAD_CHUNK_ROWS = 250000
+UPLOAD_MEMORY_BUDGET_MB = float(os.environ.get("TELECOM_UPLOAD_BUDGET_MB", 1024))
+HEADER_PROBE_BYTES = 64 * 1024
 
-        # 2. Data Cleaning (Similar to main.py logic)
-        # Drop empty rows
-        df = df.dropna()
 
-        # Filter negative/zero duration (Logic from main.py)
-        df = df[df['Duration'] > 0]
+def read_header(uploaded_file):
+    """Column names from the first line of the upload, without parsing the rest of the file."""
+    head = uploaded_file.read(HEADER_PROBE_BYTES)
+    uploaded_file.seek(0)
+    first_line = head.split(b'\n', 1)[0].decode('utf-8-sig', errors='replace').strip()
+    return next(csv.reader([first_line]), [])
 
-        # 3. Type Conversion
-        df['Date'] = pd.to_datetime(df['Date'])
 
-        return df, None
+def load_data(uploaded_file, budget_mb=UPLOAD_MEMORY_BUDGET_MB):
+    """
+    Loads, validates, and cleans user uploaded CSV. The header is checked before
+    any parsing; rows are then read in chunks, each cleaned and compacted on its
+    own (progress bar), and loading stops once the cleaned data exceeds `budget_mb`.
+    """
+    try:
+        # 1. Check Columns from the first bytes (aliases such as Duration_Seconds / Data_Usage_MB are accepted)
+        header = read_header(uploaded_file)
+        missing = schema.missing_columns(header)
+        if missing:
+            return None, f"Missing columns! File must contain: {', '.join(missing)}"
+
+        total_bytes = max(getattr(uploaded_file, 'size', 0), 1)
+        progress = st.progress(0.0, text="Parsing upload...")
+        chunks, rows, used_bytes = [], 0, 0
+        reader = pd.read_csv(uploaded_file, chunksize=UPLOAD_CHUNK_ROWS,
+                             usecols=lambda name: schema.canonical_name(name) in schema.REQUIRED_COLUMNS)
+        for chunk in reader:
+            # 2. Data Cleaning per chunk (same rules as main.py: dropna, Duration > 0, compact schema)
+            df, _, _ = aggregates.clean_chunk(chunk)
+            # 3. Type Conversion (sniffed date format)
+            df = df.assign(Date=schema.parse_dates(df['Date']))
+
+            used_bytes += df.memory_usage(deep=True, index=True).sum()
+            if used_bytes > budget_mb * 1024 ** 2:
+                progress.empty()
+                return None, (f"File is too large: the cleaned data exceeds the {budget_mb:,.0f} MB memory budget "
+                              f"after {rows + len(df):,} rows.")
+            chunks.append(df)
+            rows += len(df)
+            done = min(uploaded_file.tell() / total_bytes, 1.0)
+            progress.progress(done, text=f"Parsing upload... {rows:,} rows")
+        progress.empty()
+
+        if not chunks:
+            return None, "The file contains no data rows."
+        # Chunks can disagree on Call_Type categories (unexpected labels); compact_frame re-unifies them
+        return schema.compact_frame(pd.concat(chunks, ignore_index=True)), None
     except Exception as e:
         return None, str(e)
 
 
+def build_dataset(df):
+    """
+    Everything the dashboard needs, computed once per dataset and stored
+    partitioned by Call_Type and sorted by time (partition.PartitionedFrame):
+    the rows with Hour, Segment and prefix sums (answer all KPIs and charts for
+    any call-type / date-range / time-of-day selection) and the row-level
+    suspicious records: rule hits and rows scored far above their Call_Type/hour
+    baseline (anomaly.AnomalyScorer), with their z-score. The fraud KPI counts
+    rule hits only.
+    """
+    fraud_mask, _ = fraud_rules.load_rules().evaluate(df)
+    scores, _ = anomaly.score_frame(df)
+    suspicious_mask = fraud_mask | (scores > anomaly.DEFAULT_THRESHOLD)
+    suspicious = df[suspicious_mask].assign(**{anomaly.SCORE_COLUMN: scores[suspicious_mask].astype(np.float32)})
+    return (partition.PartitionedFrame(df, fraud_mask=fraud_mask).freeze(),
+            partition.PartitionedFrame(suspicious).freeze())
+
+
+@st.cache_resource
+def demo_dataset():
+    """One read-only demo dataset per server process, shared by every session."""
+    return build_dataset(generate_random_data())
+
+
+def uploaded_dataset(uploaded_file):
+    """Parses an upload once per file; reruns reuse the result stored in the session."""
+    if st.session_state.get('upload_id') != uploaded_file.file_id:
+        df, error_msg = load_data(uploaded_file)
+        st.session_state['upload_id'] = uploaded_file.file_id
+        st.session_state['upload'] = (None, error_msg) if error_msg else (build_dataset(df), None)
+    return st.session_state['upload']
+
+
 # --- 3. SIDEBAR CONTROLS ---
 st.sidebar.header("🔧 Control Panel")
 
+# Optional per-stage timing (no overhead when unchecked)
+show_performance = st.sidebar.checkbox("⏱ Show performance panel", value=False)
+if show_performance:
+    instrumentation.enable()
+    instrumentation.reset()
+else:
+    instrumentation.disable()
+
 # A. File Uploader
 uploaded_file = st.sidebar.file_uploader("📂 Upload CSV File", type=["csv"])
 
 # B. Data Loading Logic
 if uploaded_file is not None:
-    df, error_msg = load_data(uploaded_file)
+    with instrumentation.stage('load_data (upload)'):
+        dataset, error_msg = uploaded_dataset(uploaded_file)
     if error_msg:
         st.error(f"Error loading file: {error_msg}")
         st.stop()
     else:
-        st.sidebar.success(f"✅ Loaded {len(df):,} records!")
+        data, fraud_rows = dataset
+        st.sidebar.success(f"✅ Loaded {len(data):,} records!")
         data_source = "User Uploaded Data"
 else:
-    df = generate_random_data()
+    with instrumentation.stage('load_data (demo)'):
+        data, fraud_rows = demo_dataset()
     data_source = "Demo Data (Randomly Generated)"
 
 # C. Filtering
 st.sidebar.markdown("---")
 st.sidebar.subheader("🔍 Filter Data")
-all_types = df['Call_Type'].unique().tolist()
+all_types = data.present_labels()
 selected_types = st.sidebar.multiselect("Select Call Types:", all_types, default=all_types)
 
 if not selected_types:
     st.warning("Please select at least one Call Type from the sidebar.")
     st.stop()
 
-# Apply Filter
-filtered_df = df[df['Call_Type'].isin(selected_types)]
+# D. Time Window (answered by binary search over the time-sorted partitions)
+first_ts, last_ts = data.time_bounds()
+date_range = st.sidebar.date_input("Date Range:", value=(first_ts.date(), last_ts.date()),
+                                   min_value=first_ts.date(), max_value=last_ts.date())
+if not isinstance(date_range, (tuple, list)):
+    date_range = (date_range,)
+start_date, end_date = date_range[0], date_range[-1]  # a single day while the second date is being picked
+hour_window = st.sidebar.slider("Time of Day (hours):", 0, 23, (0, 23))
+window = dict(start=pd.Timestamp(start_date), end=pd.Timestamp(end_date) + pd.Timedelta(days=1),
+              hours=hour_window)
+
+# Apply Filter (prefix sums over contiguous Call_Type partitions; raw rows are not rescanned)
+with instrumentation.stage('filter + KPIs (prefix sums)', rows=len(data)):
+    summary = data.summarize(selected_types, **window)
+    totals = summary.totals
 
 # --- 4. MAIN DASHBOARD ---
 st.title("📡 Telecom Data Analysis Dashboard")
-st.markdown(f"**Data Source:** *{data_source}* | **Records Displayed:** `{len(filtered_df):,}`")
+st.markdown(f"**Data Source:** *{data_source}* | **Records Displayed:** `{totals['calls']:,}`")
 st.markdown("---")
 
 # KPI Section
 col1, col2, col3, col4 = st.columns(4)
-total_usage = filtered_df['Data_Usage'].sum()
-avg_duration = filtered_df['Duration'].mean()
-fraud_count = len(filtered_df[(filtered_df['Duration'] > 3300) | (filtered_df['Data_Usage'] > 450)])
+total_usage = totals['usage_sum']
+avg_duration = totals['duration_sum'] / totals['calls'] if totals['calls'] else 0
+fraud_count = totals['fraud_count']
 
 col1.metric("Total Data Usage", f"{total_usage / 1e6:.2f} TB")
 col2.metric("Avg Call Duration", f"{avg_duration / 60:.1f} min")
-col3.metric("Total Calls", f"{len(filtered_df):,}")
+col3.metric("Total Calls", f"{totals['calls']:,}")
 col4.metric("Potential Fraud", f"{fraud_count}", delta_color="inverse")
 
 # --- 5. CHARTS ROW 1 ---
 st.markdown("### 📊 Traffic & Usage Analysis")
 row1_col1, row1_col2 = st.columns(2)
 
-with row1_col1:
+with row1_col1, instrumentation.stage('chart: hourly traffic'):
     st.subheader("Hourly Traffic (Peak Hours)")
-    filtered_df['Hour'] = filtered_df['Date'].dt.hour
-    hourly_counts = filtered_df.groupby('Hour').size()
-
-    fig1, ax1 = plt.subplots(figsize=(8, 4))
-    ax1.plot(hourly_counts.index, hourly_counts.values, marker='o', color='purple', linewidth=2)
-    ax1.set_xlabel("Hour of Day")
-    ax1.set_ylabel("Number of Calls")
-    ax1.grid(True, alpha=0.3)
+    hourly_counts = summary.hourly
 
-    # Dynamic Y-Limit
-    if len(hourly_counts) > 0:
-        y_min = max(0, hourly_counts.min() - (hourly_counts.max() * 0.1))
-        ax1.set_ylim(bottom=y_min)
+    # Rendered once per distinct aggregate; reruns with the same filter reuse the cached PNG
+    st.image(charts.render_png('app_hourly', hourly_counts), width='stretch')
 
-    st.pyplot(fig1)
-
-with row1_col2:
+with row1_col2, instrumentation.stage('chart: usage by type'):
     st.subheader("Data Usage by Call Type")
-    usage_by_type = filtered_df.groupby('Call_Type')['Data_Usage'].sum()
-
-    fig2, ax2 = plt.subplots(figsize=(8, 4))
-    usage_by_type.plot(kind='bar', color=['#3498db', '#e74c3c', '#2ecc71', '#f1c40f'], ax=ax2)
-    ax2.set_ylabel("Usage (MB)")
-    plt.xticks(rotation=0)
+    usage_by_type = summary.by_key['usage_sum']
 
-    # Formatter 5M
-    ax2.yaxis.set_major_formatter(mticker.FuncFormatter(lambda x, pos: f'{x * 1e-6:.1f}M'))
-    ax2.yaxis.set_major_locator(mticker.MultipleLocator(5000000))
-
-    st.pyplot(fig2)
+    st.image(charts.render_png('app_usage', usage_by_type), width='stretch')
 
 # --- 6. SEGMENTATION & FRAUD ---
 st.markdown("### 🎯 Segmentation & Security")
 row2_col1, row2_col2 = st.columns([1, 2])
 
-with row2_col1:
+with row2_col1, instrumentation.stage('chart: segments'):
     st.subheader("Customer Segments")
-    conditions = [
-        (filtered_df['Data_Usage'] > 450),
-        (filtered_df['Data_Usage'] >= 200) & (filtered_df['Data_Usage'] <= 450),
-        (filtered_df['Data_Usage'] < 200)
-    ]
-    labels = ['Gold', 'Silver', 'Bronze']
-    filtered_df['Segment'] = np.select(conditions, labels, default='Unknown')
-    segment_counts = filtered_df['Segment'].value_counts()
-
-    fig3, ax3 = plt.subplots(figsize=(6, 6))
-    wedges, texts, autotexts = ax3.pie(segment_counts, labels=segment_counts.index, autopct='%1.1f%%',
-                                       colors=['#FFD700', '#C0C0C0', '#CD7F32'], startangle=140)
-    # Shadow effect
-    for w in wedges:
-        w.set_path_effects([path_effects.SimplePatchShadow(), path_effects.Normal()])
-
-    st.pyplot(fig3)
-
-with row2_col2:
+    # Gold: > 450MB, Silver: 200-450MB, Bronze: < 200MB (pre-binned, counted from prefix sums)
+    segment_counts = summary.segments.sort_values(ascending=False)
+    segment_counts = segment_counts[segment_counts > 0]
+
+    st.image(charts.render_png('app_segments', segment_counts), width='stretch')
+
+with row2_col2, instrumentation.stage('table: suspicious transactions'):
     st.subheader("🚨 Suspicious Transactions (Fraud Alert)")
-    fraud_df = filtered_df[(filtered_df['Duration'] > 3300) | (filtered_df['Data_Usage'] > 450)]
+    # The only row-level view: suspicious records were extracted (and partitioned) once at load time
+    fraud_df = fraud_rows.rows(selected_types, **window)
 
     if not fraud_df.empty:
-        st.dataframe(fraud_df[['Date', 'Call_Type', 'Duration', 'Data_Usage', 'Segment']].head(100), height=300)
-        st.warning(f"Displaying top 100 out of {len(fraud_df)} suspicious records.")
+        rank_by = st.selectbox("Rank by:", topk.RANKINGS, format_func=topk.RANK_LABELS.get)
+        # argpartition: linear in the number of suspicious rows, only the 100 winners are sorted
+        top_fraud = topk.top_k(fraud_df, 100, rank_by)
+        st.dataframe(top_fraud[['Date', 'Call_Type', 'Duration', 'Data_Usage', 'Segment', anomaly.SCORE_COLUMN]],
+                     height=300)
+        outliers = int((fraud_df[anomaly.SCORE_COLUMN] > anomaly.DEFAULT_THRESHOLD).sum())
+        st.warning(f"Displaying top 100 out of {len(fraud_df)} suspicious records "
+                   f"({outliers} of them statistical outliers: {anomaly.AnomalyScorer().describe()}).")
+
+        # Full exports, generated chunk by chunk into a temp file only when a button is clicked
+        export_fmt = st.selectbox("Export format:", export.FORMATS)
+        dl_col1, dl_col2 = st.columns(2)
+        dl_col1.download_button(f"⬇ All {len(fraud_df):,} suspicious records",
+                                data=export.deferred(fraud_df[['Date', 'Call_Type', 'Duration', 'Data_Usage',
+                                                               anomaly.SCORE_COLUMN]], export_fmt),
+                                file_name=export.with_format('suspicious_records', export_fmt),
+                                mime=export.MIME_TYPES[export_fmt])
+        dl_col2.download_button("⬇ Totals by call type", data=export.deferred(summary.by_key, export_fmt, index=True),
+                                file_name=export.with_format('call_type_totals', export_fmt),
+                                mime=export.MIME_TYPES[export_fmt])
     else:
         st.success("No suspicious activity detected in the selected data.")
+
+# --- 7. PERFORMANCE PANEL ---
+if show_performance:
+    with st.expander("⏱ Performance (this rerun)", expanded=True):
+        st.dataframe(pd.DataFrame(instrumentation.records()), width='stretch')
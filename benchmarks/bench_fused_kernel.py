@@ -0,0 +1,89 @@
+"""
+Fused kernel vs. the original per-report scans of main.py.
+
+    python benchmarks/bench_fused_kernel.py [num_rows]
+
+The "legacy" functions below are the computations of analyze_data, detect_fraud,
+analyze_peak_hours and segment_customers as they were before the kernel
+(printing and plotting stripped), run back to back on the same clean frame.
+"""
+import os
+import sys
+import time
+import numpy as np
+import pandas as pd
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+import kernel  # noqa: E402
+import fraud_rules  # noqa: E402
+
+
+def make_frame(num_records, seed=42):
+    rng = np.random.default_rng(seed)
+    end_ts = pd.Timestamp('2025-12-31').timestamp()
+    start_ts = end_ts - 30 * 86400
+    usage = np.where(rng.random(num_records) < 0.3, 0.0, rng.uniform(5, 500, num_records))
+    return pd.DataFrame({
+        'Date': pd.to_datetime(rng.uniform(start_ts, end_ts, num_records), unit='s'),
+        'Duration': rng.integers(10, 3600, size=num_records),
+        'Data_Usage': np.round(usage, 2),
+        'Call_Type': rng.choice(['Internal', 'International', 'Roaming', 'Emergency'],
+                                size=num_records, p=[0.60, 0.30, 0.05, 0.05]),
+    })
+
+
+def legacy(df):
+    intl_avg = df[df['Call_Type'] == 'International']['Data_Usage'].mean()
+    usage_summary = df.groupby('Call_Type')['Data_Usage'].sum()
+
+    suspicious_df = df[(df['Duration'] > 3300) | (df['Data_Usage'] > 450)]
+
+    hours = df.copy()
+    hours['Date'] = pd.to_datetime(hours['Date'])
+    hours['Hour'] = hours['Date'].dt.hour
+    hourly_traffic = hours.groupby('Hour').size()
+
+    conditions = [
+        (df['Data_Usage'] > 450),
+        (df['Data_Usage'] >= 200) & (df['Data_Usage'] <= 450),
+        (df['Data_Usage'] < 200)
+    ]
+    segments = pd.Series(np.select(conditions, ['Gold', 'Silver', 'Bronze'], default='Unknown'))
+    segment_counts = segments.value_counts()
+    return intl_avg, usage_summary, len(suspicious_df), hourly_traffic, segment_counts
+
+
+def fused(df):
+    fraud_mask, _ = fraud_rules.load_rules().evaluate(df)
+    result = kernel.analyze_frame(df, fraud_mask)
+    intl_avg = kernel.type_total(result, 'International') / kernel.type_total(
+        result, 'International', 'calls_by_type')
+    return intl_avg, result.usage_by_type, int(result.fraud_mask.sum()), result.hour_counts, result.segment_counts
+
+
+def best_of(func, df, repeat=5):
+    timings = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        out = func(df)
+        timings.append(time.perf_counter() - start)
+    return min(timings), out
+
+
+if __name__ == "__main__":
+    num_rows = int(sys.argv[1]) if len(sys.argv) > 1 else 1000000
+    df = make_frame(num_rows)
+
+    t_legacy, old = best_of(legacy, df)
+    t_fused, new = best_of(fused, df)
+
+    assert np.isclose(old[0], new[0])
+    assert np.allclose(old[1].to_numpy(), new[1])
+    assert old[2] == new[2]
+    assert (old[3].to_numpy() == new[3]).all()
+    assert old[4].to_dict() == dict(zip(kernel.SEGMENT_CODES, new[4].tolist()))
+
+    print(f"rows:    {num_rows:,}")
+    print(f"legacy:  {t_legacy * 1000:8.1f} ms")
+    print(f"fused:   {t_fused * 1000:8.1f} ms")
+    print(f"speedup: {t_legacy / t_fused:8.1f}x")
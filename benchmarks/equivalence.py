@@ -0,0 +1,178 @@
+"""
+Checks that every execution mode of main.py produces the same reports.
+
+    python benchmarks/equivalence.py [--rows 20000] [--workers 3]
+
+A seeded CSV is generated, plus a .tlog store and a gzipped copy of the same
+rows, a copy with only two call types and one without the rows the default
+fraud rules flag. main.py then runs on it in-memory, --stream, --workers N,
+--incremental (fresh state, and on a copy that grows by appends between
+runs), on the .tlog store and with --workers N on the .csv.gz copy, with
+--no-charts. The report text is diffed against the in-memory run after
+dropping the lines that name the mode, and so are the suspicious record files.
+The fused usage report is also compared with the pandas analyze_data.
+--anomaly is not compared: it scores each chunk or range in one pass against
+the statistics seen so far, so its count depends on the chunking by design.
+Each check prints OK or a diff; the exit status is 1 if any check failed.
+"""
+import os
+import io
+import sys
+import shutil
+import subprocess
+import difflib
+import argparse
+import tempfile
+import contextlib
+
+BENCH_DIR = os.path.dirname(os.path.abspath(__file__))
+REPO_DIR = os.path.dirname(BENCH_DIR)
+sys.path.insert(0, REPO_DIR)
+
+import pandas as pd  # noqa: E402
+
+import data_generator  # noqa: E402
+import fraud_rules  # noqa: E402
+import main  # noqa: E402
+from aggregates import ReportAggregate  # noqa: E402
+
+SEED = 2024
+PARTIAL_TYPES = ['Internal', 'Roaming']
+CHUNK_ROWS = 3000  # small enough that --stream and --incremental read several chunks
+# lines that only say which mode ran (or where its files went)
+MODE_LINES = ('Processing File:', 'Loading data from', 'loaded successfully', 'Streaming data from', 'streamed successfully',
+              'worker processes', 'processed successfully', 'Memory per row', 'Detailed report saved to',
+              'added to')
+
+
+def datasets(workdir, rows):
+    """(label, path) of the seeded input, its subset with only PARTIAL_TYPES and one with no fraud."""
+    path = os.path.join(workdir, 'cdr.csv')
+    with contextlib.redirect_stdout(io.StringIO()):
+        data_generator.generate_large_dataset(path, rows, seed=SEED, workers=1)
+    partial = os.path.join(workdir, 'cdr_partial.csv')
+    df = pd.read_csv(path)
+    df[df['Call_Type'].isin(PARTIAL_TYPES)].to_csv(partial, index=False)
+    clean = os.path.join(workdir, 'cdr_no_fraud.csv')
+    flagged, _ = fraud_rules.load_rules().evaluate(df.dropna())
+    df.drop(index=df.dropna().index[flagged]).to_csv(clean, index=False)
+    df.to_csv(path + '.gz', index=False)
+    with contextlib.redirect_stdout(io.StringIO()):
+        data_generator.generate_large_dataset(os.path.join(workdir, 'cdr.tlog'), rows, seed=SEED, workers=1)
+    return [('all call types', path), ('two call types', partial), ('no suspicious rows', clean)]
+
+
+def modes(path, workers):
+    """(label, main.py arguments, suspicious records file) of every mode to compare, reference first."""
+    stem = os.path.splitext(path)[0]
+    runs = [
+        ('in-memory', [path], 'fused'),
+        ('--stream', [path, '--stream', '--chunksize', str(CHUNK_ROWS)], 'stream'),
+        (f'--workers {workers}', [path, '--workers', str(workers)], 'parallel'),
+        ('--incremental', [path, '--incremental', '--chunksize', str(CHUNK_ROWS),
+                           '--state-dir', stem + '-state'], None),
+    ]
+    if os.path.exists(stem + '.tlog'):
+        runs.append(('.tlog store', [stem + '.tlog'], 'tlog'))
+    if os.path.exists(path + '.gz'):
+        runs.append((f'.csv.gz --workers {workers}', [path + '.gz', '--workers', str(workers)], 'gzip'))
+    for label, argv, output in runs:
+        if output is None:
+            yield label, argv, os.path.join(stem + '-state', 'suspicious_report.csv')
+        else:
+            output_dir = f"{stem}-{output}"
+            yield label, argv + ['-o', output_dir], os.path.join(output_dir, 'suspicious_report.csv')
+
+
+def grown_incremental(path, workdir, steps=3):
+    """(report, suspicious records) of --incremental runs on one file that grows by appends in `steps`."""
+    with open(path, 'rb') as f:
+        lines = f.readlines()
+    feed, state_dir = os.path.join(workdir, 'feed.csv'), os.path.join(workdir, 'feed-state')
+    shutil.rmtree(state_dir, ignore_errors=True)
+    for step in range(1, steps + 1):
+        with open(feed, 'wb') as f:
+            f.writelines(lines[:1 + (len(lines) - 1) * step // steps])
+        report = run_main([feed, '--incremental', '--chunksize', str(CHUNK_ROWS), '--state-dir', state_dir], workdir)
+    return report, read_text(os.path.join(state_dir, 'suspicious_report.csv'))
+
+
+def run_main(argv, workdir):
+    """Report text of one main.py run, without blank lines and the lines that name the mode."""
+    env = dict(os.environ, PYTHONPATH=REPO_DIR, MPLBACKEND='Agg', TELECOM_CACHE_DIR=os.path.join(workdir, '.cache'))
+    result = subprocess.run([sys.executable, os.path.join(REPO_DIR, 'main.py'), 'all', '--no-charts'] + argv,
+                            cwd=workdir, env=env, capture_output=True, text=True)
+    if result.returncode:
+        return f"exit status {result.returncode}\n{result.stdout}{result.stderr}"
+    return ''.join(line for line in result.stdout.splitlines(True)
+                   if line.strip() and not any(m in line for m in MODE_LINES))
+
+
+def read_text(path):
+    if not os.path.exists(path):
+        return '(no file)\n'
+    with open(path) as f:
+        return f.read()
+
+
+def captured(func, *args):
+    out = io.StringIO()
+    with contextlib.redirect_stdout(out):
+        func(*args)
+    return out.getvalue()
+
+
+def usage_report(path):
+    """(pandas analyze_data output, fused ReportAggregate output) of the usage report."""
+    main.Charts = False
+    raw = pd.read_csv(path, parse_dates=['Date'])
+    with contextlib.redirect_stdout(io.StringIO()):
+        clean = main.clean_data(raw)
+    state = ReportAggregate()
+    state.update(raw)
+    return (captured(main.analyze_data, clean),
+            captured(main.report_usage, state.intl_average(), state.usage_summary()))
+
+
+def compare(name, expected, actual):
+    if expected == actual:
+        print(f"OK    {name}")
+        return True
+    print(f"FAIL  {name}")
+    sys.stdout.writelines(difflib.unified_diff(expected.splitlines(True), actual.splitlines(True),
+                                               'expected', 'actual'))
+    return False
+
+
+def run(rows, workers):
+    workdir = tempfile.mkdtemp(prefix='equivalence-')
+    try:
+        results = []
+        for label, path in datasets(workdir, rows):
+            expected, actual = usage_report(path)
+            results.append(compare(f"usage report, fused == analyze_data ({label})", expected, actual))
+            reference = None
+            for mode, argv, fraud_file in modes(path, workers):
+                output = (run_main(argv, workdir), read_text(fraud_file))
+                if reference is None:
+                    reference = output
+                    continue
+                results.append(compare(f"report, {mode} == in-memory ({label})", reference[0], output[0]))
+                results.append(compare(f"suspicious records, {mode} == in-memory ({label})",
+                                       reference[1], output[1]))
+            output = grown_incremental(path, workdir)
+            results.append(compare(f"report, --incremental on a growing file == in-memory ({label})",
+                                   reference[0], output[0]))
+            results.append(compare(f"suspicious records, --incremental on a growing file == in-memory ({label})",
+                                   reference[1], output[1]))
+    finally:
+        shutil.rmtree(workdir, ignore_errors=True)
+    return all(results)
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="Check that the report paths of main.py agree")
+    parser.add_argument('--rows', type=int, default=20000, help="rows of the generated input")
+    parser.add_argument('--workers', type=int, default=3, help="processes of the --workers run")
+    args = parser.parse_args()
+    sys.exit(0 if run(args.rows, args.workers) else 1)
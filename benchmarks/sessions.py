@@ -0,0 +1,175 @@
+"""
+Load test of the Streamlit apps: many simulated sessions in one server process.
+
+    python benchmarks/sessions.py [--app dashboard.py] [--sessions 40] [--concurrency 8] [--reruns 3]
+
+Each session is a streamlit.testing AppTest of the app (the same script runner
+the server uses) that runs the page and then reruns it `reruns` times with a
+random time-of-day window. `concurrency` sessions run at once in threads, like
+concurrent users of one server. A first session warms the caches; the report
+shows the resident memory after it, the peak while every other session runs
+(sampled every few ms) and the extra memory per session. With the dataset
+shared by st.cache_resource the peak stays flat as sessions are added.
+
+share_server_state() patches private streamlit.testing internals. It was
+checked against the Streamlit versions in TESTED_STREAMLIT and refuses other
+versions (unless --untested-streamlit) or a streamlit without those internals.
+
+`--repository` points at another checkout (e.g. a `git worktree` of an older
+commit) to load-test its apps the same way; run each from its own process.
+"""
+import os
+import sys
+import time
+import random
+import argparse
+import resource
+import threading
+import statistics
+from concurrent.futures import ThreadPoolExecutor
+
+BENCH_DIR = os.path.dirname(os.path.abspath(__file__))
+REPO_DIR = os.path.dirname(BENCH_DIR)
+SAMPLE_INTERVAL = 0.005
+SEED = 2024
+TESTED_STREAMLIT = ('1.65',)  # major.minor releases whose AppTest internals share_server_state() was checked on
+
+
+def rss_mb():
+    """Current resident set size in MB (Linux /proc; peak RSS elsewhere)."""
+    try:
+        with open('/proc/self/status') as f:
+            for line in f:
+                if line.startswith('VmRSS:'):
+                    return int(line.split()[1]) / 1024
+    except OSError:
+        pass
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+
+
+class PeakSampler:
+    """Samples the RSS in a background thread; `peak` is the largest value seen."""
+
+    def __init__(self, interval=SAMPLE_INTERVAL):
+        self.interval = interval
+        self.peak = rss_mb()
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._run, daemon=True)
+
+    def _run(self):
+        while not self._stop.is_set():
+            self.peak = max(self.peak, rss_mb())
+            time.sleep(self.interval)
+
+    def __enter__(self):
+        self._thread.start()
+        return self
+
+    def __exit__(self, *exc):
+        self._stop.set()
+        self._thread.join()
+        self.peak = max(self.peak, rss_mb())
+        return False
+
+
+def share_server_state(untested=False):
+    """
+    AppTest installs a mock Runtime (and the global.appTest option) for every
+    run and removes them when the run ends, which breaks runs still going in
+    other threads; it also compiles the script anew for every run. Keep one
+    Runtime and one script cache for the whole process, like a real server.
+    Raises RuntimeError on a Streamlit version outside TESTED_STREAMLIT (only a
+    warning if `untested`) and when the patched internals are missing.
+    """
+    import streamlit
+    from streamlit import config
+    from streamlit.runtime import Runtime
+    from streamlit.testing.v1 import app_test, local_script_runner
+
+    version = '.'.join(streamlit.__version__.split('.')[:2])
+    if version not in TESTED_STREAMLIT:
+        message = (f"share_server_state() patches streamlit.testing internals checked on Streamlit "
+                   f"{', '.join(TESTED_STREAMLIT)} only; this is {streamlit.__version__}")
+        if not untested:
+            raise RuntimeError(message + " (--untested-streamlit to try anyway)")
+        print(f"warning: {message}", file=sys.stderr)
+    missing = [name for owner, name in ((app_test, 'Runtime'), (app_test, 'ScriptCache'),
+                                        (local_script_runner, 'ScriptCache'), (Runtime, '_instance'))
+               if not hasattr(owner, name)]
+    if missing:
+        raise RuntimeError(f"Streamlit {streamlit.__version__} has no {', '.join(missing)}: "
+                           f"share_server_state() must be updated for its AppTest internals")
+
+    config.set_option('global.appTest', True)
+
+    class SharedRuntimeType(type):
+        def __setattr__(cls, name, value):
+            if name != '_instance':
+                super().__setattr__(name, value)
+            elif value is not None and Runtime._instance is None:
+                Runtime._instance = value
+
+    app_test.Runtime = SharedRuntimeType('SharedRuntime', (Runtime,), {})
+    script_cache = app_test.ScriptCache()
+    app_test.ScriptCache = local_script_runner.ScriptCache = lambda: script_cache
+
+
+def session(app_path, reruns, seed, timeout):
+    """One simulated user: a first page load, then reruns with random hour windows; returns run times."""
+    from streamlit.testing.v1 import AppTest
+    rng = random.Random(seed)
+    times = []
+    at = AppTest.from_file(app_path, default_timeout=timeout)
+    start = time.perf_counter()
+    at.run()
+    times.append(time.perf_counter() - start)
+    if at.exception:
+        raise RuntimeError(f"session {seed}: {at.exception[0].value}")
+    for _ in range(reruns):
+        first = rng.randrange(24)
+        at.slider[0].set_value((first, rng.randrange(first, 24)))
+        start = time.perf_counter()
+        at.run()
+        times.append(time.perf_counter() - start)
+    if at.exception:
+        raise RuntimeError(f"session {seed}: {at.exception[0].value}")
+    return times
+
+
+def run(app, sessions, concurrency, reruns, repository, timeout, untested=False):
+    sys.path.insert(0, repository)
+    share_server_state(untested)
+    app_path = os.path.join(repository, app)
+    rss_start = rss_mb()
+    warm = session(app_path, 0, SEED, timeout)
+    rss_warm = rss_mb()
+    with PeakSampler() as sampler, ThreadPoolExecutor(max_workers=concurrency) as pool:
+        results = list(pool.map(lambda i: session(app_path, reruns, SEED + i, timeout), range(1, sessions + 1)))
+    rss_end = rss_mb()
+
+    first_loads = [times[0] for times in results]
+    reruns_s = [t for times in results for t in times[1:]]
+    print(f"app: {app_path}  sessions: {sessions}  concurrency: {concurrency}  reruns/session: {reruns}")
+    print(f"RSS before load:         {rss_start:8.1f} MB")
+    print(f"RSS after first session: {rss_warm:8.1f} MB  (load {warm[0]:.2f}s)")
+    print(f"RSS peak, all sessions:  {sampler.peak:8.1f} MB  (+{sampler.peak - rss_warm:.1f} MB)")
+    print(f"RSS after all sessions:  {rss_end:8.1f} MB  (+{(rss_end - rss_warm) / sessions:.2f} MB per session)")
+    print(f"page load: median {statistics.median(first_loads):.3f}s  "
+          f"rerun: median {statistics.median(reruns_s) if reruns_s else float('nan'):.3f}s")
+    return {'rss_warm_mb': rss_warm, 'rss_peak_mb': sampler.peak, 'rss_end_mb': rss_end}
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="Simulate concurrent Streamlit sessions and track memory")
+    parser.add_argument('--app', default='dashboard.py', help="app script, relative to the repository")
+    parser.add_argument('--sessions', type=int, default=40)
+    parser.add_argument('--concurrency', type=int, default=8, help="sessions running at the same time")
+    parser.add_argument('--reruns', type=int, default=3, help="widget-triggered reruns per session")
+    parser.add_argument('--repository', default=REPO_DIR, help="checkout whose app is tested")
+    parser.add_argument('--timeout', type=float, default=600, help="seconds allowed per script run")
+    parser.add_argument('--untested-streamlit', action='store_true',
+                        help=f"run on a Streamlit other than {', '.join(TESTED_STREAMLIT)} "
+                             "(the patched internals may differ)")
+    args = parser.parse_args()
+    run(args.app, args.sessions, args.concurrency, args.reruns, os.path.abspath(args.repository), args.timeout,
+        args.untested_streamlit)
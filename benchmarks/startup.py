@@ -0,0 +1,95 @@
+"""
+Start-up cost of the main.py CLI, one fresh interpreter per run.
+
+    python benchmarks/startup.py [--rows 1000] [--repeat 5] [--baseline /path/to/old/checkout]
+
+A small input keeps the analysis itself negligible, so the timings show what
+a cron job pays before any real work: interpreter + imports (+ matplotlib and
+rendering when charts are drawn). Every run gets an empty working directory
+and cache (TELECOM_CACHE_DIR), so nothing is reused between runs.
+`--baseline` also times `import main` and a default run of another checkout
+of the repository (e.g. a `git worktree` of an older commit) for comparison.
+"""
+import os
+import sys
+import json
+import time
+import shutil
+import argparse
+import statistics
+import subprocess
+import tempfile
+
+BENCH_DIR = os.path.dirname(os.path.abspath(__file__))
+REPO_DIR = os.path.dirname(BENCH_DIR)
+DATA_DIR = os.path.join(BENCH_DIR, 'data')
+SEED = 2024
+
+
+def dataset(num_rows):
+    """Seeded CSV of `num_rows` rows (generated in a subprocess, so this script stays import-light)."""
+    path = os.path.join(DATA_DIR, f"startup_{num_rows}.csv")
+    if not os.path.exists(path):
+        os.makedirs(DATA_DIR, exist_ok=True)
+        subprocess.run([sys.executable, os.path.join(REPO_DIR, 'data_generator.py'), path,
+                        '-n', str(num_rows), '--seed', str(SEED)], check=True, stdout=subprocess.DEVNULL)
+    return path
+
+
+def cases(path, baseline=None):
+    """(label, repository, argv) of every measured command."""
+    main_py = os.path.join(REPO_DIR, 'main.py')
+    runs = [
+        ('import main', REPO_DIR, ['-c', 'import main']),
+        ('all (charts)', REPO_DIR, [main_py, 'all', path]),
+        ('all --no-charts', REPO_DIR, [main_py, 'all', path, '--no-charts']),
+        ('fraud --no-charts', REPO_DIR, [main_py, 'fraud', path, '--no-charts']),
+        ('clean --no-charts', REPO_DIR, [main_py, 'clean', path, '--no-charts']),
+    ]
+    if baseline:
+        baseline = os.path.abspath(baseline)
+        runs += [
+            ('baseline: import main', baseline, ['-c', 'import main']),
+            ('baseline: main.py <input>', baseline, [os.path.join(baseline, 'main.py'), path]),
+        ]
+    return runs
+
+
+def time_run(repository, argv):
+    """Wall time of one run in a fresh working directory and cache."""
+    workdir = tempfile.mkdtemp(prefix='startup-')
+    env = dict(os.environ, PYTHONPATH=repository, MPLBACKEND='Agg',
+               TELECOM_CACHE_DIR=os.path.join(workdir, '.cache'))
+    try:
+        start = time.perf_counter()
+        subprocess.run([sys.executable] + argv, cwd=workdir, env=env, check=True,
+                       stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+        return time.perf_counter() - start
+    finally:
+        shutil.rmtree(workdir, ignore_errors=True)
+
+
+def run(rows, repeat, baseline, output):
+    path = os.path.abspath(dataset(rows))
+    results = []
+    print(f"{'command':<28}{'best':>9}{'median':>9}")
+    for label, repository, argv in cases(path, baseline):
+        times = [time_run(repository, argv) for _ in range(repeat)]
+        results.append({'command': label, 'best_s': min(times), 'median_s': statistics.median(times)})
+        print(f"{label:<28}{min(times):>8.3f}s{statistics.median(times):>8.3f}s")
+    if output:
+        with open(output, 'w') as f:
+            json.dump({'rows': rows, 'repeat': repeat, 'python': sys.version.split()[0], 'results': results}, f,
+                      indent=2)
+        print(f"Results written to {output}")
+    return results
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="Time main.py start-up with and without charts")
+    parser.add_argument('--rows', type=int, default=1000, help="rows of the generated input")
+    parser.add_argument('--repeat', type=int, default=5)
+    parser.add_argument('--baseline', metavar='DIR', help="another checkout to time for comparison")
+    parser.add_argument('--output', metavar='FILE', help="also write the timings as JSON")
+    args = parser.parse_args()
+    run(args.rows, args.repeat, args.baseline, args.output)
@@ -0,0 +1,213 @@
+"""
+Stage-by-stage benchmark suite.
+
+    python benchmarks/suite.py run [--sizes 100000 1000000 10000000 50000000] [--output results.json]
+    python benchmarks/suite.py compare base.json new.json [--threshold 0.10]
+
+`run` generates seeded datasets with data_generator (cached in benchmarks/data/),
+then times every pipeline stage of main.py and the data functions behind the
+Streamlit apps, one dataset size at a time. Each stage records best wall time,
+CPU time, rows and peak traced allocations (tracemalloc, measured in a separate
+pass so it does not distort the timings). `compare` prints the per-stage ratio
+between two result files and exits with status 1 if any stage got slower (or
+used more memory) than the threshold allows.
+"""
+import os
+import sys
+import json
+import time
+import argparse
+import platform
+import tempfile
+import tracemalloc
+import contextlib
+from datetime import datetime
+
+import numpy as np
+import pandas as pd
+import matplotlib
+matplotlib.use('Agg')
+import matplotlib.pyplot as plt  # noqa: E402
+
+BENCH_DIR = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, os.path.dirname(BENCH_DIR))
+import main  # noqa: E402
+import ingest  # noqa: E402
+import partition  # noqa: E402
+import topk  # noqa: E402
+import logstore  # noqa: E402
+import export  # noqa: E402
+import sketches  # noqa: E402
+import traffic  # noqa: E402
+import anomaly  # noqa: E402
+import fraud_rules  # noqa: E402
+import data_generator  # noqa: E402
+
+DATA_DIR = os.path.join(BENCH_DIR, 'data')
+DEFAULT_SIZES = [100000, 1000000, 10000000, 50000000]
+SEED = 2024
+END_DATE = datetime(2025, 12, 31)
+
+
+def dataset(num_rows):
+    """Seeded CSV of `num_rows` rows, generated once and reused across runs."""
+    path = os.path.join(DATA_DIR, f"bench_{num_rows}.csv")
+    if not os.path.exists(path):
+        os.makedirs(DATA_DIR, exist_ok=True)
+        with open(os.devnull, 'w') as devnull, contextlib.redirect_stdout(devnull):
+            data_generator.generate_large_dataset(path, num_rows, seed=SEED, end_date=END_DATE)
+    return path
+
+
+def score_chunks(df, chunks=10):
+    """Streaming anomaly scoring: one AnomalyScorer fed `chunks` slices of `df`."""
+    scorer = anomaly.AnomalyScorer()
+    step = -(-len(df) // chunks)
+    return [scorer.update(df.iloc[start:start + step]) for start in range(0, len(df), step)]
+
+
+def stages(path):
+    """(name, setup, func) triples; setup() returns the argument passed to func."""
+    state = {}
+
+    def raw():
+        if 'raw' not in state:
+            state['raw'] = ingest.read_columns(path)
+        return state['raw']
+
+    def clean():
+        if 'clean' not in state:
+            state['clean'] = main.clean_data(raw())
+        return state['clean']
+
+    def store():
+        """The same rows as a .tlog binary store, converted once."""
+        target = os.path.splitext(path)[0] + logstore.EXTENSION
+        if not os.path.exists(target):
+            df = ingest.read_source_csv(path)
+            writer = logstore.LogWriter(target, len(df))
+            writer.write(df, 0)
+            writer.close()
+        return target
+
+    def cold_load(_):
+        if os.path.exists(ingest.cache_path(path)):
+            os.remove(ingest.cache_path(path))
+        return main.load_data(path)
+
+    return [
+        ('main.load_data (cold cache)', lambda: None, cold_load),
+        ('main.load_data (warm cache)', lambda: None, lambda _: main.load_data(path)),
+        ('main.load_data (.tlog mmap)', store, main.load_data),
+        ('main.run_fused (.tlog mmap)', lambda: ingest.read_columns(store()), main.run_fused),
+        ('main.clean_data', raw, main.clean_data),
+        ('main.analyze_data', clean, main.analyze_data),
+        ('main.detect_fraud', clean, main.detect_fraud),
+        ('main.analyze_peak_hours', clean, main.analyze_peak_hours),
+        ('main.segment_customers', lambda: clean().copy(), main.segment_customers),
+        ('traffic: bins (1min)', clean, lambda df: traffic.TrafficBins('1min').update(df)),
+        ('traffic: bins + busy hours (15min)', clean,
+         lambda df: traffic.TrafficBins('15min').update(df).busy_hours()),
+        ('anomaly: score (one pass)', clean, anomaly.score_frame),
+        ('anomaly: score (10 chunks)', clean, score_chunks),
+        ('main.run_fused', raw, main.run_fused),
+        ('export: csv', clean, lambda df: export.write_frame(df, 'export.csv')),
+        ('export: csv.gz', clean, lambda df: export.write_frame(df, 'export.csv.gz')),
+        ('export: parquet', clean, lambda df: export.write_frame(df, 'export.parquet')),
+        ('dashboard: read_columns', lambda: None,
+         lambda _: ingest.read_columns(path, ['Date', 'Duration', 'Data_Usage', 'Call_Type'])),
+        ('dashboard: fraud rules', clean, lambda df: fraud_rules.load_rules('dashboard').evaluate(df)),
+        ('dashboard: top 100 by usage', clean, lambda df: topk.top_k(df, 100, 'Data_Usage')),
+        ('dashboard: percentile sketches', clean, lambda df: sketches.ApproxSummary().update(df)),
+        ('app: partition build', clean, partition.PartitionedFrame),
+        ('app: partition select', lambda: partition.PartitionedFrame(clean()),
+         lambda data: data.select(['Emergency', 'Roaming'])),
+        ('app: time range query', lambda: partition.PartitionedFrame(clean(), fraud_mask=np.ones(len(clean()), bool)),
+         lambda data: data.summarize(['Internal', 'Roaming'], data.time_bounds()[0] + pd.Timedelta(days=3),
+                                     data.time_bounds()[0] + pd.Timedelta(days=10), hours=(8, 17))),
+    ]
+
+
+def measure(func, arg, repeat):
+    wall, cpu = [], []
+    for _ in range(repeat):
+        start_wall, start_cpu = time.perf_counter(), time.process_time()
+        func(arg)
+        plt.close('all')
+        wall.append(time.perf_counter() - start_wall)
+        cpu.append(time.process_time() - start_cpu)
+
+    tracemalloc.start()
+    func(arg)
+    plt.close('all')
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return min(wall), min(cpu), peak / 1024 ** 2
+
+
+def run(sizes, repeat, output):
+    results = []
+    workdir = tempfile.mkdtemp(prefix='telecom-bench-')
+    for num_rows in sizes:
+        path = os.path.abspath(dataset(num_rows))
+        print(f"\n== {num_rows:,} rows ==")
+        cwd = os.getcwd()
+        os.chdir(workdir)  # charts / reports written by the stages land here
+        try:
+            for name, setup, func in stages(path):
+                with open(os.devnull, 'w') as devnull, contextlib.redirect_stdout(devnull):
+                    wall, cpu, peak_mb = measure(func, setup(), repeat)
+                results.append({'stage': name, 'rows': num_rows, 'seconds': wall,
+                                'cpu_seconds': cpu, 'peak_mb': peak_mb})
+                print(f"{name:32s} {wall * 1000:10.1f} ms  {cpu * 1000:10.1f} ms cpu  {peak_mb:9.1f} MB")
+        finally:
+            os.chdir(cwd)
+
+    report = {
+        'meta': {'timestamp': datetime.now().isoformat(timespec='seconds'), 'python': platform.python_version(),
+                 'machine': platform.machine(), 'cpus': os.cpu_count(), 'repeat': repeat},
+        'results': results,
+    }
+    with open(output, 'w') as f:
+        json.dump(report, f, indent=2)
+    print(f"\nResults written to {output}")
+
+
+def compare(base_file, new_file, threshold):
+    with open(base_file) as f:
+        base = {(r['stage'], r['rows']): r for r in json.load(f)['results']}
+    with open(new_file) as f:
+        new = {(r['stage'], r['rows']): r for r in json.load(f)['results']}
+
+    regressions = 0
+    print(f"{'stage':32s} {'rows':>11s} {'time':>8s} {'memory':>8s}")
+    for key in sorted(base.keys() & new.keys(), key=lambda k: (k[1], k[0])):
+        time_ratio = new[key]['seconds'] / max(base[key]['seconds'], 1e-9)
+        mem_ratio = new[key]['peak_mb'] / max(base[key]['peak_mb'], 1e-9)
+        flag = time_ratio > 1 + threshold or mem_ratio > 1 + threshold
+        regressions += flag
+        print(f"{key[0]:32s} {key[1]:>11,} {time_ratio:7.2f}x {mem_ratio:7.2f}x{'  <-- REGRESSION' if flag else ''}")
+
+    print(f"\n{regressions} regression(s) above {threshold:.0%}")
+    return 1 if regressions else 0
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    sub = parser.add_subparsers(dest='command', required=True)
+
+    run_parser = sub.add_parser('run', help="benchmark every stage at each dataset size")
+    run_parser.add_argument('--sizes', type=int, nargs='+', default=DEFAULT_SIZES)
+    run_parser.add_argument('--repeat', type=int, default=3)
+    run_parser.add_argument('--output', default='benchmark_results.json')
+
+    compare_parser = sub.add_parser('compare', help="flag regressions between two result files")
+    compare_parser.add_argument('base')
+    compare_parser.add_argument('new')
+    compare_parser.add_argument('--threshold', type=float, default=0.10, help="allowed slowdown (0.10 = 10%%)")
+
+    args = parser.parse_args()
+    if args.command == 'run':
+        run(args.sizes, args.repeat, args.output)
+    else:
+        sys.exit(compare(args.base, args.new, args.threshold))
@@ -0,0 +1,292 @@
+"""
+Headless, cached chart rendering.
+
+Every chart is a builder `f(fig, data, **options)` drawing one small
+aggregate (a Series of at most a few dozen values) onto a bare matplotlib
+Figure with the Agg canvas, so no pyplot state or GUI backend is involved
+and rendering is safe from worker processes and Streamlit threads.
+
+Rendered PNGs are cached under .cache/charts/, keyed by a hash of the chart
+kind, the aggregate values and the options; a rerun with unchanged
+aggregates costs one file read (or nothing, from the in-process memo).
+The disk cache keeps the DISK_CACHE_FILES most recently used PNGs (a hit
+refreshes the file's mtime; the oldest files go when a new one is written),
+so a long-running Streamlit server with many filter combinations stays bounded.
+
+    png = charts.render_png('app_hourly', hourly_counts)          # bytes, cached
+
+    with charts.batch(workers=0):                                  # main.py
+        charts.save_chart('usage_by_type', usage, 'report_type_usage.png', dpi=300)
+        ...                                                        # rendered in a process pool on exit
+"""
+import os
+import io
+import json
+import hashlib
+import threading
+import contextlib
+from concurrent.futures import ProcessPoolExecutor
+
+import instrumentation
+
+CACHE_DIR = os.path.join(os.environ.get("TELECOM_CACHE_DIR", ".cache"), "charts")
+MEMO_SIZE = 64
+DISK_CACHE_FILES = int(os.environ.get("TELECOM_CHART_CACHE_FILES", 512))
+SCREEN_DPI = 150  # Streamlit images; main.py writes its report files at 300
+
+SEGMENT_COLORS = {'Gold': '#FFD700', 'Silver': '#C0C0C0', 'Bronze': '#CD7F32'}
+
+
+# --- builders (main.py report charts) ---
+
+def _usage_by_type(fig, usage_summary):
+    import matplotlib.ticker as mticker
+    ax = fig.subplots()
+    usage_summary.plot(kind='bar', color=['skyblue', 'orange', 'green', 'red'], ax=ax)
+    for label in ax.get_xticklabels():
+        label.set_rotation(45)
+        label.set_ha('right')
+
+    ax.set_title('Total Internet Usage by Call Type (Big Data Scale)')
+    ax.set_xlabel('Call Type')
+    ax.set_ylabel('Usage (MB)')
+
+    # اعداد محور عمودی کوتاه می‌شوند (مثلاً 1000000 را تبدیل به 1M می‌کند)
+    ax.yaxis.set_major_formatter(mticker.FuncFormatter(lambda x, pos: f'{x * 1e-6:.0f}M'))
+    ax.yaxis.set_major_locator(mticker.MultipleLocator(5000000))
+    ax.grid(axis='y', linestyle='-', alpha=0.4)
+
+
+def _peak_hours(fig, hourly_traffic):
+    import matplotlib.ticker as mticker
+    ax = fig.subplots()
+    hourly_traffic.plot(kind='line', marker='o', color='purple', linewidth=2, ax=ax)
+
+    ax.set_title('Network Traffic by Hour (24h) - 1 Million Records')
+    ax.set_xlabel('Hour of Day (0-23)')
+    ax.set_ylabel('Number of Calls')
+
+    max_calls, min_calls = hourly_traffic.max(), hourly_traffic.min()
+    data_range = max_calls - min_calls
+    if data_range > 0:
+        ax.set_ylim(bottom=max(0, min_calls - (data_range * 0.2)))
+    else:
+        ax.set_ylim(bottom=0)
+
+    ax.yaxis.set_major_formatter(mticker.StrMethodFormatter('{x:,.0f}'))
+    ax.grid(True, linestyle='--', alpha=0.7)
+    ax.set_xticks(range(0, 24))
+    ax.fill_between(hourly_traffic.index, hourly_traffic.values, color='purple', alpha=0.1)
+
+
+def _segments(fig, segment_counts):
+    import matplotlib.patheffects as path_effects
+    ax = fig.subplots()
+    colors = [SEGMENT_COLORS.get(label, 'grey') for label in segment_counts.index]
+    # برجسته‌سازی Gold
+    explode = [0.05 if label == 'Gold' else 0 for label in segment_counts.index]
+
+    wedges, texts, autotexts = ax.pie(segment_counts, labels=segment_counts.index, autopct='%1.1f%%',
+                                      startangle=140, colors=colors, explode=explode, shadow=False,
+                                      textprops={'fontsize': 12})
+    # سایه دستی و نرم برای هر تکه (Wedge)
+    for w in wedges:
+        w.set_path_effects([
+            path_effects.SimplePatchShadow(offset=(3, -3), alpha=0.4, shadow_rgbFace='black'),
+            path_effects.Normal()
+        ])
+    ax.set_title('Customer Segmentation (Data Usage)')
+    ax.set_ylabel('')
+
+
+# --- builders (Streamlit apps) ---
+
+def _app_hourly(fig, hourly_counts):
+    ax = fig.subplots()
+    ax.plot(hourly_counts.index, hourly_counts.values, marker='o', color='purple', linewidth=2)
+    ax.set_xlabel("Hour of Day")
+    ax.set_ylabel("Number of Calls")
+    ax.grid(True, alpha=0.3)
+    if len(hourly_counts) > 0:
+        ax.set_ylim(bottom=max(0, hourly_counts.min() - (hourly_counts.max() * 0.1)))
+
+
+def _app_usage(fig, usage_by_type):
+    import matplotlib.ticker as mticker
+    ax = fig.subplots()
+    usage_by_type.plot(kind='bar', color=['#3498db', '#e74c3c', '#2ecc71', '#f1c40f'], ax=ax)
+    ax.set_ylabel("Usage (MB)")
+    ax.tick_params(axis='x', labelrotation=0)
+    ax.yaxis.set_major_formatter(mticker.FuncFormatter(lambda x, pos: f'{x * 1e-6:.1f}M'))
+    ax.yaxis.set_major_locator(mticker.MultipleLocator(5000000))
+
+
+def _app_segments(fig, segment_counts):
+    import matplotlib.patheffects as path_effects
+    ax = fig.subplots()
+    wedges, texts, autotexts = ax.pie(segment_counts, labels=segment_counts.index, autopct='%1.1f%%',
+                                      colors=['#FFD700', '#C0C0C0', '#CD7F32'], startangle=140)
+    for w in wedges:
+        w.set_path_effects([path_effects.SimplePatchShadow(), path_effects.Normal()])
+
+
+def _dashboard_segments(fig, segment_counts):
+    import matplotlib.patheffects as path_effects
+    from matplotlib.artist import setp
+    ax = fig.subplots()
+    wedges, texts, autotexts = ax.pie(segment_counts, labels=segment_counts.index, autopct='%1.1f%%',
+                                      startangle=140, colors=['#ff9999', '#66b3ff', '#99ff99'], shadow=False)
+    setp(autotexts, size=10, weight="bold", color="white")
+    for w in wedges:
+        w.set_path_effects([path_effects.SimplePatchShadow(), path_effects.Normal()])
+
+
+# kind -> (builder, figsize)
+CHARTS = {
+    'usage_by_type': (_usage_by_type, (10, 6)),
+    'peak_hours': (_peak_hours, (10, 6)),
+    'segments': (_segments, (8, 8)),
+    'app_hourly': (_app_hourly, (8, 4)),
+    'app_usage': (_app_usage, (8, 4)),
+    'app_segments': (_app_segments, (6, 6)),
+    'dashboard_segments': (_dashboard_segments, (6, 6)),
+}
+
+
+def chart_key(kind, data, dpi=SCREEN_DPI, options=None):
+    """Content hash of one chart: kind, aggregate values (as float64), dpi and options."""
+    payload = json.dumps({
+        'kind': kind,
+        'index': [str(label) for label in data.index],
+        'values': [float(v) for v in data.to_numpy()],
+        'name': str(data.name),
+        'dpi': dpi,
+        'options': options or {},
+    }, sort_keys=True)
+    return hashlib.sha1(payload.encode('utf-8')).hexdigest()
+
+
+def draw(kind, data, dpi=SCREEN_DPI, options=None):
+    """Renders one chart to PNG bytes (uncached)."""
+    from matplotlib.figure import Figure
+    builder, figsize = CHARTS[kind]
+    options = dict(options or {})
+    with instrumentation.stage(f'chart.draw:{kind}'):
+        fig = Figure(figsize=options.pop('figsize', figsize))
+        builder(fig, data, **options)
+        fig.tight_layout()
+        out = io.BytesIO()
+        fig.savefig(out, format='png', dpi=dpi)
+    return out.getvalue()
+
+
+_memo = {}
+
+
+def render_png(kind, data, dpi=SCREEN_DPI, options=None):
+    """PNG bytes of a chart, from the in-process memo, the disk cache, or freshly drawn."""
+    key = chart_key(kind, data, dpi, options)
+    if key in _memo:
+        return _memo[key]
+
+    path = os.path.join(CACHE_DIR, key + '.png')
+    try:
+        with open(path, 'rb') as f:
+            png = f.read()
+        with contextlib.suppress(OSError):
+            os.utime(path)  # most recently used: kept longest by _prune_disk_cache
+    except OSError:
+        png = draw(kind, data, dpi, options)
+        try:
+            os.makedirs(CACHE_DIR, exist_ok=True)
+            tmp = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+            with open(tmp, 'wb') as f:
+                f.write(png)
+            os.replace(tmp, path)
+            _prune_disk_cache()
+        except OSError:
+            pass  # read-only deployment: still usable, just not cached on disk
+
+    if len(_memo) >= MEMO_SIZE:
+        _memo.pop(next(iter(_memo), None), None)
+    _memo[key] = png
+    return png
+
+
+def _prune_disk_cache(limit=DISK_CACHE_FILES):
+    """Deletes the least recently used PNGs beyond `limit` (by mtime)."""
+    entries = []
+    for entry in os.scandir(CACHE_DIR):
+        if entry.name.endswith('.png'):
+            with contextlib.suppress(OSError):
+                entries.append((entry.stat().st_mtime, entry.path))
+    if len(entries) <= limit:
+        return
+    entries.sort()
+    for _, path in entries[:len(entries) - limit]:
+        with contextlib.suppress(OSError):
+            os.remove(path)  # another process may have removed it first
+
+
+def write_chart(kind, data, filename, dpi=SCREEN_DPI, options=None):
+    png = render_png(kind, data, dpi, options)
+    with open(filename, 'wb') as f:
+        f.write(png)
+    return filename
+
+
+def is_cached(kind, data, dpi=SCREEN_DPI, options=None):
+    key = chart_key(kind, data, dpi, options)
+    return key in _memo or os.path.exists(os.path.join(CACHE_DIR, key + '.png'))
+
+
+def _render_job(job):
+    kind, data, _, dpi, options = job
+    render_png(kind, data, dpi, options)
+
+
+_pending = None
+
+
+def save_chart(kind, data, filename, dpi=SCREEN_DPI, options=None):
+    """Writes a chart to `filename`; inside batch() the render is deferred to the pool."""
+    if _pending is not None:
+        _pending.append((kind, data, filename, dpi, options))
+    else:
+        write_chart(kind, data, filename, dpi, options)
+
+
+@contextlib.contextmanager
+def batch(workers=0):
+    """
+    Collects save_chart() calls and renders them together on exit, in a
+    process pool of `workers` (0 = one per CPU); cached charts are only copied.
+    """
+    global _pending
+    outer, _pending = _pending, []
+    jobs = _pending
+    try:
+        yield jobs
+    finally:
+        _pending = outer
+    workers = workers if workers and workers > 0 else (os.cpu_count() or 1)
+    with instrumentation.stage('charts.render', rows=len(jobs)):
+        todo = [job for job in jobs if not is_cached(job[0], job[1], job[3], job[4])]
+        if workers > 1 and len(todo) > 1:
+            # workers draw into the disk cache; the copies below are then plain reads
+            with ProcessPoolExecutor(max_workers=min(workers, len(todo))) as pool:
+                list(pool.map(_render_job, todo))
+        for job in jobs:
+            write_chart(*job)
+
+
+def show(filenames):
+    """Opens rendered PNGs in one interactive window each (blocks until closed)."""
+    import matplotlib.pyplot as plt
+    import matplotlib.image as mpimg
+    for filename in filenames:
+        fig, ax = plt.subplots()
+        ax.imshow(mpimg.imread(filename))
+        ax.set_axis_off()
+        fig.canvas.manager.set_window_title(filename)
+    plt.show()
@@ -1,9 +1,20 @@
+import os
 import streamlit as st
 import pandas as pd
 import numpy as np
-import matplotlib.pyplot as plt
-import matplotlib.patheffects as path_effects
-from datetime import datetime, timedelta
+import ingest
+import dataset
+import data_generator
+import schema
+import fraud_rules
+import partition
+import topk
+import instrumentation
+import charts
+import export
+import sketches
+import traffic
+import anomaly
 
 # --- Page Configuration ---
 st.set_page_config(page_title="Telecom Analytics", page_icon="📊", layout="wide")
@@ -24,172 +35,263 @@ st.markdown(
     "Interactive dashboard analyzing **1 Million Records** (Real-time Simulation logic synced with Data Generator).")
 
 
+# Optional directory of day/hour-partitioned files (plain or gzipped CSV, Parquet, .tlog) read instead of one file
+DATA_DIR = os.environ.get("TELECOM_DATA_DIR")
+
+# Usage segments: Low < 100MB <= Medium <= 300MB < High
+SEGMENT_LABELS = ['Low User', 'Medium User', 'High User']
+SEGMENT_EDGES = [100.0, np.nextafter(300.0, np.inf)]
+
+
 # --- 1. Load & Generate Data (Exact logic from data_generator.py) ---
-@st.cache_data
+@st.cache_resource
 def load_data():
     """
-    Tries to load 'telecom_data_large.csv'.
-    If not found (e.g., on Hugging Face), it generates 1M records using
-    the EXACT logic from data_generator.py.
+    Tries to load the TELECOM_DATA_DIR dataset when set, else 'telecom_data_large.tlog'
+    (mapped binary store), then 'telecom_data_large.csv'.
+    If none is found (e.g., on Hugging Face), it generates 1M records with
+    data_generator.generate_dataframe.
+
+    Built once per server process and shared by every session (st.cache_resource:
+    no per-session pickled copy). The partitioned frames are frozen read-only;
+    sessions only take slices and summaries of them.
     """
     try:
-        # 1. Try Loading Local File
-        df = pd.read_csv('telecom_data_large.csv')
-        df['Date'] = pd.to_datetime(df['Date'])
-        source = "Local CSV"
+        # 1. Try Loading Local Files: a partitioned directory is read by a thread pool; the .tlog store is
+        #    mapped without decoding; the CSV goes through the columnar cache (Date already parsed; a cold
+        #    cache is built with one parser process per core)
+        if DATA_DIR:
+            files = dataset.Dataset(DATA_DIR)
+            df = files.read(columns=['Date', 'Duration', 'Data_Usage', 'Call_Type'])
+            source = f"Partitioned dataset ({len(files)} files)"
+        else:
+            if os.path.exists('telecom_data_large.tlog'):
+                filename, source = 'telecom_data_large.tlog', "Local binary store (mmap)"
+            else:
+                filename, source = 'telecom_data_large.csv', "Local CSV"
+            df = ingest.read_columns(filename, ['Date', 'Duration', 'Data_Usage', 'Call_Type'], workers=0)
 
     except FileNotFoundError:
-        # 2. Generate Data (Fallback for Server) - Logic from data_generator.py
+        # 2. Generate Data (Fallback for Server) - shared data_generator module, noise included
         source = "Generated In-Memory"
-        num_records = 1000000
-
-        # Date Logic
-        end_date = datetime.now()
-        start_date = end_date - timedelta(days=30)
-        start_ts = start_date.timestamp()
-        end_ts = end_date.timestamp()
-
-        random_timestamps = np.random.uniform(start_ts, end_ts, num_records)
-        dates = pd.to_datetime(random_timestamps, unit='s')
-
-        # Call Type Logic (Weighted)
-        types = ['Internal', 'International', 'Roaming', 'Emergency']
-        call_types = np.random.choice(types, size=num_records, p=[0.60, 0.30, 0.05, 0.05])
+        df = data_generator.generate_dataframe(1000000)
 
-        # Duration Logic
-        durations = np.random.randint(10, 3600, size=num_records)
+    # --- Preprocessing & Cleaning (Applied to both Loaded and Generated data) ---
+    initial_count = len(df)
 
-        # Data Usage Logic (with 30% zeros)
-        usage_raw = np.random.uniform(5, 500, num_records)
-        zero_mask = np.random.random(num_records) < 0.3
-        data_usage = np.where(zero_mask, 0.0, usage_raw)
-        data_usage = np.round(data_usage, 2)
+    # 1.-2. NaNs and negative Durations (from noise injection) are masked, not filtered out: the
+    #       columns of a mapped store stay views of the map until the partitioned layout is built
+    valid = (df['Data_Usage'].notna() & (df['Duration'] > 0)).to_numpy()
 
-        # Create DataFrame
-        df = pd.DataFrame({
-            'Date': dates,
-            'Duration': durations,
-            'Data_Usage': data_usage,
-            'Call_Type': call_types,
-        })
+    cleaned_count = int(np.count_nonzero(valid))
+    removed_rows = initial_count - cleaned_count
 
-        # Inject Noise (Exact Logic)
-        random_indices = np.random.choice(df.index, 20, replace=False)
-        df.loc[random_indices, 'Duration'] = -100
+    # 3. Compact schema (categorical Call_Type, int32/float32 numerics; Hour is added by the partitioned layout)
+    bytes_before = schema.bytes_per_row(df)
+    df = schema.compact_frame(df)
+    memory = (bytes_before, schema.bytes_per_row(df))
 
-        random_indices_null = np.random.choice(df.index, 20, replace=False)
-        df.loc[random_indices_null, 'Data_Usage'] = np.nan
+    # 4. Time-sorted, Call_Type-partitioned layout with prefix sums ("dashboard" fraud profile,
+    #    usage segments) so every date-range / time-of-day query is a few binary searches; the
+    #    anomaly table also lists rows far above their Call_Type/hour baseline, with their z-score
+    fraud_mask, _ = fraud_rules.load_rules('dashboard').evaluate(df, valid)
+    scores, _ = anomaly.score_frame(df, valid=valid)
+    suspicious_mask = fraud_mask | (scores > anomaly.DEFAULT_THRESHOLD)
+    data = partition.PartitionedFrame(df, fraud_mask=fraud_mask, valid=valid,
+                                      segment_edges=SEGMENT_EDGES, segment_labels=SEGMENT_LABELS).freeze()
+    fraud_rows = partition.PartitionedFrame(
+        df[suspicious_mask].assign(**{anomaly.SCORE_COLUMN: scores[suspicious_mask].astype(np.float32)})).freeze()
 
-    # --- Preprocessing & Cleaning (Applied to both Loaded and Generated data) ---
-    initial_count = len(df)
+    # 5. Percentile / busiest-minute sketches (one pass; accuracy from TELECOM_SKETCH_ACCURACY etc.)
+    approx = sketches.ApproxSummary().update(df, valid)
 
-    # 1. Handle NaNs (from noise injection)
-    df = df.dropna(subset=['Data_Usage'])
+    return data, fraud_rows, approx, removed_rows, source, memory
 
-    # 2. Handle Negative Duration (from noise injection)
-    df = df[df['Duration'] > 0]
 
-    # 3. Add Hour column
-    df['Hour'] = df['Date'].dt.hour
+@st.cache_resource
+def traffic_bins(resolution):
+    """Busy-hour / Erlang bins of the whole dataset at one resolution, shared by every session."""
+    data = load_data()[0]
+    return traffic.TrafficBins(resolution).update(data.frame)
 
-    cleaned_count = len(df)
-    removed_rows = initial_count - cleaned_count
-
-    return df, removed_rows, source
 
+# Optional per-stage timing (no overhead when unchecked)
+show_performance = st.sidebar.checkbox("⏱ Show performance panel", value=False)
+if show_performance:
+    instrumentation.enable()
+    instrumentation.reset()
+else:
+    instrumentation.disable()
 
 # Execute Load
-with st.spinner('Processing 1 Million Records...'):
-    df, removed_rows, data_source = load_data()
+with st.spinner('Processing 1 Million Records...'), instrumentation.stage('load_data'):
+    data, fraud_rows, approx, removed_rows, data_source, memory_per_row = load_data()
 
 # FarhadSeddighi Telecom_log1
-if df is not None:
+if data is not None:
+    # --- Time Window (binary search over the time-sorted partitions, no scan of Date) ---
+    st.sidebar.subheader("🕒 Time Window")
+    first_ts, last_ts = data.time_bounds()
+    date_range = st.sidebar.date_input("Date Range:", value=(first_ts.date(), last_ts.date()),
+                                       min_value=first_ts.date(), max_value=last_ts.date())
+    if not isinstance(date_range, (tuple, list)):
+        date_range = (date_range,)
+    start_date, end_date = date_range[0], date_range[-1]  # a single day while the second date is being picked
+    hour_window = st.sidebar.slider("Time of Day (hours):", 0, 23, (0, 23))
+    window = dict(start=pd.Timestamp(start_date), end=pd.Timestamp(end_date) + pd.Timedelta(days=1),
+                  hours=hour_window)
+
     # --- 2. KPI Section ---
     st.subheader(f"📌 Key Performance Indicators (Source: {data_source})")
 
-    # Fraud Definition
-    high_duration_limit = 3000
-    high_data_limit = 400
-    # Note: Using copy() to avoid SettingWithCopyWarning on slices
-    fraud_df = df[(df['Duration'] > high_duration_limit) | (df['Data_Usage'] > high_data_limit)].copy()
-    fraud_count = len(fraud_df)
+    with instrumentation.stage('KPIs + fraud rules', rows=len(data)):
+        # KPIs from prefix sums over the selected window
+        summary = data.summarize(**window)
+        totals = summary.totals
+
+        # Fraud Definition ("dashboard" profile of fraud_rules.json; flagged rows extracted at load time)
+        fraud_rule_set = fraud_rules.load_rules('dashboard')
+        fraud_df = fraud_rows.rows(**window)
+        _, rule_hits = fraud_rule_set.evaluate(fraud_df)
+        fraud_count = totals['fraud_count']
+
+        total_data_tb = totals['usage_sum'] / 1024 / 1024  # Convert MB to TB
+        avg_duration = totals['duration_sum'] / totals['calls'] if totals['calls'] else 0
 
     # Layout Columns
     kpi1, kpi2, kpi3, kpi4 = st.columns(4)
 
-    total_data_tb = df['Data_Usage'].sum() / 1024 / 1024  # Convert MB to TB
-
-    kpi1.metric("Total Active Records", f"{len(df):,}", delta=f"-{removed_rows} noise cleaned")
+    kpi1.metric("Total Active Records", f"{totals['calls']:,}", delta=f"-{removed_rows} noise cleaned")
     kpi2.metric("Total Data Traffic", f"{total_data_tb:.2f} TB")
-    kpi3.metric("Avg Duration", f"{df['Duration'].mean():.0f} sec")
+    kpi3.metric("Avg Duration", f"{avg_duration:.0f} sec")
     kpi4.metric("⚠️ Suspicious Activity", f"{fraud_count}", delta_color="inverse")
+    st.caption(f"In-memory footprint: {memory_per_row[0]:.1f} → {memory_per_row[1]:.1f} bytes/row "
+               f"({memory_per_row[1] * len(data) / 1024 ** 2:.0f} MB total, compact schema)")
+
+    # Percentile KPIs (whole dataset, from the sketches built at load time)
+    with instrumentation.stage('KPIs: percentiles'):
+        duration_pct = approx.overall('Duration')
+        usage_pct = approx.overall('Data_Usage')
+    pct_cols = st.columns(6)
+    for col, (name, value) in zip(pct_cols[:3], duration_pct.items()):
+        col.metric(f"Duration {name}", f"{value:,.0f} sec")
+    for col, (name, value) in zip(pct_cols[3:], usage_pct.items()):
+        col.metric(f"Data Usage {name}", f"{value:,.1f} MB")
+    st.caption(f"Percentiles over all {approx.rows:,} records (sketch estimates: {approx.describe_bounds()})")
+
+    with st.expander("📐 Percentiles by Call Type / Hour & Busiest Minutes"):
+        measure = st.radio("Measure:", sketches.MEASURES, horizontal=True)
+        pct_col1, pct_col2, pct_col3 = st.columns([2, 3, 2])
+        pct_col1.dataframe(approx.percentiles(measure).round(1), width='stretch')
+        pct_col2.dataframe(approx.percentiles(measure, by='Hour').round(1), height=300, width='stretch')
+        pct_col3.dataframe(approx.busiest_minutes(), width='stretch')
 
     st.divider()
 
     # --- 3. Charts Row 1 ---
     col1, col2 = st.columns(2)
 
-    with col1:
+    with col1, instrumentation.stage('chart: hourly traffic'):
         st.subheader("📈 Hourly Network Traffic")
-        hourly_traffic = df.groupby('Hour').size()
+        hourly_traffic = summary.hourly
         st.line_chart(hourly_traffic)
         st.caption("Peak traffic hours based on call frequency.")
 
-    with col2:
+    with col2, instrumentation.stage('chart: call type distribution'):
         st.subheader("📊 Call Type Distribution")
         # Matches logic: Internal, International, Roaming, Emergency
-        type_counts = df['Call_Type'].value_counts()
+        type_counts = summary.by_key['calls'].sort_values(ascending=False)
         st.bar_chart(type_counts)
         st.caption("Volume comparison by connection type.")
 
     st.divider()
 
-    # --- 4. Advanced Analysis ---
+    # --- 4. Traffic Engineering (per-day busy hour; the time-of-day filter does not apply) ---
+    st.subheader("📞 Traffic Engineering: Daily Busy Hour")
+    resolution = st.radio("Interval:", list(traffic.RESOLUTIONS), horizontal=True,
+                          index=list(traffic.RESOLUTIONS).index(traffic.DEFAULT_RESOLUTION))
+    with instrumentation.stage('traffic: busy hours', rows=len(data)):
+        bins = traffic_bins(resolution)
+        busy_hours = bins.busy_hours()
+        days = busy_hours.index.get_level_values('Day')
+        busy_hours = busy_hours[(days >= window['start']) & (days < window['end'])]
+
+    if len(busy_hours):
+        daily = busy_hours.xs(traffic.ALL, level='Call_Type')
+        peak_day = daily['Erlangs'].idxmax()
+        te1, te2, te3, te4 = st.columns(4)
+        te1.metric("Peak Busy-Hour Load", f"{daily['Erlangs'].max():,.1f} Erl",
+                   delta=f"{daily.loc[peak_day, 'Busy_Hour']:%Y-%m-%d %H:%M}", delta_color="off")
+        te2.metric("Mean Busy-Hour Load", f"{daily['Erlangs'].mean():,.1f} Erl")
+        te3.metric("Peak BHCA", f"{daily['BHCA'].max():,}")
+        te4.metric("Mean BHCA", f"{daily['BHCA'].mean():,.0f}")
+
+        te_col1, te_col2 = st.columns([3, 2])
+        with te_col1:
+            st.line_chart(busy_hours['Erlangs'].unstack('Call_Type'))
+            st.caption("Busy-hour offered load per day (Erlangs = call-seconds in the busiest 60 minutes / 3600).")
+        with te_col2:
+            st.dataframe(bins.summary(busy_hours).round(2), width='stretch')
+            table = daily.assign(Busy_Hour=daily['Busy_Hour'].dt.strftime('%H:%M')).round(2)
+            st.dataframe(table, height=220, width='stretch')
+            st.download_button("⬇ Busy hours", data=export.deferred(busy_hours, 'csv', index=True),
+                               file_name='busy_hours.csv', mime=export.MIME_TYPES['csv'])
+    else:
+        st.info("No traffic in the selected date range.")
+
+    st.divider()
+
+    # --- 5. Advanced Analysis ---
     col3, col4 = st.columns([1, 2])
 
-    with col3:
+    with col3, instrumentation.stage('chart: usage segmentation'):
         st.subheader("🍰 Usage Segmentation")
 
-        # Segmentation Logic
-        conditions = [
-            (df['Data_Usage'] > 300),
-            (df['Data_Usage'] >= 100) & (df['Data_Usage'] <= 300),
-            (df['Data_Usage'] < 100)
-        ]
-        labels = ['High User', 'Medium User', 'Low User']
-        df['Segment'] = np.select(conditions, labels, default='Unknown')
-        segment_counts = df['Segment'].value_counts()
-
-        # Pie Chart
-        fig, ax = plt.subplots(figsize=(6, 6))
-        # Custom colors for segments
-        colors = ['#ff9999', '#66b3ff', '#99ff99']
-
-        wedges, texts, autotexts = ax.pie(
-            segment_counts, labels=segment_counts.index, autopct='%1.1f%%',
-            startangle=140, colors=colors, shadow=False
-        )
-
-        # Styling pie chart text
-        plt.setp(autotexts, size=10, weight="bold", color="white")
-        for w in wedges:
-            w.set_path_effects([path_effects.SimplePatchShadow(), path_effects.Normal()])
-
-        st.pyplot(fig)
+        # Segmentation Logic (High > 300MB, Medium 100-300MB, Low < 100MB; binned at load time)
+        segment_counts = summary.segments.sort_values(ascending=False)
+        segment_counts = segment_counts[segment_counts > 0]
+
+        # Pie Chart (cached PNG, redrawn only when the counts change)
+        st.image(charts.render_png('dashboard_segments', segment_counts), width='stretch')
         st.caption("Segments based on Data Usage (MB)")
 
-    with col4:
+    with col4, instrumentation.stage('table: anomaly report'):
         st.subheader("🚨 Anomaly Report")
-        st.info(f"Showing top records exceeding {high_duration_limit}s duration OR {high_data_limit}MB data.")
+        st.info(f"Showing top records matching: {fraud_rule_set.describe()}, or a "
+                f"{anomaly.AnomalyScorer().describe()}")
+        outliers = int((fraud_df[anomaly.SCORE_COLUMN] > anomaly.DEFAULT_THRESHOLD).sum())
+        st.caption(" | ".join([f"{name}: {hits:,} hits" for name, hits in rule_hits.items()] +
+                              [f"statistical: {outliers:,} rows"]))
 
         if not fraud_df.empty:
+            rank_by = st.selectbox("Rank by:", topk.RANKINGS, index=topk.RANKINGS.index('Data_Usage'),
+                                   format_func=topk.RANK_LABELS.get)
+            # Top 100 via argpartition (linear, no full sort of the suspicious rows)
             st.dataframe(
-                fraud_df[['Date', 'Call_Type', 'Duration', 'Data_Usage', 'Hour']].
-                sort_values(by='Data_Usage', ascending=False).head(100),
-                height=300, use_container_width=True
+                topk.top_k(fraud_df, 100, rank_by)[['Date', 'Call_Type', 'Duration', 'Data_Usage', 'Hour',
+                                                    anomaly.SCORE_COLUMN]],
+                height=300, width='stretch'
             )
+
+            # Full exports, generated chunk by chunk into a temp file only when a button is clicked
+            export_fmt = st.selectbox("Export format:", export.FORMATS)
+            dl_col1, dl_col2 = st.columns(2)
+            dl_col1.download_button(f"⬇ All {len(fraud_df):,} anomalies",
+                                    data=export.deferred(fraud_df[['Date', 'Call_Type', 'Duration', 'Data_Usage',
+                                                                   anomaly.SCORE_COLUMN]], export_fmt),
+                                    file_name=export.with_format('anomaly_report', export_fmt),
+                                    mime=export.MIME_TYPES[export_fmt])
+            dl_col2.download_button("⬇ Hourly traffic", data=export.deferred(summary.hourly.to_frame(), export_fmt,
+                                                                              index=True),
+                                    file_name=export.with_format('hourly_traffic', export_fmt),
+                                    mime=export.MIME_TYPES[export_fmt])
         else:
             st.success("No anomalies detected.")
 
 else:
     st.error("Error loading data.")
+
+# --- Performance Panel ---
+if show_performance:
+    with st.expander("⏱ Performance (this rerun)", expanded=True):
+        st.dataframe(pd.DataFrame(instrumentation.records()), width='stretch')
@@ -1,64 +1,199 @@
+import os
+import argparse
 import pandas as pd
 import numpy as np
 from datetime import datetime, timedelta
+from concurrent.futures import ProcessPoolExecutor
+
+import logstore
+
+try:
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+    import pyarrow.ipc as ipc
+except ImportError:
+    pa = None
 
 RED = '\033[91m'
 GREEN = '\033[3;2;32m'
 ITALIC = '\033[3m'
 END = '\033[0m'
 
+CALL_TYPES = ['Internal', 'International', 'Roaming', 'Emergency']
+CALL_TYPE_WEIGHTS = [0.60, 0.30, 0.05, 0.05]
+NOISE_RECORDS = 20  # rows with Duration = -100, and rows with Data_Usage = NaN
+DEFAULT_CHUNK_SIZE = 1000000
+SEEDED_END_DATE = '2025-01-01'  # anchor of seeded runs without an end date, so the Date column is reproducible
+FORMATS = {'.csv': 'csv', '.parquet': 'parquet', '.arrow': 'arrow', '.feather': 'arrow', '.tlog': 'tlog'}
 
-def generate_large_dataset(filename, num_records=1000000):
-    print(f"\n--- {RED}Starting data generation for {num_records} records ---{END}")
 
-    end_date = datetime.now()
-    start_date = end_date - timedelta(days=30)
+def time_window(end_date=None, days=30):
+    """(start, end) epoch seconds of the `days` before end_date (now by default; naive dates are UTC)."""
+    end_ts = datetime.now().timestamp() if end_date is None else pd.Timestamp(end_date).timestamp()
+    return end_ts - timedelta(days=days).total_seconds(), end_ts
 
-    start_ts = start_date.timestamp()
-    end_ts = end_date.timestamp()
 
-    print("Generating Dates...")
-    random_timestamps = np.random.uniform(start_ts, end_ts, num_records)
+def generate_chunk(num_records, rng, start_ts, end_ts):
+    """One block of synthetic CDRs (same distributions as the original generator, no noise)."""
+    random_timestamps = rng.uniform(start_ts, end_ts, num_records)
     dates = pd.to_datetime(random_timestamps, unit='s')
 
-    # 3. تولید نوع تماس (با احتمالات وزن‌دار)
-    print("Generating Call Types...")
-    types = ['Internal', 'International', 'Roaming', 'Emergency']
-    call_types = np.random.choice(types, size=num_records, p=[0.60, 0.30, 0.05, 0.05])
+    # تولید نوع تماس (با احتمالات وزن‌دار)
+    call_types = rng.choice(CALL_TYPES, size=num_records, p=CALL_TYPE_WEIGHTS)
+    durations = rng.integers(10, 3600, size=num_records)
 
-    print("Generating Durations...")
-    durations = np.random.randint(10, 3600, size=num_records)
+    usage_raw = rng.uniform(5, 500, num_records)
+    zero_mask = rng.random(num_records) < 0.3
+    data_usage = np.round(np.where(zero_mask, 0.0, usage_raw), 2)
 
-    print("Generating Data Usage...")
-    usage_raw = np.random.uniform(5, 500, num_records)
-    zero_mask = np.random.random(num_records) < 0.3
-
-    data_usage = np.where(zero_mask, 0.0, usage_raw)
-    data_usage = np.round(data_usage, 2)
-
-    print("Creating DataFrame...")
-    df = pd.DataFrame({
+    return pd.DataFrame({
         'Date': dates,
         'Duration': durations,
         'Data_Usage': data_usage,
         'Call_Type': call_types,
     })
 
-    print("Injecting Noise (Errors)...")
-    random_indices = np.random.choice(df.index, 20, replace=False)
-    df.loc[random_indices, 'Duration'] = -100
 
-    random_indices_null = np.random.choice(df.index, 20, replace=False)
-    df.loc[random_indices_null, 'Data_Usage'] = np.nan
+def plan_chunks(num_records, chunk_size, seed=None, noise=True, end_date=None):
+    """
+    Splits the dataset into independent chunk specs. Every chunk gets its own
+    child seed (SeedSequence.spawn), so output is identical for any worker count.
+    Noise rows are drawn once over the whole dataset and handed to their chunks.
+    A seeded plan without `end_date` ends at SEEDED_END_DATE instead of now.
+    """
+    if end_date is None and seed is not None:
+        end_date = SEEDED_END_DATE
+    root = np.random.SeedSequence(seed)
+    noise_rng = np.random.default_rng(root.spawn(1)[0])
+    start_ts, end_ts = time_window(end_date)
+
+    if noise and num_records >= NOISE_RECORDS:
+        negative_rows = noise_rng.choice(num_records, NOISE_RECORDS, replace=False)
+        null_rows = noise_rng.choice(num_records, NOISE_RECORDS, replace=False)
+    else:
+        negative_rows = null_rows = np.array([], dtype=np.int64)
+
+    starts = range(0, num_records, chunk_size)
+    child_seeds = root.spawn(len(starts))
+    specs = []
+    for offset, child in zip(starts, child_seeds):
+        n = min(chunk_size, num_records - offset)
+        specs.append({'offset': offset, 'num_records': n, 'seed': child, 'start_ts': start_ts, 'end_ts': end_ts,
+                      'negative_rows': _rows_in(negative_rows, offset, n),
+                      'null_rows': _rows_in(null_rows, offset, n)})
+    return specs
+
+
+def _rows_in(rows, offset, n):
+    """Global row numbers that fall in [offset, offset + n), made chunk-local."""
+    return rows[(rows >= offset) & (rows < offset + n)] - offset
+
+
+def build_chunk(spec):
+    df = generate_chunk(spec['num_records'], np.random.default_rng(spec['seed']), spec['start_ts'], spec['end_ts'])
+    df.index += spec['offset']
+    if len(spec['negative_rows']):
+        df.iloc[spec['negative_rows'], df.columns.get_loc('Duration')] = -100
+    if len(spec['null_rows']):
+        df.iloc[spec['null_rows'], df.columns.get_loc('Data_Usage')] = np.nan
+    return df
+
+
+def _chunk_payload(spec, fmt):
+    """Runs in a worker: builds the chunk and, for CSV, also formats it (the expensive part)."""
+    df = build_chunk(spec)
+    if fmt == 'csv':
+        return df.to_csv(index=False, header=spec['offset'] == 0).encode('utf-8')
+    return df
+
+
+def iter_chunks(specs, fmt=None, workers=1):
+    """Yields chunk payloads in order; at most 2 x workers chunks are in flight at once."""
+    if workers <= 1:
+        for spec in specs:
+            yield _chunk_payload(spec, fmt)
+        return
+
+    with ProcessPoolExecutor(max_workers=workers) as pool:
+        pending = []
+        for spec in specs:
+            pending.append(pool.submit(_chunk_payload, spec, fmt))
+            if len(pending) >= 2 * workers:
+                yield pending.pop(0).result()
+        for future in pending:
+            yield future.result()
+
+
+def generate_dataframe(num_records, seed=None, noise=True, end_date=None, chunk_size=DEFAULT_CHUNK_SIZE):
+    """In-memory dataset with the generator's distributions (used by the dashboards' demo mode)."""
+    specs = plan_chunks(num_records, chunk_size, seed, noise, end_date)
+    return pd.concat(list(iter_chunks(specs)))
+
+
+def write_dataset(filename, specs, fmt, workers=1):
+    """Streams chunks into `filename` as CSV, Parquet, Arrow IPC or a .tlog store; returns rows written."""
+    if fmt not in ('csv', 'tlog') and pa is None:
+        raise ImportError(f"pyarrow is required to write {fmt} files")
+
+    tmp = filename + ".tmp"
+    rows = sum(spec['num_records'] for spec in specs)
+    if fmt == 'tlog':
+        # fixed-width blocks: the size is known up front, chunks are copied into a writable map
+        store = logstore.LogWriter(tmp, rows)
+        for spec, payload in zip(specs, iter_chunks(specs, fmt, workers)):
+            store.write(payload, spec['offset'])
+        store.close()
+        os.replace(tmp, filename)
+        return rows
+
+    writer = None
+    with open(tmp, 'wb') as sink:
+        for payload in iter_chunks(specs, fmt, workers):
+            if fmt == 'csv':
+                sink.write(payload)
+                continue
+            table = pa.Table.from_pandas(payload, preserve_index=False)
+            if writer is None:
+                writer = pq.ParquetWriter(sink, table.schema) if fmt == 'parquet' else ipc.new_file(sink, table.schema)
+            writer.write_table(table)
+        if writer is not None:
+            writer.close()
+    os.replace(tmp, filename)
+    return rows
+
+
+def generate_large_dataset(filename, num_records=1000000, seed=None, workers=0,
+                           chunk_size=DEFAULT_CHUNK_SIZE, fmt=None, end_date=None):
+    """
+    Writes `num_records` synthetic CDRs to `filename`, chunk by chunk, from a
+    process pool (workers=0: one per CPU). The format follows the extension
+    (.csv, .parquet, .arrow/.feather, .tlog) unless `fmt` is given.
+    """
+    print(f"\n--- {RED}Starting data generation for {num_records} records ---{END}")
+    fmt = fmt or FORMATS.get(os.path.splitext(filename)[1].lower(), 'csv')
+    workers = workers if workers and workers > 0 else (os.cpu_count() or 1)
 
-    print(f"Saving to CSV ({filename})...")
-    df.to_csv(filename, index=False)
+    print(f"Generating {fmt.upper()} in chunks of {chunk_size} rows with {workers} workers...")
+    specs = plan_chunks(num_records, chunk_size, seed, noise=True, end_date=end_date)
+    rows = write_dataset(filename, specs, fmt, workers)
 
-    file_size_mb = len(df) * 50 / (1024 * 1024)  # تخمین تقریبی حجم
-    print(f"\nSUCCESSFULLY CREATED {GREEN}'{filename}'{END} WITH {GREEN}{len(df)}{END} RECORDS.")
-    print(f"{ITALIC}File size is approx {file_size_mb:.1f} MB{END}")
+    file_size_mb = os.path.getsize(filename) / (1024 * 1024)
+    print(f"\nSUCCESSFULLY CREATED {GREEN}'{filename}'{END} WITH {GREEN}{rows}{END} RECORDS.")
+    print(f"{ITALIC}File size is {file_size_mb:.1f} MB{END}")
     print(f"\n{RED}--- Data generation complete ---{END}")
 
 
 if __name__ == "__main__":
-    generate_large_dataset('telecom_data_sample.csv', num_records=1000000)
+    parser = argparse.ArgumentParser(description="Synthetic telecom CDR generator")
+    parser.add_argument('filename', nargs='?', default='telecom_data_sample.csv')
+    parser.add_argument('-n', '--records', type=int, default=1000000)
+    parser.add_argument('--seed', type=int, default=None)
+    parser.add_argument('--end-date', type=pd.Timestamp, default=None, metavar='DATE',
+                        help=f"end of the 30-day window (UTC; default: now, or {SEEDED_END_DATE} with --seed)")
+    parser.add_argument('--workers', type=int, default=0, help="0 = one per CPU")
+    parser.add_argument('--chunk-size', type=int, default=DEFAULT_CHUNK_SIZE)
+    parser.add_argument('--format', choices=sorted(set(FORMATS.values())), default=None)
+    args = parser.parse_args()
+
+    generate_large_dataset(args.filename, num_records=args.records, seed=args.seed, workers=args.workers,
+                           chunk_size=args.chunk_size, fmt=args.format, end_date=args.end_date)
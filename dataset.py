@@ -0,0 +1,176 @@
+"""
+A directory of day/hour-partitioned CDR files, read as one dataset.
+
+    ds = dataset.Dataset('cdr/')                         # cdr/date=2024-01-05/hour=13/part-0.csv.gz, ...
+    ds.partitions('2024-01-05', '2024-01-06')            # pruned from the paths alone, nothing is opened
+    df = ds.read('2024-01-05', '2024-01-06', workers=8)  # matching rows of the day's files, read in threads
+    for frame in ds.iter_frames(start, end):             # bounded memory: one file at a time, in time order
+        state.update(frame)
+
+Partition times are taken from the relative path: hive-style date=YYYY-MM-DD
+(+ hour=HH) components, YYYY/MM/DD directories, or a YYYY-MM-DD / YYYYMMDD
+stamp in a file name, optionally followed by _HH or THH for hourly files.
+Files without a recognisable date are never pruned (their rows are still
+filtered by Date). Files can be CSV (plain or .gz/.bz2/.xz/.zip/.zst),
+Parquet or .tlog stores. CSVs are parsed directly, without the ingest cache:
+a partition is read once per query, and a Parquet copy of every file would
+double the disk use of the dataset.
+
+The readers are threads: pandas' CSV parser, decompression and Parquet
+decoding release the GIL for most of their work, and the file order is kept.
+"""
+import os
+import re
+from collections import namedtuple
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timedelta
+
+import numpy as np
+import pandas as pd
+
+import ingest
+import logstore
+import schema
+from instrumentation import stage
+
+DATA_SUFFIXES = ('.csv', '.csv.gz', '.csv.bz2', '.csv.xz', '.csv.zip', '.csv.zst', '.parquet', '.tlog')
+DEFAULT_READERS = min(8, (os.cpu_count() or 1) * 2)  # threads: reads are mostly I/O and GIL-free parsing
+
+DATE_PATTERNS = [
+    re.compile(r'(?:^|/)date=(?P<y>\d{4})-(?P<m>\d{2})-(?P<d>\d{2})(?=/|$)'),
+    re.compile(r'(?:^|/)(?P<y>\d{4})/(?P<m>\d{2})/(?P<d>\d{2})(?=/|$)'),
+    re.compile(r'(?<!\d)(?P<y>\d{4})-?(?P<m>\d{2})-?(?P<d>\d{2})(?:[T_](?P<h>\d{2}))?(?!\d)'),
+]
+HOUR_PATTERN = re.compile(r'(?:^|/)hour=(?P<h>\d{2})(?=/|$)')
+
+# start/end: the time span [start, end) the file's rows belong to (None = unknown, never pruned)
+Partition = namedtuple('Partition', ['path', 'start', 'end'])
+
+
+def partition_span(relative_path):
+    """(start, end) datetimes of a file from its path relative to the dataset root, or (None, None)."""
+    path = relative_path.replace(os.sep, '/')
+    for pattern in DATE_PATTERNS:
+        matches = list(pattern.finditer(path))
+        if not matches:
+            continue
+        match = matches[-1]
+        try:
+            day = datetime(int(match['y']), int(match['m']), int(match['d']))
+        except ValueError:
+            continue
+        hour = match.groupdict().get('h')
+        if hour is None:
+            hour_match = HOUR_PATTERN.search(path)
+            hour = hour_match['h'] if hour_match else None
+        if hour is not None and int(hour) < 24:
+            start = day + timedelta(hours=int(hour))
+            return start, start + timedelta(hours=1)
+        return day, day + timedelta(days=1)
+    return None, None
+
+
+def is_data_file(name):
+    return not name.startswith(('.', '_')) and name.lower().endswith(DATA_SUFFIXES)
+
+
+def read_file(path, columns=None):
+    """One partition file as a raw frame with canonical columns and a parsed Date."""
+    if path.lower().endswith('.parquet'):
+        df = schema.normalize_columns(pd.read_parquet(path))
+        if columns is not None:
+            df = df[columns]
+        if 'Date' in df.columns and not pd.api.types.is_datetime64_any_dtype(df['Date']):
+            df['Date'] = schema.parse_dates(df['Date'])
+        return df
+    if logstore.is_logstore(path):
+        return ingest.read_columns(path, columns)
+    df = ingest.read_source_csv(path, columns)
+    return df if columns is None else df[[column for column in columns if column in df.columns]]
+
+
+def clip(df, start=None, end=None):
+    """
+    Rows with start <= Date < end (the frame itself when every row matches).
+    Rows without a Date are kept, so cleaning drops and counts them in na_removed
+    as it does for an unclipped read.
+    """
+    if start is None and end is None:
+        return df
+    dates = np.asarray(df['Date'], dtype='datetime64[ns]')
+    keep = np.ones(len(df), dtype=bool)
+    if start is not None:
+        keep &= dates >= np.datetime64(pd.Timestamp(start).value, 'ns')
+    if end is not None:
+        keep &= dates < np.datetime64(pd.Timestamp(end).value, 'ns')
+    keep |= np.isnat(dates)
+    return df if keep.all() else df[keep]
+
+
+class Dataset:
+    """
+    Every data file under `root` (recursively), ordered by partition time then path.
+    `root` may also be a single file, which is then the only (unpruned) partition.
+    """
+
+    def __init__(self, root):
+        self.root = root
+        if os.path.isfile(root):
+            self.files = [Partition(root, None, None)]
+            return
+        if not os.path.isdir(root):
+            raise FileNotFoundError(root)
+        files = []
+        for directory, subdirs, names in os.walk(root):
+            subdirs[:] = sorted(d for d in subdirs if not d.startswith(('.', '_')))
+            for name in names:
+                if is_data_file(name):
+                    path = os.path.join(directory, name)
+                    files.append(Partition(path, *partition_span(os.path.relpath(path, root))))
+        self.files = sorted(files, key=lambda p: (p.start is None, p.start or datetime.min, p.path))
+
+    def __len__(self):
+        return len(self.files)
+
+    def partitions(self, start=None, end=None):
+        """Files whose span overlaps [start, end); decided from the paths, without opening anything."""
+        start = None if start is None else pd.Timestamp(start)
+        end = None if end is None else pd.Timestamp(end)
+        return [p for p in self.files
+                if p.start is None
+                or ((end is None or p.start < end) and (start is None or p.end > start))]
+
+    def iter_frames(self, start=None, end=None, columns=None, workers=DEFAULT_READERS):
+        """
+        Raw frames of the matching files, clipped to [start, end), in partition order.
+        At most 2 x workers files are in flight, so memory stays bounded.
+        """
+        parts = self.partitions(start, end)
+
+        def load(part):
+            with stage('dataset.read_file') as timer:
+                df = clip(read_file(part.path, columns), start, end)
+                timer.set_rows(len(df))
+            return df
+
+        if workers <= 1 or len(parts) <= 1:
+            for part in parts:
+                yield load(part)
+            return
+        with ThreadPoolExecutor(max_workers=workers) as pool:
+            pending = []
+            for part in parts:
+                pending.append(pool.submit(load, part))
+                if len(pending) >= 2 * workers:
+                    yield pending.pop(0).result()
+            for future in pending:
+                yield future.result()
+
+    def read(self, start=None, end=None, columns=None, workers=DEFAULT_READERS):
+        """All matching rows as one frame (index renumbered)."""
+        frames = [df for df in self.iter_frames(start, end, columns, workers) if len(df)]
+        if not frames:
+            return pd.DataFrame(columns=columns or schema.REQUIRED_COLUMNS)
+        if len(frames) == 1:
+            return frames[0].reset_index(drop=True)
+        return pd.concat(frames, ignore_index=True)
@@ -0,0 +1,243 @@
+"""
+Bulk export of fraud rows and aggregate tables to CSV, gzipped CSV or Parquet.
+
+    export.write_frame(fraud_df, 'suspicious_report.csv.gz', workers=4)   # chunked, formatted in 4 processes
+
+    with export.ExportWriter('suspicious_report.parquet') as out:        # streaming runs: one chunk at a time
+        for chunk in chunks:
+            out.write(fraud_rows(chunk))
+
+Frames are written `chunk_rows` rows at a time, so no export ever holds
+the whole payload as one string. CSV chunks are formatted (and, for
+.csv.gz, compressed as independent gzip members, which every gzip reader
+concatenates) in a process pool when workers > 1; the file is still written
+in row order. Parquet gets one row group per chunk. A file that received
+only empty frames still gets their header (CSV) or schema (Parquet).
+
+`export_file` writes to a temporary file for the Streamlit download buttons,
+which hand the open file to st.download_button from a deferred callable.
+"""
+import os
+import gzip
+import shutil
+import tempfile
+from concurrent.futures import ProcessPoolExecutor
+
+import pandas as pd
+
+try:
+    import pyarrow as pa  # pyarrow.parquet is only imported by Parquet exports (it slows CLI start-up)
+except ImportError:
+    pa = None
+
+EXPORT_CHUNK_ROWS = 250000
+GZIP_LEVEL = 1  # ~4x faster than 6 on CDR text for ~15% larger files
+FORMATS = ['csv', 'csv.gz', 'parquet']
+SUFFIXES = {'csv': '.csv', 'csv.gz': '.csv.gz', 'parquet': '.parquet'}
+MIME_TYPES = {'csv': 'text/csv', 'csv.gz': 'application/gzip', 'parquet': 'application/vnd.apache.parquet'}
+
+
+def format_of(filename):
+    """Export format implied by a file name (csv when unknown)."""
+    name = filename.lower()
+    if name.endswith('.csv.gz') or name.endswith('.gz'):
+        return 'csv.gz'
+    if name.endswith('.parquet'):
+        return 'parquet'
+    return 'csv'
+
+
+def with_format(filename, fmt):
+    """`filename` with its csv / csv.gz / parquet suffix replaced by the one of `fmt`."""
+    for suffix in sorted(SUFFIXES.values(), key=len, reverse=True):
+        if filename.lower().endswith(suffix):
+            filename = filename[:-len(suffix)]
+            break
+    return filename + SUFFIXES[fmt]
+
+
+def _csv_payload(df, header, compress, index=False):
+    """Runs in a worker: one chunk as CSV bytes, optionally as its own gzip member."""
+    data = df.to_csv(index=index, header=header).encode('utf-8')
+    return gzip.compress(data, compresslevel=GZIP_LEVEL, mtime=0) if compress else data
+
+
+class ExportWriter:
+    """
+    Appends frames to one export file. `target` is a path or a binary file
+    object (e.g. an open temp file); `header` is only written before the first row.
+    """
+
+    def __init__(self, target, fmt=None, workers=1, chunk_rows=EXPORT_CHUNK_ROWS, header=True, index=False):
+        self.fmt = fmt or (format_of(target) if isinstance(target, str) else 'csv')
+        if self.fmt not in FORMATS:
+            raise ValueError(f"Unknown export format {self.fmt!r}; expected one of {FORMATS}")
+        if self.fmt == 'parquet' and pa is None:
+            raise ImportError("pyarrow is required to export Parquet files")
+        self.path = target if isinstance(target, str) else None
+        self.sink = open(self.path + '.tmp', 'wb') if self.path else target
+        self.workers = workers if workers and workers > 0 else (os.cpu_count() or 1)
+        self.chunk_rows = chunk_rows
+        self.header = header
+        self.index = index
+        self.rows = 0
+        self.pool = None  # started once there is more than one chunk to format
+        self.pending = []
+        self.parquet = None
+        self.empty = None  # the columns of the first frame, for a header / schema when no row arrives
+
+    def write(self, df):
+        if self.empty is None:
+            self.empty = df.iloc[:0]
+        if self.pool is None and self.workers > 1 and self.fmt != 'parquet' and (self.rows or len(df) > self.chunk_rows):
+            self.pool = ProcessPoolExecutor(max_workers=self.workers)
+        for start in range(0, len(df), self.chunk_rows):
+            self._write_chunk(df.iloc[start:start + self.chunk_rows])
+        return self
+
+    def _write_chunk(self, chunk):
+        if self.fmt == 'parquet':
+            table = pa.Table.from_pandas(chunk, preserve_index=self.index)
+            if self.parquet is None:
+                import pyarrow.parquet as pq
+                self.parquet = pq.ParquetWriter(self.sink, table.schema)
+            self.parquet.write_table(table.cast(self.parquet.schema))
+        else:
+            args = (chunk, self.header and self.rows == 0, self.fmt == 'csv.gz', self.index)
+            if self.pool is None:
+                self.sink.write(_csv_payload(*args))
+            else:
+                self.pending.append(self.pool.submit(_csv_payload, *args))
+                while len(self.pending) > 2 * self.workers:
+                    self.sink.write(self.pending.pop(0).result())
+        self.rows += len(chunk)
+
+    def close(self):
+        """
+        Finishes the file (a path target is only put in place once complete); returns rows written.
+        Without any frame there is no header to write, and a path target is not created.
+        """
+        if self.rows == 0 and self.empty is not None:
+            self._write_empty()
+        for future in self.pending:
+            self.sink.write(future.result())
+        self.pending = []
+        if self.pool is not None:
+            self.pool.shutdown()
+            self.pool = None
+        if self.parquet is not None:
+            self.parquet.close()
+        if self.path:
+            self.sink.close()
+            if self.empty is None:
+                os.remove(self.path + '.tmp')
+            else:
+                os.replace(self.path + '.tmp', self.path)
+        else:
+            self.sink.flush()
+        return self.rows
+
+    def _write_empty(self):
+        """Header-only CSV, or a Parquet file with the schema and no row group."""
+        if self.fmt == 'parquet':
+            import pyarrow.parquet as pq
+            schema = pa.Table.from_pandas(self.empty, preserve_index=self.index).schema
+            self.parquet = pq.ParquetWriter(self.sink, schema)
+        elif self.header:
+            self.sink.write(_csv_payload(self.empty, True, self.fmt == 'csv.gz', self.index))
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, *exc):
+        if exc_type is None:
+            self.close()
+        else:
+            if self.pool is not None:
+                self.pool.shutdown(cancel_futures=True)
+            if self.path:
+                self.sink.close()
+                os.remove(self.path + '.tmp')
+        return False
+
+
+def write_frame(df, target, fmt=None, workers=1, chunk_rows=EXPORT_CHUNK_ROWS, header=True, index=False):
+    """Writes `df` to `target` in chunks; returns the number of rows written."""
+    with ExportWriter(target, fmt, workers, chunk_rows, header, index) as out:
+        out.write(df)
+    return out.rows
+
+
+def concat_parts(parts, target, columns, fmt=None):
+    """
+    Joins header-less export parts (e.g. from parallel workers) into `target`, in order.
+    CSV and gzip parts are copied byte for byte; Parquet parts are re-written as row groups
+    (Arrow tables, so an empty part keeps its schema).
+    """
+    fmt = fmt or format_of(target)
+    parts = [part for part in parts if os.path.exists(part)]
+    if fmt == 'parquet':
+        if not parts:
+            write_frame(pd.DataFrame(columns=columns), target, fmt)
+            return
+        import pyarrow.parquet as pq
+        with open(target + '.tmp', 'wb') as sink:
+            writer = None
+            for part in parts:
+                table = pq.read_table(part)
+                writer = writer or pq.ParquetWriter(sink, table.schema)
+                writer.write_table(table.cast(writer.schema))
+            writer.close()
+        os.replace(target + '.tmp', target)
+        return
+    with open(target + '.tmp', 'wb') as sink:
+        sink.write(_csv_payload(pd.DataFrame(columns=columns), True, fmt == 'csv.gz'))
+        for part in parts:
+            with open(part, 'rb') as src:
+                shutil.copyfileobj(src, sink)
+    os.replace(target + '.tmp', target)
+
+
+def export_file(df, fmt='csv', index=False):
+    """`df` exported to an anonymous temporary file, rewound; for download buttons."""
+    sink = tempfile.TemporaryFile()
+    with ExportWriter(sink, fmt, index=index) as out:
+        out.write(df)
+    sink.seek(0)
+    return sink
+
+
+def deferred(df, fmt='csv', index=False):
+    """Zero-argument callable for st.download_button(data=...): the export only runs when clicked."""
+    return lambda: export_file(df, fmt, index)
+
+
+def aggregate_tables(state):
+    """Named aggregate tables of a ReportAggregate (see write_aggregates)."""
+    tables = {
+        'usage_by_type': state.usage_summary().to_frame(),
+        'hourly_traffic': state.hourly_traffic().rename('calls').to_frame(),
+        'segments': state.segment_summary().to_frame(),
+        'rule_hits': pd.Series(state.rule_hits, name='hits', dtype='int64').rename_axis('Rule').to_frame(),
+    }
+    if state.traffic is not None:
+        tables['busy_hours'] = state.traffic.busy_hours()
+        tables['busy_hour_summary'] = state.traffic.summary()
+    if state.anomaly is not None:
+        tables['anomaly_baseline'] = state.anomaly.baseline()
+    if state.approx is not None:
+        for measure in ('Duration', 'Data_Usage'):
+            tables[f'{measure.lower()}_percentiles_by_type'] = state.approx.percentiles(measure)
+            tables[f'{measure.lower()}_percentiles_by_hour'] = state.approx.percentiles(measure, by='Hour')
+    return tables
+
+
+def write_aggregates(state, directory, fmt='csv'):
+    """One file per aggregate table of `state` in `directory`; returns the paths written."""
+    os.makedirs(directory, exist_ok=True)
+    paths = []
+    for name, table in aggregate_tables(state).items():
+        path = os.path.join(directory, name + SUFFIXES[fmt])
+        write_frame(table, path, fmt, index=True)
+        paths.append(path)
+    return paths
@@ -0,0 +1,159 @@
+"""
+Configurable fraud rules, compiled into vectorized masks.
+
+A rule set is a list of rules; a row is suspicious when any rule hits.
+Each rule has
+    name        label used in the hit counts
+    when        list of {"column", "op", "value"} comparisons
+    combine     "all" (AND, default) or "any" (OR) over `when`
+    call_types  optional list; the rule only applies to these Call_Types
+    hours       optional [first, last] hour of day, inclusive; wraps past midnight if first > last
+
+Evaluation is one pass over the columns: identical comparisons across rules
+are computed once, hour of day is derived once, and every rule is a
+combination of those shared masks.
+"""
+import os
+import json
+import operator
+import numpy as np
+import pandas as pd
+
+import kernel
+from instrumentation import instrument
+
+DEFAULT_RULES_FILE = os.environ.get(
+    "TELECOM_FRAUD_RULES", os.path.join(os.path.dirname(os.path.abspath(__file__)), "fraud_rules.json"))
+DEFAULT_PROFILE = "standard"
+
+OPERATORS = {'>': operator.gt, '>=': operator.ge, '<': operator.lt, '<=': operator.le,
+             '==': operator.eq, '!=': operator.ne}
+UNITS = {'Duration': 's', 'Data_Usage': 'MB'}
+
+
+class RuleSet:
+    def __init__(self, rules, name=DEFAULT_PROFILE):
+        self.name = name
+        self.rules = [self._validate(rule) for rule in rules]
+
+    @staticmethod
+    def _validate(rule):
+        if not rule.get('when'):
+            raise ValueError(f"Rule '{rule.get('name')}' has no conditions")
+        for cond in rule['when']:
+            if cond['op'] not in OPERATORS:
+                raise ValueError(f"Rule '{rule['name']}': unknown operator {cond['op']!r}")
+        if rule.get('combine', 'all') not in ('all', 'any'):
+            raise ValueError(f"Rule '{rule['name']}': combine must be 'all' or 'any'")
+        return rule
+
+    @property
+    def rule_names(self):
+        return [rule['name'] for rule in self.rules]
+
+    @instrument('fraud_rules', rows_arg=1)
+    def evaluate(self, columns, valid=None):
+        """
+        `columns` is a DataFrame (or dict of arrays) with the referenced columns,
+        plus Call_Type / Date (or Hour) when rules filter on them.
+        Rows outside the `valid` mask (if given) never match.
+        Returns (suspicious_mask, {rule_name: hit_count}).
+        """
+        atoms = {}
+
+        def atom(key, compute):
+            if key not in atoms:
+                atoms[key] = compute()
+            return atoms[key]
+
+        def hours():
+            if 'Hour' in columns:
+                return np.asarray(columns['Hour'])
+            return kernel.hour_of(columns['Date'])
+
+        n = len(columns) if isinstance(columns, pd.DataFrame) else len(next(iter(columns.values())))
+        suspicious = np.zeros(n, dtype=bool)
+        hits = {}
+        for rule in self.rules:
+            masks = [atom((c['column'], c['op'], c['value']),
+                          lambda c=c: np.asarray(OPERATORS[c['op']](np.asarray(columns[c['column']]), c['value'])))
+                     for c in rule['when']]
+            mask = np.logical_and.reduce(masks) if rule.get('combine', 'all') == 'all' else np.logical_or.reduce(masks)
+
+            if rule.get('call_types'):
+                types = tuple(sorted(rule['call_types']))
+                mask = mask & atom(('Call_Type', 'in', types), lambda: _isin(columns['Call_Type'], types))
+            if rule.get('hours'):
+                first, last = rule['hours']
+                hour = atom(('Hour',), hours)
+                in_window = atom(('Hour', 'window', first, last), lambda: (
+                    (hour >= first) & (hour <= last) if first <= last else (hour >= first) | (hour <= last)))
+                mask = mask & in_window
+            if valid is not None:
+                mask = mask & valid
+
+            hits[rule['name']] = int(np.count_nonzero(mask))
+            suspicious |= mask
+        return suspicious, hits
+
+    @staticmethod
+    def _limit_column(rule):
+        """Column of a generic upper-limit rule (one `>` / `>=` condition, no call type or hour filter), else None."""
+        if rule.get('call_types') or rule.get('hours') or len(rule['when']) != 1:
+            return None
+        cond = rule['when'][0]
+        return cond['column'] if cond['op'] in ('>', '>=') else None
+
+    def with_thresholds(self, limits):
+        """
+        Copy with the generic upper limits replaced, e.g. {'Duration': 3000}. Only
+        single-condition `column >` / `>=` rules without call type or hour filters
+        change; the specific rules of a profile keep their own values.
+        Raises ValueError if the profile has no such rule for a listed column.
+        """
+        columns = {self._limit_column(rule) for rule in self.rules}
+        missing = [column for column in limits if column not in columns]
+        if missing:
+            raise ValueError(f"Fraud rule profile '{self.name}' has no generic limit rule on {', '.join(missing)}")
+        rules = [dict(rule, when=[dict(rule['when'][0], value=limits[self._limit_column(rule)])])
+                 if self._limit_column(rule) in limits else rule
+                 for rule in self.rules]
+        return RuleSet(rules, name=self.name)
+
+    def describe(self):
+        """Human readable criteria, e.g. 'Duration > 3300s OR Data_Usage > 450MB'."""
+        parts = []
+        for rule in self.rules:
+            joiner = ' AND ' if rule.get('combine', 'all') == 'all' else ' OR '
+            text = joiner.join(f"{c['column']} {c['op']} {c['value']}{UNITS.get(c['column'], '')}"
+                               for c in rule['when'])
+            if len(rule['when']) > 1:
+                text = f"({text})"
+            if rule.get('call_types'):
+                text += f" [{'/'.join(rule['call_types'])}]"
+            if rule.get('hours'):
+                text += f" [{rule['hours'][0]:02d}:00-{rule['hours'][1]:02d}:59]"
+            parts.append(text)
+        return ' OR '.join(parts)
+
+
+def _isin(values, labels):
+    if isinstance(values, pd.Series):
+        return values.isin(labels).to_numpy()
+    return np.isin(np.asarray(values), labels)
+
+
+_loaded = {}
+
+
+def load_rules(profile=DEFAULT_PROFILE, path=None):
+    """Loads (and memoises) one profile of the rules config file."""
+    path = path or DEFAULT_RULES_FILE
+    key = (os.path.abspath(path), os.path.getmtime(path), profile)
+    if key not in _loaded:
+        with open(path, encoding='utf-8') as f:
+            config = json.load(f)
+        if profile not in config['profiles']:
+            raise KeyError(f"Fraud rule profile '{profile}' not found in {path}")
+        _loaded[key] = RuleSet(config['profiles'][profile]['rules'], name=profile)
+    return _loaded[key]
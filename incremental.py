@@ -0,0 +1,169 @@
+import os
+import json
+import hashlib
+import numpy as np
+import pandas as pd
+
+import ingest
+import logstore
+import parallel
+import traffic
+import anomaly
+from aggregates import ReportAggregate
+
+STATE_FILE = "state.json"
+FRAUD_FILE = "suspicious_report.csv"
+TRAFFIC_DIR = "traffic"
+
+
+def fingerprint(filename, *offsets, block_size=1 << 20):
+    """
+    SHA-256 of the file content; identical exports are recognised even if renamed or re-copied.
+    With `offsets`, returns (whole-file digest, [digest of the first `offset` bytes, ...]) from the
+    same read; an offset past the end of the file gets None.
+    """
+    digest = hashlib.sha256()
+    prefixes = {}
+    position = 0
+    with open(filename, 'rb') as f:
+        for offset in sorted(set(offsets)):
+            while position < offset:
+                block = f.read(min(block_size, offset - position))
+                if not block:
+                    break
+                digest.update(block)
+                position += len(block)
+            prefixes[offset] = digest.hexdigest() if position == offset else None
+        for block in iter(lambda: f.read(block_size), b''):
+            digest.update(block)
+    return (digest.hexdigest(), [prefixes[offset] for offset in offsets]) if offsets else digest.hexdigest()
+
+
+def is_appendable(filename):
+    """Plain CSVs can be resumed at a byte offset; .tlog stores and compressed files are folded whole."""
+    return not logstore.is_logstore(filename) and not parallel.is_compressed(filename)
+
+
+class IncrementalStore:
+    """
+    Persisted state of the main.py analyses in `state_dir`:
+      state.json             ReportAggregate snapshot, fingerprints of processed files and,
+                             per path, how far it was read (byte offset + hash of that prefix)
+      suspicious_report.csv  every fraud row found so far (appended per file)
+      traffic/               one .npy of traffic bins per day (only the days a file touches are rewritten)
+    Folding a new export costs one pass over that export only; a CSV that grew since it
+    was folded in is parsed from where the last run stopped.
+    """
+
+    def __init__(self, state_dir, resolution=traffic.DEFAULT_RESOLUTION):
+        """`resolution` sets the traffic bins of a new state; an existing state keeps the one it was built with."""
+        self.state_dir = state_dir
+        self.state_path = os.path.join(state_dir, STATE_FILE)
+        self.fraud_path = os.path.join(state_dir, FRAUD_FILE)
+        self.traffic_dir = os.path.join(state_dir, TRAFFIC_DIR)
+        self.state = ReportAggregate(traffic=traffic.TrafficBins(resolution), anomaly=anomaly.AnomalyScorer())
+        self.processed = {}
+        self.files = {}  # absolute path -> {'bytes': offset read up to, 'prefix': SHA-256 of those bytes, 'rows'}
+        self.fraud_bytes = 0
+        self.traffic_files = {}  # day (days since the epoch, as a string) -> its .npy in traffic/
+        self.generation = 0  # saves so far; names the .npy files a save writes
+
+        if os.path.exists(self.state_path):
+            with open(self.state_path) as f:
+                data = json.load(f)
+            self.state = ReportAggregate.from_dict(data['aggregate'])
+            self.processed = data['processed']
+            self.files = data.get('files', {})
+            self.fraud_bytes = data['fraud_bytes']
+            self.traffic_files = data.get('traffic_files', {})
+            self.generation = data.get('generation', 0)
+            for day, name in self.traffic_files.items():
+                self.state.traffic.set_day(int(day), np.load(os.path.join(self.traffic_dir, name)))
+        self._truncate_fraud_file()
+        self._remove_stray_traffic_files()
+
+    def _truncate_fraud_file(self):
+        """Drops fraud rows appended by a run that crashed before its state was saved."""
+        if os.path.exists(self.fraud_path) and os.path.getsize(self.fraud_path) > self.fraud_bytes:
+            with open(self.fraud_path, 'r+b') as f:
+                f.truncate(self.fraud_bytes)
+
+    def _remove_stray_traffic_files(self):
+        """Drops day files written by a run that crashed before its state was saved."""
+        if os.path.isdir(self.traffic_dir):
+            kept = set(self.traffic_files.values())
+            for name in os.listdir(self.traffic_dir):
+                if name not in kept:
+                    os.remove(os.path.join(self.traffic_dir, name))
+
+    def save(self):
+        """
+        Writes state.json and a new .npy for every traffic day changed since the last
+        save; the files they replace are removed once state.json points at the new ones.
+        """
+        os.makedirs(self.state_dir, exist_ok=True)
+        self.generation += 1
+        bins = self.state.traffic
+        replaced = []
+        if bins is not None and bins.changed:
+            os.makedirs(self.traffic_dir, exist_ok=True)
+            for day in sorted(bins.changed):
+                name = f"{pd.Timestamp(day, unit='D'):%Y-%m-%d}-{self.generation}.npy"
+                np.save(os.path.join(self.traffic_dir, name), bins.day_array(day))
+                if str(day) in self.traffic_files:
+                    replaced.append(self.traffic_files[str(day)])
+                self.traffic_files[str(day)] = name
+        data = {'aggregate': self.state.to_dict(traffic_days=False), 'processed': self.processed,
+                'files': self.files, 'fraud_bytes': self.fraud_bytes, 'traffic_files': self.traffic_files,
+                'generation': self.generation}
+        tmp = self.state_path + ".tmp"
+        with open(tmp, 'w') as f:
+            json.dump(data, f)
+        os.replace(tmp, self.state_path)
+        for name in replaced:
+            os.remove(os.path.join(self.traffic_dir, name))
+        if bins is not None:
+            bins.changed.clear()
+
+    def is_processed(self, filename):
+        return fingerprint(filename) in self.processed
+
+    def add_file(self, filename, chunksize=500000):
+        """
+        Folds a new export into the state. Returns False (and changes nothing)
+        if a file with the same content was already processed. A CSV read before
+        under the same path is resumed at the offset reached then, if its bytes up
+        to there are unchanged; if they changed, ValueError is raised instead of
+        counting its rows twice. A last line without its newline is left for the
+        next run, as the writer may still be appending to it.
+        """
+        path = os.path.abspath(filename)
+        seen = self.files.get(path)
+        appendable = is_appendable(filename)
+        start = seen['bytes'] if seen else 0
+        end = ingest.complete_lines_end(filename, start) if appendable else os.path.getsize(filename)
+        key, (prefix, end_prefix) = fingerprint(filename, start, end)
+        if key in self.processed:
+            return False
+        if seen is not None and (prefix != seen['prefix'] or not appendable):
+            raise ValueError(f"{filename} has changed within the {start:,} bytes already folded into "
+                             f"'{self.state_dir}'; refusing to count its rows twice (rebuild the state to reload it)")
+
+        first_row = seen['rows'] if seen else 0
+        os.makedirs(self.state_dir, exist_ok=True)
+        rows_before = self.state.rows_read
+        with open(self.fraud_path, 'a', newline='') as fraud_out:
+            for chunk in ingest.iter_chunks(filename, chunksize, start, end if appendable else None):
+                if first_row:
+                    chunk.index += first_row  # rows of a resumed file keep counting from where it stopped
+                _, fraud = self.state.update(chunk)
+                if len(fraud) or fraud_out.tell() == 0:  # the header is written even if no row is flagged
+                    fraud.to_csv(fraud_out, index=False, header=fraud_out.tell() == 0)
+            fraud_out.flush()
+            self.fraud_bytes = fraud_out.tell()
+
+        rows = self.state.rows_read - rows_before
+        self.processed[key] = {'file': path, 'rows': rows}
+        self.files[path] = {'bytes': end, 'prefix': end_prefix, 'rows': first_row + rows}
+        self.save()
+        return True
@@ -0,0 +1,167 @@
+import os
+import io
+import glob
+import contextlib
+import hashlib
+import tempfile
+import pandas as pd
+
+import parallel
+import schema
+import logstore
+from instrumentation import stage
+
+try:
+    import pyarrow  # noqa: F401
+    HAS_ARROW = True
+except ImportError:
+    HAS_ARROW = False
+
+CACHE_DIR = os.environ.get("TELECOM_CACHE_DIR", ".cache")
+CACHE_VERSION = 2  # bump whenever the cached columns change (names, dtypes, date parsing)
+
+
+def _source_key(filename):
+    """Returns (path_key, state_key) for a source file: its absolute path, and its size + mtime + CACHE_VERSION."""
+    path = os.path.abspath(filename)
+    stat = os.stat(path)
+    path_key = hashlib.sha1(path.encode('utf-8')).hexdigest()[:10]
+    state = f"{stat.st_size}:{stat.st_mtime_ns}:v{CACHE_VERSION}"
+    state_key = hashlib.sha1(state.encode('utf-8')).hexdigest()[:10]
+    return path_key, state_key
+
+
+def cache_path(filename):
+    """Location of the columnar cache for `filename` in its current state."""
+    stem = os.path.splitext(os.path.basename(filename))[0]
+    path_key, state_key = _source_key(filename)
+    return os.path.join(CACHE_DIR, f"{stem}-{path_key}-{state_key}.parquet")
+
+
+def read_source_csv(filename, columns=None, workers=1):
+    """
+    Parses the raw CSV; `Date` is converted to datetime64 once so readers never re-parse it.
+    Aliased headers (Duration_Seconds, Data_Usage_MB, ...) come out under the canonical
+    names and the date format is sniffed (schema.parse_dates); `columns` are canonical names.
+    With workers != 1 the file is split into line-aligned byte ranges parsed in parallel.
+    """
+    with stage('csv.parse') as timer:
+        if workers == 1:
+            usecols = None if columns is None else (lambda name: schema.canonical_name(name) in columns)
+            df = schema.normalize_columns(pd.read_csv(filename, usecols=usecols))
+        else:
+            df = schema.normalize_columns(parallel.parallel_read_csv(filename, workers))
+            if columns is not None:
+                df = df[columns]
+        timer.set_rows(len(df))
+    if 'Date' in df.columns:
+        with stage('csv.to_datetime', rows=len(df)):
+            df['Date'] = schema.parse_dates(df['Date'])
+    return df
+
+
+def build_cache(filename, workers=1):
+    """Converts the CSV into a typed Parquet file and drops caches of older versions of it."""
+    target = cache_path(filename)
+    os.makedirs(CACHE_DIR, exist_ok=True)
+
+    df = read_source_csv(filename, workers=workers)
+    # a private temp file: two processes building the same cache must not write into one file
+    fd, tmp = tempfile.mkstemp(suffix='.tmp', dir=CACHE_DIR)
+    try:
+        with os.fdopen(fd, 'wb') as f, stage('cache.write_parquet', rows=len(df)):
+            df.to_parquet(f, engine='pyarrow', index=False)
+        os.replace(tmp, target)
+    except BaseException:
+        with contextlib.suppress(OSError):
+            os.remove(tmp)
+        raise
+
+    stem, path_key, _ = os.path.basename(target).rsplit('-', 2)
+    for stale in glob.glob(os.path.join(CACHE_DIR, f"{stem}-{path_key}-*.parquet")):
+        if stale != target:
+            os.remove(stale)
+    return target
+
+
+def read_columns(filename, columns=None, workers=1):
+    """
+    Loads `filename` through the columnar cache, reading only `columns`.
+    The cache is (re)built on first use and whenever the CSV's size or mtime changes.
+    Without pyarrow it falls back to parsing the CSV directly.
+    `workers` is the number of parser processes used when the CSV has to be read.
+    A binary .tlog store is mapped instead (no cache, no copy; see logstore).
+    """
+    if not os.path.exists(filename):
+        raise FileNotFoundError(filename)
+    if logstore.is_logstore(filename):
+        with stage('logstore.map') as timer:
+            df = logstore.open_store(filename).frame(columns)
+            timer.set_rows(len(df))
+        return df
+    if not HAS_ARROW:
+        return read_source_csv(filename, columns, workers)
+
+    target = cache_path(filename)
+    if not os.path.exists(target):
+        build_cache(filename, workers)
+    with stage('cache.read_parquet') as timer:
+        df = pd.read_parquet(target, columns=columns, engine='pyarrow')
+        timer.set_rows(len(df))
+    return df
+
+
+def iter_chunks(filename, chunksize, start=0, end=None):
+    """
+    Raw frames of `chunksize` rows: CSV chunks, or zero-copy slices of a .tlog store.
+    `start` / `end` limit a plain CSV to the lines in that byte range (`start` at a line
+    start after the header, or 0); the header line is parsed first in either case.
+    """
+    if logstore.is_logstore(filename):
+        return logstore.open_store(filename).chunks(chunksize)
+    if start == 0 and end is None:
+        return pd.read_csv(filename, chunksize=chunksize)
+    f = open(filename, 'rb')
+    header = f.readline() if start else b''
+    f.seek(start)
+    return pd.read_csv(io.BufferedReader(_ByteRange(f, header, end)), chunksize=chunksize)
+
+
+def complete_lines_end(filename, start=0, block_size=1 << 16):
+    """Byte offset just past the last newline of `filename` (at least `start`): a line still being written is left out."""
+    with open(filename, 'rb') as f:
+        end = f.seek(0, os.SEEK_END)
+        while end > start:
+            block_start = max(start, end - block_size)
+            f.seek(block_start)
+            position = f.read(end - block_start).rfind(b'\n')
+            if position >= 0:
+                return block_start + position + 1
+            end = block_start
+    return start
+
+
+class _ByteRange(io.RawIOBase):
+    """Reads `prefix`, then the open file `f` from its position up to byte `end` (None: to its end)."""
+
+    def __init__(self, f, prefix=b'', end=None):
+        self.f = f
+        self.prefix = prefix
+        self.end = end
+
+    def readable(self):
+        return True
+
+    def readinto(self, buffer):
+        if self.prefix:
+            n = min(len(buffer), len(self.prefix))
+            buffer[:n], self.prefix = self.prefix[:n], self.prefix[n:]
+            return n
+        size = len(buffer) if self.end is None else min(len(buffer), self.end - self.f.tell())
+        data = self.f.read(max(size, 0))
+        buffer[:len(data)] = data
+        return len(data)
+
+    def close(self):
+        self.f.close()
+        super().close()
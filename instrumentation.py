@@ -0,0 +1,171 @@
+"""
+Stage timing / memory instrumentation.
+
+    with instrumentation.stage('csv.parse', rows=len(df)):
+        ...
+
+    @instrumentation.instrument('clean_data')
+    def clean_data(df): ...
+
+Each stage records wall time, CPU time, rows processed, the process' peak RSS
+and, when allocation tracing is on, the peak traced allocations inside the
+stage. Off by default: `stage()` then returns a shared no-op context manager,
+so the cost is one attribute lookup. Turn it on with TELECOM_METRICS=1
+(TELECOM_METRICS=trace adds tracemalloc), main.py --metrics, or the
+dashboards' performance panel. Recording is per thread, so concurrent
+Streamlit sessions do not mix their measurements.
+"""
+import os
+import sys
+import json
+import time
+import logging
+import threading
+import functools
+import tracemalloc
+
+try:
+    import resource
+except ImportError:  # Windows
+    resource = None
+
+logger = logging.getLogger('telecom.metrics')
+
+_ENV = os.environ.get('TELECOM_METRICS', '').lower()
+_local = threading.local()
+
+
+def _settings():
+    if not hasattr(_local, 'enabled'):
+        _local.enabled = _ENV not in ('', '0', 'false')
+        _local.trace = _ENV == 'trace'
+        _local.records = []
+        _local.stack = []
+        if _local.trace and not tracemalloc.is_tracing():
+            tracemalloc.start()
+    return _local
+
+
+def enable(trace_allocations=False):
+    settings = _settings()
+    settings.enabled = True
+    settings.trace = trace_allocations
+    if trace_allocations and not tracemalloc.is_tracing():
+        tracemalloc.start()
+
+
+def disable():
+    _settings().enabled = False
+
+
+def is_enabled():
+    return _settings().enabled
+
+
+def reset():
+    _settings().records = []
+
+
+def records():
+    """Stage records of the current thread, in completion order."""
+    return list(_settings().records)
+
+
+def peak_rss_mb():
+    if resource is None:
+        return None
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return peak / 1024 ** 2 if sys.platform == 'darwin' else peak / 1024  # bytes on macOS, KB on Linux
+
+
+class _NullStage:
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        return False
+
+    def set_rows(self, rows):
+        pass
+
+
+_NULL_STAGE = _NullStage()
+
+
+class _Stage:
+    def __init__(self, name, rows, settings):
+        self.name = name
+        self.rows = rows
+        self.settings = settings
+        self.peak_alloc = 0
+
+    def set_rows(self, rows):
+        self.rows = rows
+
+    def __enter__(self):
+        stack = self.settings.stack
+        if self.settings.trace and tracemalloc.is_tracing():
+            # reset_peak() is global: fold the peak seen so far into the enclosing stage first
+            if stack:
+                stack[-1].peak_alloc = max(stack[-1].peak_alloc, tracemalloc.get_traced_memory()[1])
+            tracemalloc.reset_peak()
+        stack.append(self)
+        self.wall = time.perf_counter()
+        self.cpu = time.process_time()
+        return self
+
+    def __exit__(self, exc_type, *exc):
+        stack = self.settings.stack
+        stack.pop()
+        record = {
+            'stage': self.name,
+            'wall_s': round(time.perf_counter() - self.wall, 6),
+            'cpu_s': round(time.process_time() - self.cpu, 6),
+            'rows': self.rows,
+            'peak_rss_mb': peak_rss_mb(),
+            'depth': len(stack),
+        }
+        if self.settings.trace and tracemalloc.is_tracing():
+            self.peak_alloc = max(self.peak_alloc, tracemalloc.get_traced_memory()[1])
+            if stack:
+                stack[-1].peak_alloc = max(stack[-1].peak_alloc, self.peak_alloc)
+            record['peak_alloc_mb'] = round(self.peak_alloc / 1024 ** 2, 3)
+        if exc_type is not None:
+            record['error'] = exc_type.__name__
+        self.settings.records.append(record)
+        logger.info(json.dumps(record))
+        return False
+
+
+def stage(name, rows=None):
+    """Context manager measuring one stage (no-op unless instrumentation is enabled)."""
+    settings = _settings()
+    if not settings.enabled:
+        return _NULL_STAGE
+    return _Stage(name, rows, settings)
+
+
+def instrument(name=None, rows_arg=0):
+    """
+    Decorator form of stage(); rows = len() of positional argument `rows_arg`
+    (use 1 for methods) when it has one.
+    """
+    def decorator(func):
+        label = name or func.__name__
+
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            if not _settings().enabled:
+                return func(*args, **kwargs)
+            data = args[rows_arg] if len(args) > rows_arg else None
+            rows = len(data) if hasattr(data, '__len__') and not isinstance(data, str) else None
+            with stage(label, rows):
+                return func(*args, **kwargs)
+        return wrapper
+    return decorator
+
+
+def write_json(path):
+    """Dumps the current thread's stage records to `path`."""
+    with open(path, 'w') as f:
+        json.dump({'stages': records()}, f, indent=2)
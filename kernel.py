@@ -0,0 +1,79 @@
+import numpy as np
+import pandas as pd
+from collections import namedtuple
+
+from instrumentation import instrument
+
+# Segment codes produced by the kernel, in bin order (usage < 200, 200..450, > 450)
+SEGMENT_CODES = ['Bronze', 'Silver', 'Gold']
+# `side='right'` puts 200 in Silver; nudging 450 up one ulp keeps 450 itself in Silver too
+SEGMENT_EDGES = np.array([200.0, np.nextafter(450.0, np.inf)])
+
+KernelResult = namedtuple('KernelResult', [
+    'categories',  # Call_Type labels, index of usage_by_type / calls_by_type
+    'usage_by_type',  # sum of Data_Usage per Call_Type
+    'calls_by_type',  # number of rows per Call_Type
+    'hour_counts',  # calls per hour of day, length 24
+    'segment_codes',  # per-row index into SEGMENT_CODES
+    'segment_counts',  # rows per segment, aligned with SEGMENT_CODES
+    'fraud_mask',  # per-row bool (from the fraud rule set), None if not requested
+])
+
+
+def call_type_codes(call_type):
+    """Integer codes + labels for a Call_Type column (categoricals are used as-is)."""
+    if isinstance(call_type.dtype, pd.CategoricalDtype):
+        return call_type.cat.codes.to_numpy(), np.asarray(call_type.cat.categories)
+    codes, categories = pd.factorize(call_type, sort=True)
+    return codes, np.asarray(categories)
+
+
+def hour_of(dates):
+    """Hour of day (0-23) straight from the datetime64 values, without building a .dt accessor."""
+    values = np.asarray(dates, dtype='datetime64[ns]').astype('datetime64[h]').view(np.int64)
+    return values % 24
+
+
+def masked(values, valid):
+    """`values` as an array, restricted to the rows of `valid` (every row when `valid` is None)."""
+    values = np.asarray(values)
+    return values if valid is None else values[valid]
+
+
+def analyze_arrays(codes, categories, usage, hours, fraud_mask=None, valid=None):
+    """
+    Single pass over already-clean column arrays; every report of main.py is
+    derived from bincounts over the same codes, so each column is read once.
+    The fraud mask comes from fraud_rules.RuleSet.evaluate and is passed through.
+    Rows outside `valid` (dirty rows left in place, see aggregates.mask_chunk) are
+    counted in one extra bin that is cut off, so the per-row outputs stay aligned.
+    """
+    k = len(categories)
+    usage = np.asarray(usage, dtype=np.float64)
+    segment_codes = np.searchsorted(SEGMENT_EDGES, usage, side='right')
+    segment_bins = segment_codes
+    if valid is not None:
+        codes = np.where(valid, codes, k)
+        hours = np.where(valid, hours, 24)
+        segment_bins = np.where(valid, segment_codes, len(SEGMENT_CODES))
+
+    usage_by_type = np.bincount(codes, weights=usage, minlength=k + 1)[:k]
+    calls_by_type = np.bincount(codes, minlength=k + 1)[:k]
+    hour_counts = np.bincount(hours, minlength=25)[:24]
+    segment_counts = np.bincount(segment_bins, minlength=len(SEGMENT_CODES) + 1)[:len(SEGMENT_CODES)]
+
+    return KernelResult(categories, usage_by_type, calls_by_type, hour_counts,
+                        segment_codes, segment_counts, fraud_mask)
+
+
+@instrument('kernel')
+def analyze_frame(df, fraud_mask=None, valid=None):
+    """Runs the fused kernel on a cleaned DataFrame with Date/Data_Usage/Call_Type (only the `valid` rows, if given)."""
+    codes, categories = call_type_codes(df['Call_Type'])
+    return analyze_arrays(codes, categories, df['Data_Usage'].to_numpy(), hour_of(df['Date']), fraud_mask, valid)
+
+
+def type_total(result, label, field='usage_by_type'):
+    """Looks up one Call_Type in a per-type array of `result` (0 if the type is absent)."""
+    matches = np.flatnonzero(result.categories == label)
+    return getattr(result, field)[matches[0]] if len(matches) else 0
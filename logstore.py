@@ -0,0 +1,148 @@
+"""
+Memory-mapped, fixed-width binary CDR store (.tlog).
+
+    data_generator.py telecom_data_large.tlog -n 100000000    # written chunk by chunk
+    store = logstore.open_store('telecom_data_large.tlog')    # header read + mmap: milliseconds
+    df = store.frame()                                         # DataFrame over the mapped pages, no copy
+
+Layout: a page-sized header (magic, JSON with the row count, column dtypes
+and byte offsets, Call_Type labels), then one fixed-width block per column:
+
+    Date        int64    epoch nanoseconds
+    Duration    int32    seconds (the generator's -100 noise rows are kept)
+    Data_Usage  float32  MB (NaN noise rows are kept)
+    Call_Type   int8     code into the header's labels
+
+Rows are stored raw and cleaned by the readers with the CSV rules, as a
+validity mask rather than a filtered copy (aggregates.mask_chunk, the
+dashboard's load_data): the kernel, the fraud rules, the sketches and the
+partitioned layout take the mask and read the mapped columns in place. The blocks
+are column-wise rather than one interleaved record array so that every column
+maps to a contiguous, aligned ndarray: pandas wraps those without copying and
+the numpy kernels read them at full stride. The dtypes are those of
+schema.compact_frame, so results match the CSV path exactly.
+
+Every process opening the file maps the same page-cache pages, so concurrent
+dashboard sessions and batch jobs on one host share one copy of the data.
+"""
+import json
+import numpy as np
+import pandas as pd
+
+import schema
+
+MAGIC = b'TLOG\x00\x01\x00\x00'
+HEADER_BYTES = 4096
+BLOCK_ALIGN = 64
+EXTENSION = '.tlog'
+COLUMNS = [('Date', '<i8'), ('Duration', '<i4'), ('Data_Usage', '<f4'), ('Call_Type', '<i1')]
+
+
+def is_logstore(filename):
+    """True when `filename` starts with the store's magic bytes."""
+    try:
+        with open(filename, 'rb') as f:
+            return f.read(len(MAGIC)) == MAGIC
+    except OSError:
+        return False
+
+
+def _layout(rows):
+    """[(name, dtype, offset)] of the column blocks for `rows` rows, and the total file size."""
+    layout, offset = [], HEADER_BYTES
+    for name, dtype in COLUMNS:
+        layout.append((name, dtype, offset))
+        offset += rows * np.dtype(dtype).itemsize
+        offset = -(-offset // BLOCK_ALIGN) * BLOCK_ALIGN
+    return layout, offset
+
+
+class LogWriter:
+    """
+    Fills a store of a known row count, chunk by chunk, through a writable map:
+    `write(df, offset)` puts a raw Date/Duration/Data_Usage/Call_Type frame at row `offset`.
+    """
+
+    def __init__(self, filename, rows, call_types=schema.CALL_TYPES):
+        self.filename = filename
+        self.rows = rows
+        self.call_types = list(call_types)
+        layout, size = _layout(rows)
+        header = json.dumps({
+            'rows': rows,
+            'columns': [{'name': name, 'dtype': dtype, 'offset': offset} for name, dtype, offset in layout],
+            'call_types': self.call_types,
+        }).encode('utf-8')
+        if len(MAGIC) + 8 + len(header) > HEADER_BYTES:
+            raise ValueError("Store header does not fit in one page")
+        with open(filename, 'wb') as f:
+            f.write(MAGIC + np.uint64(len(header)).tobytes() + header)
+            f.truncate(size)
+        self.arrays = {name: np.memmap(filename, dtype=dtype, mode='r+', offset=offset, shape=(rows,))
+                       for name, dtype, offset in layout}
+
+    def write(self, df, offset):
+        end = offset + len(df)
+        if end > self.rows:
+            raise ValueError(f"Chunk ends at row {end}, past the store's {self.rows} rows")
+        df = schema.normalize_columns(df)
+        dates = schema.parse_dates(df['Date']) if not pd.api.types.is_datetime64_any_dtype(df['Date']) else df['Date']
+        self.arrays['Date'][offset:end] = np.asarray(dates, dtype='datetime64[ns]').view(np.int64)
+        self.arrays['Duration'][offset:end] = df['Duration'].to_numpy()
+        self.arrays['Data_Usage'][offset:end] = df['Data_Usage'].to_numpy(dtype=np.float32)
+        codes = pd.Categorical(df['Call_Type'], categories=self.call_types).codes
+        if (codes < 0).any():
+            unknown = sorted(set(df['Call_Type'][codes < 0].dropna().unique()))
+            raise ValueError(f"Call_Type values {unknown} are not in the store's labels {self.call_types}")
+        self.arrays['Call_Type'][offset:end] = codes
+        return end
+
+    def close(self):
+        for array in self.arrays.values():
+            array.flush()
+        self.arrays = {}
+
+
+class LogStore:
+    """A read-only mapped store; columns are np.memmap views, nothing is read until touched."""
+
+    def __init__(self, filename):
+        with open(filename, 'rb') as f:
+            if f.read(len(MAGIC)) != MAGIC:
+                raise ValueError(f"{filename} is not a {EXTENSION} store")
+            length = int(np.frombuffer(f.read(8), dtype=np.uint64)[0])
+            header = json.loads(f.read(length))
+        self.filename = filename
+        self.rows = header['rows']
+        self.call_types = header['call_types']
+        self.arrays = {column['name']: np.memmap(filename, dtype=column['dtype'], mode='r',
+                                                 offset=column['offset'], shape=(self.rows,))
+                       for column in header['columns']}
+
+    def __len__(self):
+        return self.rows
+
+    def frame(self, columns=None, start=0, end=None):
+        """
+        Rows [start, end) as a DataFrame whose columns are views of the map (read-only).
+        Every column has its own dtype, so pandas keeps one block per array and copies nothing.
+        """
+        end = self.rows if end is None else min(end, self.rows)
+        data = {}
+        for name in columns or [name for name, _ in COLUMNS]:
+            values = self.arrays[name][start:end]
+            if name == 'Date':
+                values = values.view('datetime64[ns]')
+            elif name == 'Call_Type':
+                values = pd.Categorical.from_codes(values, dtype=pd.CategoricalDtype(self.call_types))
+            data[name] = np.asarray(values) if isinstance(values, np.memmap) else values
+        return pd.DataFrame(data, index=pd.RangeIndex(start, end), copy=False)
+
+    def chunks(self, chunksize):
+        """Zero-copy frames of `chunksize` rows, in file order."""
+        for start in range(0, self.rows, chunksize):
+            yield self.frame(start=start, end=start + chunksize)
+
+
+def open_store(filename):
+    return LogStore(filename)
@@ -1,20 +1,80 @@
 import pandas as pd
-import matplotlib.pyplot as plt
-import matplotlib.ticker as mticker
-import matplotlib.patheffects as path_effects
 import numpy as np
+import os
+import sys
+import argparse
+import contextlib
+import logging
+import ingest
+import dataset
+import parallel
+import schema
+import incremental
+import charts
+import instrumentation
+from instrumentation import instrument
+import kernel
+import fraud_rules
+import topk
+import export
+import sketches
+import traffic
+import anomaly
+from aggregates import ReportAggregate, hourly_series, FRAUD_PREVIEW_ROWS, TOP_FRAUD_ROWS, TOP_FRAUD_RANK
 
 RED = '\033[91m'
 GREEN = '\033[3;4;32m'
 END = '\033[0m'
 ITALIC = '\033[3m'
 InputFile = "telecom_data_large.csv"
-
-
-def load_data(filename):
+SuspiciousFile = "suspicious_report.csv"
+DefaultChunkSize = 500000
+DefaultStateDir = ".state"
+ChartWorkers = 0  # chart render processes in batch runs (0 = one per CPU)
+ChartFiles = []
+ApproxOptions = None  # ApproxSummary error bounds when --approx is on
+ExportWorkers = 1  # processes formatting the fraud report (0 = one per CPU)
+ExportDir = None  # when set, the aggregate tables are also written there
+ExportFormat = 'csv'
+OutputDir = "."  # fraud report, charts and exported aggregates are written here
+Charts = True  # False (--no-charts): text only, matplotlib is never imported
+TrafficResolution = traffic.DEFAULT_RESOLUTION  # bin width of the busy-hour / Erlang analysis
+AnomalyThreshold = None  # robust z-score cut-off when --anomaly is on
+Rules = None  # fraud RuleSet overriding the default profile (--rules / --max-duration / --max-usage)
+
+# Report sections, in report order; each subcommand prints a subset of them
+SECTIONS = ['clean', 'analyze', 'fraud', 'peak-hours', 'traffic', 'segment']
+COMMANDS = {
+    'all': (SECTIONS, "every report (default when no command is given)"),
+    'clean': (['clean'], "cleaning report: rows dropped and memory per row"),
+    'analyze': (['analyze'], "data usage per call type"),
+    'fraud': (['fraud'], "fraud detection and the suspicious records file"),
+    'peak-hours': (['peak-hours'], "calls per hour of day"),
+    'traffic': (['traffic'], "daily busy hour, BHCA and offered Erlangs per call type"),
+    'segment': (['segment'], "customer segmentation by data usage"),
+}
+Sections = SECTIONS
+
+
+def output_path(filename):
+    return os.path.normpath(os.path.join(OutputDir, filename))
+
+
+def save_chart(kind, data, filename):
+    """Queues one report chart in OutputDir; a no-op (nothing drawn or imported) with --no-charts."""
+    if not Charts:
+        return
+    path = output_path(filename)
+    charts.save_chart(kind, data, path, dpi=300)  # ذخیره با کیفیت بالا
+    ChartFiles.append(path)
+    print(f"{GREEN}   -> Chart saved as '{path}'{END}")
+
+
+@instrument()
+def load_data(filename, workers=1):
     try:
         print(f"\n{GREEN}Loading data from {filename}...{END}")
-        df = pd.read_csv(filename)
+        df = ingest.read_columns(filename, workers=workers)
         print(f"{filename} loaded successfully with {len(df)} rows")
         return df
     except FileNotFoundError:
@@ -22,81 +82,103 @@ def load_data(filename):
         return None
 
 
+@instrument()
 def clean_data(df):
-    print(f"\n{GREEN}Cleaning data...{END}")
     initial_count = len(df)
     df_clean = df.dropna()
-    print(f"Removed {initial_count - len(df_clean)} rows with empty data.")
+    na_removed = initial_count - len(df_clean)
 
     df_negative_zero = df_clean[df_clean['Duration'] <= 0]
     df_clean = df_clean[df_clean['Duration'] > 0]
-    print(f"Removed {len(df_negative_zero)} records with negative or zero duration seconds.")
-    print(f"\n{ITALIC}Final data ready for analysis: {len(df_clean)} records{END}")
+    report_cleaning(na_removed, len(df_negative_zero), len(df_clean))
+
+    before = schema.bytes_per_row(df_clean)
+    df_clean = schema.compact_frame(df_clean)
+    report_memory(before, schema.bytes_per_row(df_clean))
     return df_clean
 
 
+def report_cleaning(na_removed, duration_removed, final_count):
+    print(f"\n{GREEN}Cleaning data...{END}")
+    print(f"Removed {na_removed} rows with empty data.")
+    print(f"Removed {duration_removed} records with negative or zero duration seconds.")
+    print(f"\n{ITALIC}Final data ready for analysis: {final_count} records{END}")
+
+
+def report_memory(before, after):
+    print(f"{ITALIC}Memory per row: {before:.1f} bytes -> {after:.1f} bytes (compact schema){END}")
+
+
+@instrument()
 def analyze_data(df):
-    print(f"\n{RED}--- FINAL REPORT ---\n{END}")
-    intl_calls = df[df['Call_Type'] == 'International']
-    avg_usage = intl_calls['Data_Usage'].mean()
-    print(f"{GREEN}Average internet usage for international calls:{END} {avg_usage:.2f} MB")
+    # Data_Usage is float32 in the compact schema; accumulate in float64 like the fused kernel
+    usage = df['Data_Usage'].astype('float64')
+    avg_usage = usage[df['Call_Type'] == 'International'].mean()
+    usage_summary = usage.groupby(df['Call_Type'], observed=True).sum()
+    report_usage(avg_usage, usage_summary)
 
-    print("\nDrawing diagram...")
-    usage_summary = df.groupby('Call_Type')['Data_Usage'].sum()
-    print(f"usage summary: \n{usage_summary}")
 
-    fig, ax = plt.subplots(figsize=(10, 6))
-    usage_summary.plot(kind='bar', color=['skyblue', 'orange', 'green', 'red'], ax=ax)
-    plt.xticks(rotation=45, ha='right')
+def report_usage(avg_usage, usage_summary):
+    print(f"\n{RED}--- FINAL REPORT ---\n{END}")
+    print(f"{GREEN}Average internet usage for international calls:{END} {avg_usage:.2f} MB")
 
-    ax.set_title('Total Internet Usage by Call Type (Big Data Scale)')
-    ax.set_xlabel('Call Type')
-    ax.set_ylabel('Usage (MB)')
+    if Charts:
+        print("\nDrawing diagram...")
+    # Data_Usage is float32 in memory; print the totals at MB precision
+    print(f"usage summary: \n{usage_summary.astype('float64').round(2)}")
 
-    # --- اصلاح مهم: حذف Locator ثابت و استفاده از Formatter هوشمند ---
-    # این تابع اعداد محور عمودی را کوتاه می‌کند (مثلاً 1000000 را تبدیل به 1M می‌کند)
-    ax.yaxis.set_major_formatter(mticker.FuncFormatter(lambda x, pos: f'{x * 1e-6:.0f}M'))
-    # خط زیر حذف شد چون باعث کرش سیستم در داده‌های میلیونی می‌شد:
-    # ax.yaxis.set_major_locator(mticker.MultipleLocator(50000))
-    ax.yaxis.set_major_locator(mticker.MultipleLocator(5000000))
+    save_chart('usage_by_type', usage_summary, 'report_type_usage.png')
 
-    ax.grid(axis='y', linestyle='-', alpha=0.4)
-    plt.tight_layout()
-    plt.savefig('report_type_usage.png', dpi=300)  # ذخیره با کیفیت بالا
-    print(f"{GREEN}   -> Chart saved as 'report_type_usage.png'{END}")
-    plt.show()
 
+def find_suspicious(df, rules=None):
+    """Rows flagged by the fraud rule set (fraud_rules.json); returns (rows, hits per rule)."""
+    rules = rules or Rules or fraud_rules.load_rules()
+    mask, hits = rules.evaluate(df)
+    return df[mask], hits
 
-def detect_fraud(df):
-    print(f"\n{RED}--- SECURITY CHECK: FRAUD DETECTION ---{END}")
-    high_duration_limit = 3300  # ثانیه (۵۵ دقیقه)
-    high_data_limit = 450
 
-    suspicious_df = df[(df['Duration'] > high_duration_limit) | (df['Data_Usage'] > high_data_limit)]
+@instrument()
+def detect_fraud(df, rules=None):
+    rules = rules or Rules or fraud_rules.load_rules()
+    suspicious_df, rule_hits = find_suspicious(df, rules)
     count = len(suspicious_df)
+    export.write_frame(suspicious_df, SuspiciousFile, workers=ExportWorkers)  # header only when nothing is found
+    top_df = topk.top_k(suspicious_df, TOP_FRAUD_ROWS, TOP_FRAUD_RANK)
+    report_fraud(count, suspicious_df.head(FRAUD_PREVIEW_ROWS), SuspiciousFile, rules, rule_hits, top_df)
+
 
+def report_fraud(count, preview_df, output_file, rules, rule_hits, top_df=None):
+    print(f"\n{RED}--- SECURITY CHECK: FRAUD DETECTION ---{END}")
     if count > 0:
         print(f"{RED}⚠️ WARNING: Found {count} suspicious records!{END}")
-        print(f"   - Criteria: Duration > {high_duration_limit}s OR Data > {high_data_limit}MB")
-
-        output_file = "suspicious_report.csv"
-        suspicious_df.to_csv(output_file, index=False)
-
+        print(f"   - Criteria: {rules.describe()}")
+        for name, hits in rule_hits.items():
+            print(f"     {name}: {hits} hits")
         print(f"{GREEN}   -> Detailed report saved to '{output_file}'{END}")
         print(f"\n{ITALIC}Top 5 Suspicious Transactions:{END}")
-        print(suspicious_df.head(5))
+        print(preview_df.astype({'Data_Usage': 'float64'}).round({'Data_Usage': 2}))
+        if top_df is not None and len(top_df):
+            scale = ' + '.join(f"{c}/{v:g}" for c, v in topk.ANOMALY_SCALES.items())
+            print(f"\n{ITALIC}Top {len(top_df)} by {topk.RANK_LABELS[TOP_FRAUD_RANK].lower()} ({scale}):{END}")
+            ranked = top_df.astype({'Data_Usage': 'float64'}).assign(Score=topk.scores(top_df, TOP_FRAUD_RANK))
+            print(ranked.round({'Data_Usage': 2, 'Score': 3}).to_string())
     else:
         print(f"{GREEN}✅ No suspicious activity detected.{END}")
 
 
+@instrument()
 def analyze_peak_hours(df):
-    print(f"\n{GREEN}--- NETWORK TRAFFIC ANALYSIS: PEAK HOURS ---{END}")
+    dates = df['Date']
+    if not pd.api.types.is_datetime64_any_dtype(dates):
+        dates = schema.parse_dates(dates)
+
+    # بدون کپی از کل جدول: ساعت مستقیم از مقادیر datetime64 محاسبه می‌شود
+    hourly_traffic = hourly_series(np.bincount(kernel.hour_of(dates), minlength=24))
+    report_peak_hours(hourly_traffic)
 
-    df = df.copy()
-    df['Date'] = pd.to_datetime(df['Date'])
-    df['Hour'] = df['Date'].dt.hour
 
-    hourly_traffic = df.groupby('Hour').size()
+def report_peak_hours(hourly_traffic):
+    print(f"\n{GREEN}--- NETWORK TRAFFIC ANALYSIS: PEAK HOURS ---{END}")
 
     busy_hour = hourly_traffic.idxmax()
     max_calls = hourly_traffic.max()
@@ -105,107 +187,383 @@ def analyze_peak_hours(df):
     print(f"📈 Busiest Hour: {RED}{busy_hour}:00{END} (Calls: {max_calls})")
     print(f"📉 Quietest Hour: {min_calls} calls")
 
-    print("Drawing traffic chart...")
-    plt.figure(figsize=(10, 6))
-    hourly_traffic.plot(kind='line', marker='o', color='purple', linewidth=2)
-
-    plt.title('Network Traffic by Hour (24h) - 1 Million Records')
-    plt.xlabel('Hour of Day (0-23)')
-    plt.ylabel('Number of Calls')
-
-    data_range = max_calls - min_calls
-    if data_range > 0:
-        dynamic_bottom = max(0, min_calls - (data_range * 0.2))
-        plt.ylim(bottom=dynamic_bottom)
-    else:
-        plt.ylim(bottom=0)
-
-    plt.gca().yaxis.set_major_formatter(mticker.StrMethodFormatter('{x:,.0f}'))
-
-    plt.grid(True, linestyle='--', alpha=0.7)
-    plt.xticks(range(0, 24))
-
-    plt.fill_between(hourly_traffic.index, hourly_traffic.values, color='purple', alpha=0.1)
-
-    plt.tight_layout()
-    plt.savefig('report_peak_hours.png', dpi=300)  # ذخیره با کیفیت بالا
-    print(f"{GREEN}   -> Chart saved as 'report_peak_hours.png'{END}")
-    plt.show()
+    if Charts:
+        print("Drawing traffic chart...")
+    save_chart('peak_hours', hourly_traffic, 'report_peak_hours.png')
 
 
+@instrument()
 def segment_customers(df):
-    print(f"\n{GREEN}--- MARKETING ANALYSIS: CUSTOMER SEGMENTATION ---{END}")
-
-    conditions = [
-        (df['Data_Usage'] > 450),
-        (df['Data_Usage'] >= 200) & (df['Data_Usage'] <= 450),
-        (df['Data_Usage'] < 200)
-    ]
-    labels = ['Gold', 'Silver', 'Bronze']
-
-    df['Segment'] = np.select(conditions, labels, default='Unknown')
+    # Gold: > 450, Silver: 200..450, Bronze: < 200 (one binning pass instead of three comparisons)
+    segment_codes = np.searchsorted(kernel.SEGMENT_EDGES, df['Data_Usage'].to_numpy(), side='right')
+    df['Segment'] = pd.Categorical.from_codes(segment_codes, categories=kernel.SEGMENT_CODES)
     segment_counts = df['Segment'].value_counts()
+    segment_counts = segment_counts[segment_counts > 0]
+    report_segments(segment_counts)
+
+
+def report_anomalies(state):
+    scorer = state.anomaly
+    print(f"\n{RED}--- STATISTICAL ANOMALIES (PER CALL TYPE AND HOUR) ---{END}")
+    print(f"   - Criteria: {scorer.describe()}")
+    if not state.anomaly_count:
+        print(f"{GREEN}✅ No row deviates from its baseline.{END}")
+        return
+    print(f"{RED}⚠️ Found {state.anomaly_count} anomalous records!{END}")
+    top_df = state.anomaly_table()
+    print(f"\n{ITALIC}Top {len(top_df)} by {topk.RANK_LABELS['zscore'].lower()}:{END}")
+    print(top_df.astype({'Data_Usage': 'float64'}).round({'Data_Usage': 2, anomaly.SCORE_COLUMN: 2}).to_string())
+
+
+def report_traffic(bins):
+    print(f"\n{GREEN}--- TRAFFIC ENGINEERING: DAILY BUSY HOUR ({bins.resolution} bins) ---{END}")
+    busy_hours = bins.busy_hours()
+    if not len(busy_hours):
+        print("No traffic to analyze.")
+        return
+    print(f"{ITALIC}Busy hour = the day's busiest 60 minutes; Erlangs = call-seconds / 3600; "
+          f"BHCA = call attempts in that hour{END}")
+    print(bins.summary(busy_hours).round(2).to_string())
+
+    daily = busy_hours.xs(traffic.ALL, level='Call_Type')
+    print("\nDaily busy hour, all call types:")
+    print(daily.assign(Busy_Hour=daily['Busy_Hour'].dt.strftime('%H:%M')).round(2).to_string())
+
+
+def report_segments(segment_counts):
+    print(f"\n{GREEN}--- MARKETING ANALYSIS: CUSTOMER SEGMENTATION ---{END}")
 
-    # رنگ‌های ملایم‌تر و مدرن‌تر
-    color_map = {
-        'Gold': '#FFD700',  # طلایی
-        'Silver': '#C0C0C0',  # نقره‌ای
-        'Bronze': '#CD7F32'  # برنزی
-    }
-    safe_colors = [color_map.get(label, 'grey') for label in segment_counts.index]
-
-    # برجسته‌سازی Gold
-    explode = [0.05 if label == 'Gold' else 0 for label in segment_counts.index]
-
-    print("Drawing segmentation chart...")
-    plt.figure(figsize=(8, 8))
-
-    # نکته ۱: shadow=False می‌کنیم چون می‌خواهیم سایه دستی بسازیم
-    wedges, texts, autotexts = plt.pie(
-        segment_counts,
-        labels=segment_counts.index,
-        autopct='%1.1f%%',
-        startangle=140,
-        colors=safe_colors,
-        explode=explode,
-        shadow=False,  # سایه پیش‌فرض را خاموش کنید
-        textprops={'fontsize': 12}
-    )
-
-    # نکته ۲: اضافه کردن سایه دستی و نرم به هر تکه (Wedge)
-    for w in wedges:
-        w.set_path_effects([
-            path_effects.SimplePatchShadow(offset=(3, -3), alpha=0.4, shadow_rgbFace='black'),
-            path_effects.Normal()
-        ])
-
-    plt.title('Customer Segmentation (Data Usage)')
-    plt.ylabel('')
-
-    plt.tight_layout()
-    plt.savefig('customer_segment.png', dpi=300)
-    print(f"{GREEN}   -> Chart saved as 'customer_segment.png'{END}")
-    plt.show()
+    if Charts:
+        print("Drawing segmentation chart...")
+    else:
+        print(segment_counts.to_string())
+    save_chart('segments', segment_counts, 'customer_segment.png')
+
+
+def report_approx(approx):
+    print(f"\n{GREEN}--- APPROXIMATE PERCENTILES (SKETCHES, {approx.rows} ROWS) ---{END}")
+    print(f"{ITALIC}Error bounds: {approx.describe_bounds()}{END}")
+    for measure, unit in (('Duration', 's'), ('Data_Usage', 'MB')):
+        print(f"\n{measure} ({unit}) per Call_Type:")
+        print(approx.percentiles(measure).round(2).to_string())
+    hourly = pd.concat({measure: approx.percentiles(measure, by='Hour').drop(columns='count')
+                        for measure in sketches.MEASURES}, axis=1)
+    print("\nPer hour of day:")
+    print(hourly.round(2).to_string())
+    print("\nBusiest minutes (count-min estimate):")
+    print(approx.busiest_minutes().to_string())
+
+
+def report_all(state, memory=None, fraud_file=None):
+    # the three charts are rendered together, off the text path, in a process pool (cached by content)
+    with charts.batch(ChartWorkers):
+        if 'clean' in Sections:
+            report_cleaning(state.na_removed, state.duration_removed, state.clean_rows)
+            if memory is not None:
+                report_memory(*memory)
+        if 'analyze' in Sections:
+            report_usage(state.intl_average(), state.usage_summary())
+        if 'fraud' in Sections:
+            report_fraud(state.fraud_count, state.fraud_preview, fraud_file or SuspiciousFile, state.rules,
+                         state.rule_hits, state.top_fraud.to_frame())
+            if AnomalyThreshold is not None:
+                if state.anomaly is not None:
+                    report_anomalies(state)
+                else:
+                    print(f"\n{ITALIC}This incremental state has no anomaly baselines (created before they were "
+                          f"added); rebuild it for statistical scoring.{END}")
+        if 'peak-hours' in Sections:
+            report_peak_hours(state.hourly_traffic())
+        if 'traffic' in Sections:
+            if state.traffic is not None:
+                report_traffic(state.traffic)
+            else:
+                print(f"\n{ITALIC}This incremental state has no traffic bins (created before they were added); "
+                      f"rebuild it for busy-hour analysis.{END}")
+        if 'segment' in Sections:
+            report_segments(state.segment_summary())
+        if state.approx is not None:
+            report_approx(state.approx)
+    if ExportDir is not None:
+        paths = export.write_aggregates(state, ExportDir, ExportFormat)
+        print(f"\n{GREEN}Aggregate tables exported to '{ExportDir}': {', '.join(map(os.path.basename, paths))}{END}")
+
+
+def new_state():
+    """
+    Empty ReportAggregate, with percentile / heavy-hitter sketches when --approx
+    is on, traffic bins when the traffic section is requested and anomaly
+    baselines when --anomaly is on.
+    """
+    return ReportAggregate(Rules, approx=None if ApproxOptions is None else sketches.ApproxSummary(**ApproxOptions),
+                           traffic=traffic.TrafficBins(TrafficResolution) if 'traffic' in Sections else None,
+                           anomaly=None if AnomalyThreshold is None else anomaly.AnomalyScorer(AnomalyThreshold))
+
+
+def fraud_writer():
+    """Streaming sink for the suspicious rows; None when the fraud section was not requested."""
+    if 'fraud' not in Sections:
+        return contextlib.nullcontext()
+    return export.ExportWriter(SuspiciousFile, workers=ExportWorkers)
+
+
+@instrument()
+def run_fused(raw_df):
+    """
+    In-memory pipeline: one fused kernel pass (kernel.analyze_frame) feeds every
+    report instead of five separate scans of the DataFrame.
+    """
+    state = new_state()
+    clean_df, fraud = state.update(raw_df)
+    if 'fraud' in Sections:
+        export.write_frame(fraud, SuspiciousFile, workers=ExportWorkers)
+    report_all(state, memory=(schema.bytes_per_row(raw_df), schema.bytes_per_row(clean_df)))
+    return state
+
+
+@instrument()
+def run_streaming(filename, chunksize=DefaultChunkSize):
+    """
+    Bounded-memory variant of the full pipeline: the CSV is read `chunksize` rows
+    at a time and folded into a ReportAggregate, suspicious rows are appended to
+    the report file as they are found. Produces the same reports as the in-memory path.
+    """
+    print(f"\n{GREEN}Streaming data from {filename} in chunks of {chunksize} rows...{END}")
+    state = new_state()
+    with fraud_writer() as fraud_out:
+        for chunk in ingest.iter_chunks(filename, chunksize):
+            with instrumentation.stage('chunk', rows=len(chunk)):
+                _, fraud = state.update(chunk)
+            if fraud_out is not None:
+                fraud_out.write(fraud)
+    print(f"{filename} streamed successfully with {state.rows_read} rows")
+    report_all(state)
+    return state
+
+
+@instrument()
+def run_parallel(filename, workers=0):
+    """Multi-core pipeline: byte ranges of the CSV are parsed and aggregated in a process pool."""
+    workers = parallel.resolve_workers(workers)
+    print(f"\n{GREEN}Processing {filename} with {workers} worker processes...{END}")
+    state = parallel.run_parallel(filename, workers, fraud_file=SuspiciousFile if 'fraud' in Sections else None,
+                                  approx=ApproxOptions, rules=Rules,
+                                  resolution=TrafficResolution if 'traffic' in Sections else None,
+                                  anomaly_threshold=AnomalyThreshold)
+    print(f"{filename} processed successfully with {state.rows_read} rows")
+    report_all(state)
+    return state
+
+
+@instrument()
+def run_dataset(root, start=None, end=None, readers=dataset.DEFAULT_READERS):
+    """
+    Day/hour-partitioned files under `root` (or one file) restricted to [start, end):
+    partitions outside the range are pruned by path, the rest are read by a
+    thread pool and folded into a ReportAggregate in time order.
+    """
+    data = dataset.Dataset(root)
+    parts = data.partitions(start, end)
+    print(f"\n{GREEN}Reading {len(parts)} of {len(data)} files in {root} with {readers} reader threads...{END}")
+    if start is not None or end is not None:
+        print(f"{ITALIC}Date range: {start or 'first record'} .. {end or 'last record'} (end exclusive){END}")
+    state = new_state()
+    with fraud_writer() as fraud_out:
+        for frame in data.iter_frames(start, end, workers=readers):
+            if not len(frame):
+                continue
+            with instrumentation.stage('partition', rows=len(frame)):
+                _, fraud = state.update(frame)
+            if fraud_out is not None:
+                fraud_out.write(fraud)
+    print(f"{root} read successfully with {state.rows_read} rows")
+    if not state.clean_rows:
+        print(f"{RED}No records in the selected range.{END}")
+        return state
+    report_all(state)
+    return state
+
+
+@instrument()
+def run_incremental(filename, state_dir=DefaultStateDir, chunksize=DefaultChunkSize, resolution=None):
+    """
+    Folds one new export into the persisted state in `state_dir` and regenerates
+    the reports from it. A file whose content was already processed is skipped.
+    A new state bins traffic at `resolution`; an existing one keeps its own.
+    """
+    store = incremental.IncrementalStore(state_dir, resolution or TrafficResolution)
+    traffic_bins = store.state.traffic
+    if resolution and traffic_bins is not None and traffic_bins.resolution != resolution:
+        print(f"{ITALIC}'{state_dir}' bins traffic at {traffic_bins.resolution}; ignoring --resolution "
+              f"{resolution} (rebuild the state to change it).{END}")
+    if store.add_file(filename, chunksize):
+        print(f"{filename} added to '{state_dir}' ({store.state.rows_read} rows processed in total)")
+    else:
+        print(f"{ITALIC}{filename} was already processed; skipping it.{END}")
+    report_all(store.state, fraud_file=store.fraud_path)
+    return store
+
+
+def parse_args(argv=None):
+    """`main.py [COMMAND] [input] [options]`; without a command every report is produced."""
+    argv = sys.argv[1:] if argv is None else list(argv)
+    if not argv or (argv[0] not in COMMANDS and argv[0] not in ('-h', '--help')):
+        argv = ['all'] + argv
+
+    common = argparse.ArgumentParser(add_help=False)
+    common.add_argument('input', nargs='?', default=InputFile,
+                        help="CDR CSV file, .tlog binary store, or a directory of day/hour-partitioned files")
+    common.add_argument('-o', '--output-dir', default=OutputDir,
+                        help="directory for the suspicious records file, charts and exported aggregates")
+    common.add_argument('--no-charts', action='store_true',
+                        help="text reports only: no PNGs, matplotlib is not imported (cron / headless runs)")
+    common.add_argument('--rules', default=fraud_rules.DEFAULT_PROFILE, metavar='PROFILE',
+                        help="fraud rule profile of fraud_rules.json")
+    common.add_argument('--max-duration', type=int, metavar='SECONDS',
+                        help="override the profile's generic Duration limit (per-type / hour rules keep theirs)")
+    common.add_argument('--max-usage', type=float, metavar='MB',
+                        help="override the profile's generic Data_Usage limit (per-type / hour rules keep theirs)")
+    common.add_argument('--resolution', choices=list(traffic.RESOLUTIONS),
+                        help=f"interval width of the traffic (busy hour / Erlang) analysis "
+                             f"(default: {TrafficResolution}; an incremental state keeps the one it was built with)")
+    common.add_argument('--start', type=pd.Timestamp, metavar='DATE',
+                        help="first day to analyze; partitions before it are not opened")
+    common.add_argument('--end', type=pd.Timestamp, metavar='DATE',
+                        help="last day to analyze (inclusive); partitions after it are not opened")
+    common.add_argument('--stream', action='store_true',
+                        help="process the file in chunks with bounded memory")
+    common.add_argument('--chunksize', type=int, default=DefaultChunkSize,
+                        help="rows per chunk in streaming mode (sets peak memory)")
+    common.add_argument('--incremental', action='store_true',
+                        help="fold this file into the persisted state and report over all files seen so far")
+    common.add_argument('--state-dir', default=DefaultStateDir,
+                        help="directory holding the incremental state")
+    common.add_argument('--metrics', metavar='FILE',
+                        help="record per-stage wall/CPU time, rows and peak memory into a JSON file")
+    common.add_argument('--metrics-log', action='store_true',
+                        help="also log every stage measurement as a JSON line on stderr")
+    common.add_argument('--workers', type=int, default=1,
+                        help="worker processes for parsing/aggregation (0 = one per CPU, 1 = serial)")
+    common.add_argument('--readers', type=int, default=dataset.DEFAULT_READERS,
+                        help="threads reading the files of a partitioned directory")
+    common.add_argument('--chart-workers', type=int, default=ChartWorkers,
+                        help="processes rendering the report charts (0 = one per CPU, 1 = in-process)")
+    common.add_argument('--approx', action='store_true',
+                        help="add p50/p95/p99 and busiest-minute estimates from mergeable sketches")
+    common.add_argument('--approx-accuracy', type=float, default=sketches.DEFAULT_ACCURACY,
+                        help="relative error of the percentile sketches (0.01 = 1%%)")
+    common.add_argument('--cms-epsilon', type=float, default=sketches.DEFAULT_EPSILON,
+                        help="count-min overcount bound, as a fraction of all rows")
+    common.add_argument('--cms-delta', type=float, default=sketches.DEFAULT_DELTA,
+                        help="probability that a count-min estimate exceeds that bound")
+    common.add_argument('--anomaly', action='store_true',
+                        help="also score every row against running per-call-type/hour baselines (robust z-score)")
+    common.add_argument('--anomaly-threshold', type=float, default=anomaly.DEFAULT_THRESHOLD, metavar='Z',
+                        help="z-score above which --anomaly flags a row")
+    common.add_argument('--export-format', choices=export.FORMATS, default=None,
+                        help="format of the fraud report and exported aggregates (default: csv)")
+    common.add_argument('--export-workers', type=int, default=ExportWorkers,
+                        help="processes formatting/compressing the fraud report (0 = one per CPU)")
+    common.add_argument('--export-dir', metavar='DIR',
+                        help="also write every aggregate table (usage, hourly traffic, segments, ...) into DIR")
+    common.add_argument('--show', action='store_true',
+                        help="open the rendered charts in a window at the end (blocks until closed)")
+
+    parser = argparse.ArgumentParser(description="Telecom log analyzer")
+    commands = parser.add_subparsers(dest='command', metavar='COMMAND')
+    for name, (_, help_text) in COMMANDS.items():
+        commands.add_parser(name, parents=[common], help=help_text, description=help_text)
+    return parser.parse_args(argv)
+
+
+def load_rule_set(args):
+    rules = fraud_rules.load_rules(args.rules)
+    thresholds = {column: int(value) if float(value).is_integer() else value
+                  for column, value in (('Duration', args.max_duration), ('Data_Usage', args.max_usage))
+                  if value is not None}
+    return rules.with_thresholds(thresholds) if thresholds else rules
 
 
 if __name__ == "__main__":
+    args = parse_args()
+    InputFile = args.input
+    Sections = COMMANDS[args.command][0]
+    Charts = not args.no_charts
+    OutputDir = args.output_dir
+    os.makedirs(OutputDir, exist_ok=True)
+    SuspiciousFile = output_path(SuspiciousFile)
+    try:
+        Rules = load_rule_set(args)
+    except (KeyError, ValueError) as e:  # unknown profile, or a --max-* limit the profile has no rule for
+        print(f"{RED}{e.args[0]}{END}")
+        sys.exit(2)
+    TrafficResolution = args.resolution or TrafficResolution
+    ChartWorkers = args.chart_workers
+    ExportWorkers = args.export_workers
+    ExportDir = args.export_dir
+    if args.export_format:
+        ExportFormat = args.export_format
+        SuspiciousFile = export.with_format(SuspiciousFile, ExportFormat)
+    if args.approx:
+        ApproxOptions = dict(relative_accuracy=args.approx_accuracy, epsilon=args.cms_epsilon, delta=args.cms_delta)
+    if args.anomaly:
+        AnomalyThreshold = args.anomaly_threshold
+    if args.metrics or args.metrics_log:
+        instrumentation.enable(trace_allocations=True)
+        if args.metrics_log:
+            logging.basicConfig(level=logging.INFO, format='%(name)s %(message)s')
+    status = 0
     print(f'\n{RED}--- START PROGRAM ---{END}\n')
     print(f"Processing File: {InputFile}...")
 
     try:
-        raw_data = load_data(InputFile)
+        if not os.path.exists(InputFile):
+            print(f"{RED}File {InputFile} not found.{END}")
+            print(f"\n❌{RED} Execution stopped: Input file is missing.{END}")
+            print(f"   Please run 'data_generator.py' first.")
+            status = 1
+
+        elif os.path.isdir(InputFile) or args.start is not None or args.end is not None:
+            ignored = [flag for flag, given in (('--stream', args.stream), ('--workers', args.workers != 1),
+                                                ('--incremental', args.incremental)) if given]
+            if ignored:
+                print(f"{ITALIC}A date range or a partitioned directory is read one partition at a time by "
+                      f"--readers threads; ignoring {' / '.join(ignored)}.{END}")
+            start = None if args.start is None else args.start.normalize()
+            end = None if args.end is None else args.end.normalize() + pd.Timedelta(days=1)
+            run_dataset(InputFile, start, end, args.readers)
+            print(f"\n✅{ITALIC} All analysis completed successfully.{END}")
+
+        elif args.incremental:
+            if args.approx or Rules.name != fraud_rules.DEFAULT_PROFILE or args.max_duration is not None or \
+                    args.max_usage is not None or args.anomaly_threshold != anomaly.DEFAULT_THRESHOLD:
+                print(f"{ITALIC}--approx / --rules / --max-* / --anomaly-threshold do not apply to the persisted "
+                      f"incremental state; ignoring them.{END}")
+            run_incremental(InputFile, args.state_dir, args.chunksize, args.resolution)
+            print(f"\n✅{ITALIC} All analysis completed successfully.{END}")
 
-        if raw_data is not None:
-            clean_dataframe = clean_data(raw_data)
-            analyze_data(clean_dataframe)
-            detect_fraud(clean_dataframe)
-            analyze_peak_hours(clean_dataframe)
-            segment_customers(clean_dataframe)
+        elif args.stream:
+            run_streaming(InputFile, args.chunksize)
+            print(f"\n✅{ITALIC} All analysis completed successfully.{END}")
 
+        elif args.workers != 1:
+            run_parallel(InputFile, args.workers)
             print(f"\n✅{ITALIC} All analysis completed successfully.{END}")
+
         else:
-            print(f"\n❌{RED} Execution stopped: Input file is missing.{END}")
-            print(f"   Please run 'data_generator.py' first.")
+            raw_data = load_data(InputFile)
+            run_fused(raw_data)
+
+            print(f"\n✅{ITALIC} All analysis completed successfully.{END}")
 
     except Exception as e:
         print(f"\n❌{RED} Critical Error: {e}{END}")
+        status = 1
+
+    if args.show and ChartFiles:
+        charts.show(ChartFiles)
+
+    if args.metrics:
+        instrumentation.write_json(args.metrics)
+        print(f"{ITALIC}Stage metrics written to '{args.metrics}'{END}")
+    sys.exit(status)
@@ -0,0 +1,173 @@
+import io
+import os
+import shutil
+import tempfile
+import collections
+import pandas as pd
+from concurrent.futures import ProcessPoolExecutor
+
+import export
+import sketches
+import logstore
+import traffic
+import anomaly
+from aggregates import ReportAggregate
+
+RANGE_BYTES = 128 << 20  # largest byte range one task parses: a worker holds its bytes plus the parsed frame
+RANGES_PER_WORKER = 4  # at least this many ranges per worker, so one slow range does not leave the others idle
+QUEUED_PER_WORKER = 2  # ranges submitted ahead of the in-order merge, per worker
+STREAM_CHUNK_ROWS = 500000  # rows per task when a compressed CSV has to be parsed as one stream
+COMPRESSED_SUFFIXES = ('.gz', '.bz2', '.xz', '.zip', '.zst')  # what pandas infers a compression from
+
+
+def is_compressed(filename):
+    """True for a compressed CSV: its bytes cannot be split at line starts."""
+    return filename.lower().endswith(COMPRESSED_SUFFIXES)
+
+
+def resolve_workers(workers):
+    """0 / None means one worker per CPU."""
+    return workers if workers and workers > 0 else (os.cpu_count() or 1)
+
+
+def range_count(size, workers, range_bytes=RANGE_BYTES):
+    """Ranges to split `size` bytes into: none larger than `range_bytes`, RANGES_PER_WORKER per worker at least."""
+    return max(workers * RANGES_PER_WORKER, -(-size // range_bytes))
+
+
+def split_ranges(filename, parts):
+    """
+    Splits a CSV into `parts` byte ranges whose boundaries fall on line starts.
+    Returns (header_line, [(start, end), ...]); ranges never include the header.
+    """
+    size = os.path.getsize(filename)
+    with open(filename, 'rb') as f:
+        header = f.readline()
+        body_start = f.tell()
+        bounds = [body_start]
+        for i in range(1, parts):
+            f.seek(max(body_start, size * i // parts))
+            if f.tell() > body_start:
+                f.readline()  # finish the line we landed in
+            bounds.append(max(f.tell(), bounds[-1]))
+        bounds.append(size)
+    ranges = [(start, end) for start, end in zip(bounds, bounds[1:]) if end > start]
+    return header, ranges
+
+
+def read_range(filename, header, start, end):
+    """Parses one byte range of the CSV as a DataFrame with the file's columns."""
+    with open(filename, 'rb') as f:
+        f.seek(start)
+        data = f.read(end - start)
+    return pd.read_csv(io.BytesIO(header + data))
+
+
+def split_rows(filename, parts):
+    """Row ranges of a .tlog store, plus the CSV header line used for its fraud report."""
+    rows = len(logstore.open_store(filename))
+    bounds = [rows * i // parts for i in range(parts + 1)]
+    header = ','.join(name for name, _ in logstore.COLUMNS).encode('utf-8') + b'\n'
+    return header, [(start, end) for start, end in zip(bounds, bounds[1:]) if end > start]
+
+
+def read_part(filename, header, start, end):
+    """One range of the input: a byte range of a CSV, or a row range of a mapped .tlog store."""
+    if logstore.is_logstore(filename):
+        return logstore.open_store(filename).frame(start=start, end=end)
+    return read_range(filename, header, start, end)
+
+
+def _new_state(approx, rules, resolution, anomaly_threshold):
+    return ReportAggregate(rules, approx=None if approx is None else sketches.ApproxSummary(**approx),
+                           traffic=None if resolution is None else traffic.TrafficBins(resolution),
+                           anomaly=None if anomaly_threshold is None else anomaly.AnomalyScorer(anomaly_threshold))
+
+
+def _aggregate_part(source, fraud_part, approx=None, rules=None, resolution=None, anomaly_threshold=None):
+    """Partial state of one part: `source` is (filename, header, start, end) of a range, or a parsed chunk."""
+    state = _new_state(approx, rules, resolution, anomaly_threshold)
+    _, fraud = state.update(source if isinstance(source, pd.DataFrame) else read_part(*source))
+    if fraud_part is not None:
+        export.write_frame(fraud, fraud_part, header=False)  # also when empty: a Parquet part carries the schema
+    return state
+
+
+def run_parallel(filename, workers=0, fraud_file=None, approx=None, rules=None, resolution=None,
+                 anomaly_threshold=None):
+    """
+    Map/merge version of the report pipeline: each line-aligned byte range
+    (at most RANGE_BYTES, several per worker) is parsed, cleaned and aggregated
+    in a worker process. The partial ReportAggregates are merged in file order
+    as they come back, with only a few ranges per worker in flight, so memory
+    stays bounded by range size, not file size. When `fraud_file` is given the
+    per-range suspicious rows are concatenated into it, in file order, in the
+    export format its name implies (.csv, .csv.gz or .parquet).
+    `approx` (ApproxSummary keyword arguments) also builds and merges percentile sketches;
+    `rules` is the fraud RuleSet (default: the standard profile); `resolution` (e.g. '15min')
+    also bins the traffic for busy-hour / Erlang analysis; `anomaly_threshold` scores rows
+    against per-Call_Type/hour baselines in the same pass (each range against its own
+    statistics, like a --stream chunk; the merged baseline re-scores the top candidates).
+    A .tlog store is split into row ranges that every worker maps (one shared page-cache copy).
+    A compressed CSV (.gz, .bz2, ...) cannot be split by bytes: it is parsed here as one stream
+    and its chunks of STREAM_CHUNK_ROWS are cleaned and aggregated by the workers.
+    """
+    workers = resolve_workers(workers)
+    if is_compressed(filename):
+        sources = pd.read_csv(filename, chunksize=STREAM_CHUNK_ROWS)
+        local_index = False  # the chunks are numbered from the start of the file already
+    else:
+        count = range_count(os.path.getsize(filename), workers)
+        header, ranges = split_rows(filename, count) if logstore.is_logstore(filename) else \
+            split_ranges(filename, count)
+        sources = ((filename, header, start, end) for start, end in ranges)
+        # CSV ranges are parsed on their own: their rows are numbered from where the range starts
+        local_index = not logstore.is_logstore(filename)
+    parts = []
+    part_dir = None
+    if fraud_file is not None:
+        # next to the report (the input's directory may be read-only), so the final concat stays on one disk
+        part_dir = tempfile.mkdtemp(prefix='fraud-parts-', dir=os.path.dirname(os.path.abspath(fraud_file)))
+        suffix = export.SUFFIXES[export.format_of(fraud_file)]
+
+    state = _new_state(approx, rules, resolution, anomaly_threshold)
+    try:
+        with ProcessPoolExecutor(max_workers=workers) as pool:
+            pending = collections.deque()
+            for i, source in enumerate(sources):
+                part = None if part_dir is None else os.path.join(part_dir, f"part-{i:05d}{suffix}")
+                parts.append(part)
+                pending.append(pool.submit(_aggregate_part, source, part, approx, rules, resolution,
+                                           anomaly_threshold))
+                if len(pending) >= workers * QUEUED_PER_WORKER:
+                    _merge(state, pending.popleft().result(), local_index)
+            while pending:
+                _merge(state, pending.popleft().result(), local_index)
+
+        if fraud_file is not None:
+            export.concat_parts(parts, fraud_file, state.top_fraud.columns)
+    finally:
+        if part_dir is not None:
+            shutil.rmtree(part_dir, ignore_errors=True)
+    return state
+
+
+def _merge(state, part_state, local_index):
+    """Merges the partial state of the next range into `state`."""
+    if local_index:
+        part_state.shift_index(state.rows_read)
+    state.merge(part_state)
+
+
+def parallel_read_csv(filename, workers=0):
+    """Reads the whole CSV with one process per byte range (row order preserved); compressed files serially."""
+    workers = resolve_workers(workers)
+    if is_compressed(filename):
+        return pd.read_csv(filename)
+    header, ranges = split_ranges(filename, range_count(os.path.getsize(filename), workers))
+    if len(ranges) <= 1:
+        return pd.read_csv(filename)
+    with ProcessPoolExecutor(max_workers=workers) as pool:
+        frames = list(pool.map(read_range, [filename] * len(ranges), [header] * len(ranges),
+                               [start for start, _ in ranges], [end for _, end in ranges]))
+    return pd.concat(frames, ignore_index=True)
@@ -0,0 +1,276 @@
+"""
+Call_Type-partitioned, time-sorted layout of a cleaned dataset.
+
+The rows are stored sorted by Call_Type, so every call type is one
+contiguous block and `offsets[i]:offsets[i + 1]` are the rows of category i.
+Selecting call types is then a handful of slices (adjacent partitions are
+merged into one) instead of a boolean mask over every row plus a copy:
+a single contiguous selection is an iloc view, and the cost does not depend
+on the number of rows outside the selection.
+
+Inside each partition the rows are sorted by time, with the timestamps kept
+as an int64 epoch (ns) array next to prefix sums of the measures (duration,
+data usage, fraud flags, one per segment). A date-range / time-of-day query
+cuts the range into hour buckets, finds each bucket boundary with
+searchsorted and reads every total as a difference of two prefix values:
+O(buckets x log n) per query, independent of how many rows fall inside.
+The epoch and prefix arrays cost about 56 bytes per row.
+
+This is the pre-aggregated KPI source of app.py (and dashboard.py). It took
+over from the day x hour x Call_Type x Segment rollup cube of the first
+version: the prefix sums hold the same counts, sums, fraud counts and
+segment counts at row resolution, so a selection of call types, dates and
+hours is answered without rescanning rows. Only the suspicious-records table
+goes back to row-level data, through a PartitionedFrame of the flagged rows.
+
+Hour and Segment are derived once when the layout is built, so selections
+never add columns to a slice. After freeze() every buffer is read-only and the
+instance can be shared between threads (the Streamlit apps hold one per
+server process with st.cache_resource; sessions only get slices of it).
+"""
+from collections import namedtuple
+
+import numpy as np
+import pandas as pd
+
+import kernel
+import schema
+
+
+HOUR_NS = 3600 * 10 ** 9
+MEASURES = ['calls', 'duration_sum', 'usage_sum', 'fraud_count']
+
+RangeSummary = namedtuple('RangeSummary', ['totals', 'hourly', 'by_key', 'segments', 'ranges'])
+
+
+def derive_columns(df, segment_edges=kernel.SEGMENT_EDGES, segment_labels=kernel.SEGMENT_CODES):
+    """Adds Hour (uint8) and Segment (Bronze/Silver/Gold by default) when missing and derivable."""
+    columns = {}
+    if 'Hour' not in df.columns and 'Date' in df.columns:
+        columns['Hour'] = kernel.hour_of(df['Date']).astype(np.uint8)
+    if 'Segment' not in df.columns and 'Data_Usage' in df.columns:
+        codes = np.searchsorted(segment_edges, df['Data_Usage'].to_numpy(), side='right')
+        columns['Segment'] = pd.Categorical.from_codes(codes, categories=segment_labels)
+    return df.assign(**columns) if columns else df
+
+
+def readonly_frame(df):
+    """
+    `df` rebuilt over read-only column buffers, for one copy shared by many
+    threads: in-place writes raise instead of changing the data under other
+    readers, while slices stay views and assigning to a slice copies it
+    (copy-on-write). NumPy columns are re-wrapped without copying.
+    """
+    columns = {}
+    for name in df.columns:
+        column = df[name]
+        if isinstance(column.dtype, np.dtype):
+            values = column.to_numpy()
+            if values.flags.writeable:
+                values = values.view()
+                values.flags.writeable = False
+            columns[name] = values
+        else:
+            columns[name] = column.array  # categorical codes etc. are never handed out writable
+    return pd.DataFrame(columns, index=df.index, copy=False)
+
+
+def _prefix(values, dtype):
+    """Prefix sums with a leading zero: total of rows [a, b) is out[b] - out[a]."""
+    out = np.zeros(len(values) + 1, dtype=dtype)
+    np.cumsum(values, out=out[1:])
+    return out
+
+
+def to_epoch(value):
+    """Timestamp-like value -> int64 nanoseconds since the epoch."""
+    return pd.Timestamp(value).value
+
+
+class PartitionedFrame:
+    """
+    A cleaned frame stored partitioned by a categorical key (Call_Type by default)
+    and, when it has a Date column, sorted by time inside each partition.
+    `fraud_mask` (aligned with `df`) adds a fraud_count prefix sum. With a
+    `valid` mask only those rows are laid out, so dirty rows of a mapped store
+    need not be filtered first: the sorted take is the only copy of the data.
+    """
+
+    def __init__(self, df, key='Call_Type', fraud_mask=None, valid=None,
+                 segment_edges=kernel.SEGMENT_EDGES, segment_labels=kernel.SEGMENT_CODES):
+        if not isinstance(df[key].dtype, pd.CategoricalDtype):
+            df = schema.compact_frame(df)
+        codes = kernel.masked(df[key].cat.codes, valid)
+        if len(codes) and codes.min() < 0:
+            raise ValueError(f"{key} has missing values; partition a cleaned frame")
+
+        self.key = key
+        self.labels = list(df[key].cat.categories)
+        self.offsets = np.concatenate([[0], np.cumsum(np.bincount(codes, minlength=len(self.labels)))])
+        if 'Date' in df.columns:
+            epoch = kernel.masked(np.asarray(df['Date'], dtype='datetime64[ns]').view(np.int64), valid)
+            order = np.lexsort((epoch, codes))
+            self.epoch = epoch[order]
+        else:
+            order = np.argsort(codes, kind='stable')
+            self.epoch = None
+        if valid is not None:
+            order = np.flatnonzero(valid)[order]
+        self.frame = derive_columns(df.take(order), segment_edges, segment_labels)
+        self.prefix = {}
+        if self.epoch is not None:
+            self._build_prefix(None if fraud_mask is None else np.asarray(fraud_mask)[order])
+
+    def _build_prefix(self, fraud):
+        frame = self.frame
+        duration = frame['Duration'].to_numpy()
+        self.prefix['duration_sum'] = _prefix(duration, np.int64 if np.issubdtype(duration.dtype, np.integer)
+                                              else np.float64)
+        self.prefix['usage_sum'] = _prefix(frame['Data_Usage'].to_numpy(dtype=np.float64), np.float64)
+        if fraud is not None:
+            self.prefix['fraud_count'] = _prefix(fraud, np.int64)
+        segment_codes = frame['Segment'].cat.codes.to_numpy()
+        self.segment_labels = list(frame['Segment'].cat.categories)
+        self.segment_prefix = [_prefix(segment_codes == code, np.int64) for code in range(len(self.segment_labels))]
+
+    def freeze(self):
+        """
+        Makes the layout read-only (frame buffers, epoch, offsets and prefix sums) so
+        a single instance can be shared by every session of a server process.
+        """
+        self.frame = readonly_frame(self.frame)
+        arrays = [self.offsets, self.epoch, *self.prefix.values(), *getattr(self, 'segment_prefix', [])]
+        for array in arrays:
+            if array is not None:
+                array.flags.writeable = False
+        return self
+
+    def __len__(self):
+        return len(self.frame)
+
+    def present_labels(self):
+        """Categories that have at least one row, in partition order."""
+        sizes = np.diff(self.offsets)
+        return [label for label, size in zip(self.labels, sizes) if size]
+
+    def ranges(self, labels=None):
+        """Row ranges [(start, end), ...] covering `labels`; adjacent partitions are merged."""
+        if labels is None:
+            return [(0, len(self.frame))] if len(self.frame) else []
+        codes = sorted({self.labels.index(label) for label in labels if label in self.labels})
+        ranges = []
+        for code in codes:
+            start, end = int(self.offsets[code]), int(self.offsets[code + 1])
+            if start == end:
+                continue
+            if ranges and ranges[-1][1] == start:
+                ranges[-1] = (ranges[-1][0], end)
+            else:
+                ranges.append((start, end))
+        return ranges
+
+    def select(self, labels=None):
+        """Rows of the chosen categories: a slice view when contiguous, else a concat of slices."""
+        ranges = self.ranges(labels)
+        if not ranges:
+            return self.frame.iloc[0:0]
+        if len(ranges) == 1:
+            return self.frame.iloc[ranges[0][0]:ranges[0][1]]
+        return pd.concat([self.frame.iloc[start:end] for start, end in ranges])
+
+    def time_bounds(self):
+        """(first, last) timestamp in the data, or (None, None) when empty."""
+        starts = self.offsets[:-1][np.diff(self.offsets) > 0]
+        if self.epoch is None or not len(starts):
+            return None, None
+        ends = self.offsets[1:][np.diff(self.offsets) > 0] - 1
+        return pd.Timestamp(self.epoch[starts].min()), pd.Timestamp(self.epoch[ends].max())
+
+    def _buckets(self, start, end, hours):
+        """Hour-aligned bucket edges over [start, end) and which buckets fall in the `hours` window."""
+        first, last = self.time_bounds()
+        start_ns = to_epoch(start) if start is not None else first.value
+        end_ns = to_epoch(end) if end is not None else last.value + 1
+        if end_ns <= start_ns:
+            return np.array([start_ns]), np.zeros(0, dtype=np.int64), np.zeros(0, dtype=bool)
+        edges = np.arange(start_ns // HOUR_NS * HOUR_NS, end_ns + HOUR_NS, HOUR_NS)
+        edges = np.unique(np.clip(edges, start_ns, end_ns))
+        bucket_hours = (edges[:-1] // HOUR_NS) % 24
+        if hours is None:
+            keep = np.ones(len(bucket_hours), dtype=bool)
+        else:
+            lo, hi = hours
+            if lo <= hi:
+                keep = (bucket_hours >= lo) & (bucket_hours <= hi)
+            else:
+                keep = (bucket_hours >= lo) | (bucket_hours <= hi)
+        return edges, bucket_hours, keep
+
+    def summarize(self, labels=None, start=None, end=None, hours=None):
+        """
+        Totals, calls per hour of day, per-key totals and segment counts for the rows
+        of `labels` with start <= Date < end whose hour of day is in `hours`
+        ([first, last], inclusive, wrapping past midnight like the fraud rules).
+        Answered from the prefix sums; also returns the matching row ranges.
+        """
+        if self.epoch is None:
+            raise ValueError("summarize() needs a Date column")
+        selected = range(len(self.labels)) if labels is None else \
+            sorted({self.labels.index(label) for label in labels if label in self.labels})
+        hourly = np.zeros(24, dtype=np.int64)
+        segments = np.zeros(len(self.segment_labels), dtype=np.int64)
+        by_key, ranges = {}, []
+        edges, bucket_hours, keep = self._buckets(start, end, hours) if len(self.frame) else (None, None, [])
+        for code in selected:
+            lo, hi = int(self.offsets[code]), int(self.offsets[code + 1])
+            if lo == hi or not len(keep):
+                continue
+            pos = lo + np.searchsorted(self.epoch[lo:hi], edges, side='left')
+            left, right = pos[:-1][keep], pos[1:][keep]
+            calls = right - left
+            if not calls.sum():
+                continue
+            hourly += np.bincount(bucket_hours[keep], weights=calls, minlength=24).astype(np.int64)
+            row = {'calls': int(calls.sum())}
+            for measure, prefix in self.prefix.items():
+                row[measure] = (prefix[right] - prefix[left]).sum()
+            by_key[self.labels[code]] = row
+            segments += [int((prefix[right] - prefix[left]).sum()) for prefix in self.segment_prefix]
+            ranges.extend(_runs(left, right))
+
+        by_key = pd.DataFrame.from_dict(by_key, orient='index', columns=[m for m in MEASURES
+                                                                          if m == 'calls' or m in self.prefix])
+        by_key.index.name = self.key
+        totals = {measure: by_key[measure].sum() for measure in by_key.columns}
+        hours_present = np.flatnonzero(hourly)
+        return RangeSummary(
+            totals=totals,
+            hourly=pd.Series(hourly[hours_present], index=pd.Index(hours_present, name='Hour'), name='calls'),
+            by_key=by_key,
+            segments=pd.Series(segments, index=pd.Index(self.segment_labels, name='Segment'), name='count'),
+            ranges=_merge(ranges),
+        )
+
+    def rows(self, labels=None, start=None, end=None, hours=None):
+        """Rows matching a summarize() query, as slices of the partitioned frame."""
+        ranges = self.summarize(labels, start, end, hours).ranges
+        if not ranges:
+            return self.frame.iloc[0:0]
+        if len(ranges) == 1:
+            return self.frame.iloc[ranges[0][0]:ranges[0][1]]
+        return pd.concat([self.frame.iloc[a:b] for a, b in ranges])
+
+
+def _runs(left, right):
+    """Non-empty [left[i], right[i]) bucket ranges, consecutive buckets joined."""
+    return _merge([(int(a), int(b)) for a, b in zip(left, right) if b > a])
+
+
+def _merge(ranges):
+    merged = []
+    for start, end in ranges:
+        if merged and merged[-1][1] == start:
+            merged[-1] = (merged[-1][0], end)
+        else:
+            merged.append((start, end))
+    return merged
@@ -0,0 +1,138 @@
+import numpy as np
+import pandas as pd
+
+# Canonical in-memory schema for cleaned CDR data:
+#   Date       datetime64[ns]
+#   Duration   int32    (seconds; float32 only if the source has fractional seconds)
+#   Data_Usage float32  (MB)
+#   Call_Type  category
+#   Hour       uint8
+#   Segment    category
+# Alphabetical, so groupby/value ordering matches what object-string columns produced
+CALL_TYPES = ['Emergency', 'Internal', 'International', 'Roaming']
+CALL_TYPE_DTYPE = pd.CategoricalDtype(CALL_TYPES)
+
+
+def call_type_dtype(values):
+    """The fixed Call_Type categorical, extended with any unexpected labels found in `values`."""
+    extra = sorted(set(values.dropna().unique()) - set(CALL_TYPES))
+    return CALL_TYPE_DTYPE if not extra else pd.CategoricalDtype(CALL_TYPES + extra)
+
+
+def compact_duration(duration):
+    if pd.api.types.is_integer_dtype(duration):
+        return duration.astype(np.int32)
+    values = duration.to_numpy()
+    if np.all(np.mod(values, 1) == 0):
+        return duration.astype(np.int32)
+    return duration.astype(np.float32)
+
+
+def compact_frame(df, segment_labels=None):
+    """
+    Applies the canonical schema to a cleaned frame (no NaNs in the numeric columns).
+    Columns that are absent are skipped; `segment_labels` fixes the order of the Segment categories.
+    """
+    columns = {}
+    if 'Duration' in df.columns:
+        columns['Duration'] = compact_duration(df['Duration'])
+    if 'Data_Usage' in df.columns:
+        columns['Data_Usage'] = df['Data_Usage'].astype(np.float32)
+    if 'Call_Type' in df.columns and not isinstance(df['Call_Type'].dtype, pd.CategoricalDtype):
+        columns['Call_Type'] = df['Call_Type'].astype(call_type_dtype(df['Call_Type']))
+    if 'Hour' in df.columns:
+        columns['Hour'] = df['Hour'].astype(np.uint8)
+    if 'Segment' in df.columns and not isinstance(df['Segment'].dtype, pd.CategoricalDtype):
+        columns['Segment'] = pd.Categorical(df['Segment'], categories=segment_labels)
+    return df.assign(**columns) if columns else df
+
+
+def is_compact(df):
+    """True when `df` already has the canonical numeric and Call_Type dtypes (e.g. the columns of a mapped .tlog store)."""
+    expected = {'Duration': np.dtype(np.int32), 'Data_Usage': np.dtype(np.float32)}
+    return (all(df[name].dtype == dtype for name, dtype in expected.items() if name in df.columns)
+            and ('Call_Type' not in df.columns or isinstance(df['Call_Type'].dtype, pd.CategoricalDtype)))
+
+
+def bytes_per_row(df):
+    """Deep memory footprint of `df` divided by its row count."""
+    return df.memory_usage(deep=True, index=True).sum() / max(len(df), 1)
+
+
+# --- Source adaptation: exports name the columns and format the dates differently ---
+
+# Lower-cased source header -> canonical column
+COLUMN_ALIASES = {
+    'date': 'Date', 'timestamp': 'Date', 'datetime': 'Date', 'call_date': 'Date',
+    'duration': 'Duration', 'duration_seconds': 'Duration', 'duration_sec': 'Duration', 'duration_s': 'Duration',
+    'data_usage': 'Data_Usage', 'data_usage_mb': 'Data_Usage', 'data_mb': 'Data_Usage', 'usage_mb': 'Data_Usage',
+    'call_type': 'Call_Type', 'calltype': 'Call_Type',
+}
+REQUIRED_COLUMNS = ['Date', 'Duration', 'Data_Usage', 'Call_Type']
+
+# Tried in order on a sample; 'ISO8601' covers every YYYY-MM-DD[ HH:MM[:SS[.ffffff]]] variant
+DATE_FORMATS = ['ISO8601', '%m/%d/%Y', '%m/%d/%Y %H:%M', '%m/%d/%Y %H:%M:%S',
+                '%d/%m/%Y', '%d/%m/%Y %H:%M', '%d/%m/%Y %H:%M:%S', '%d.%m.%Y', '%Y/%m/%d']
+DATE_SAMPLE_ROWS = 1000
+DEDUPE_RATIO = 0.5  # parse unique strings only when at most this share of the sample is distinct
+
+
+def canonical_name(name):
+    """Canonical column for a source header (unknown headers are returned unchanged)."""
+    return COLUMN_ALIASES.get(str(name).strip().lower(), name)
+
+
+def normalize_columns(df):
+    """Renames aliased headers (Duration_Seconds, Data_Usage_MB, ...) to the canonical names."""
+    mapping = {name: canonical_name(name) for name in df.columns}
+    mapping = {source: target for source, target in mapping.items() if source != target}
+    return df.rename(columns=mapping) if mapping else df
+
+
+def missing_columns(columns, required=REQUIRED_COLUMNS):
+    """Required canonical columns not present among the (source) header names `columns`."""
+    present = {canonical_name(name) for name in columns}
+    return [name for name in required if name not in present]
+
+
+def sniff_date_format(values, sample_rows=DATE_SAMPLE_ROWS):
+    """First entry of DATE_FORMATS that parses every string in a sample of `values`, or None."""
+    sample = pd.Series(values[:sample_rows]).dropna().astype(str)
+    if sample.empty:
+        return None
+    for fmt in DATE_FORMATS:
+        try:
+            pd.to_datetime(sample, format=fmt)
+        except (ValueError, TypeError):
+            continue
+        return fmt
+    return None
+
+
+def parse_dates(values):
+    """
+    Vectorized Date parsing for any supported export: the format is sniffed on
+    a sample and applied explicitly (no per-element inference). Low-cardinality
+    columns (e.g. day-only dates) are factorized first so each distinct string
+    is parsed once; strings the sniffed format misses fall back to 'mixed'.
+    """
+    if pd.api.types.is_datetime64_any_dtype(values):
+        return values
+    values = pd.Series(values)
+    fmt = sniff_date_format(values) or 'mixed'
+
+    sample = values.iloc[:DATE_SAMPLE_ROWS]
+    if sample.nunique() <= DEDUPE_RATIO * max(len(sample), 1):
+        codes, uniques = pd.factorize(values)
+        parsed = _to_datetime(pd.Series(uniques, dtype=object), fmt).to_numpy()
+        result = parsed.take(codes, mode='clip') if len(parsed) else np.full(len(codes), 'NaT', 'datetime64[ns]')
+        result[codes < 0] = np.datetime64('NaT')
+        return pd.Series(result, index=values.index, name=values.name)
+    return _to_datetime(values, fmt)
+
+
+def _to_datetime(values, fmt):
+    try:
+        return pd.to_datetime(values, format=fmt)
+    except (ValueError, TypeError):
+        return pd.to_datetime(values, format='mixed')
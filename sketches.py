@@ -0,0 +1,277 @@
+"""
+Mergeable sketches for approximate answers over very large inputs.
+
+QuantileSketch
+    DDSketch-style log-bucket histogram: every value in (MIN_VALUE, MAX_VALUE]
+    lands in bucket ceil(log_gamma(x)), gamma = (1 + a) / (1 - a), so any
+    quantile estimate is within relative error `a` of a true sample value.
+    Values <= MIN_VALUE (zero usage) get their own exact bucket. A sketch
+    holds one histogram per group (Call_Type, hour); updates are one
+    vectorized log + bincount per chunk, merging is adding the counts.
+
+CountMinSketch / HeavyHitters
+    Count-min table (width e / epsilon, depth ln(1 / delta)): estimates never
+    undercount and overcount by more than epsilon x total with probability
+    1 - delta. HeavyHitters keeps the `top` keys with the largest estimates
+    (e.g. the busiest minutes) in O(top) extra memory.
+
+ApproxSummary bundles them for CDR frames: p50/p95/p99 of Duration and
+Data_Usage per Call_Type and per hour, plus the busiest minutes, built in one
+pass over in-memory data or chunk by chunk. The error bounds are constructor
+arguments (defaults overridable with TELECOM_SKETCH_ACCURACY / _EPSILON / _DELTA).
+"""
+import os
+import numpy as np
+import pandas as pd
+
+import kernel
+
+MEASURES = ['Duration', 'Data_Usage']
+QUANTILES = [0.5, 0.95, 0.99]
+MIN_VALUE = 1e-3
+MAX_VALUE = 1e9
+MINUTE_NS = 60 * 10 ** 9
+CANDIDATE_FACTOR = 50  # heavy-hitter candidates kept per reported key
+CMS_SEED = 20240601  # fixed, so sketches built in different processes can be merged
+
+DEFAULT_ACCURACY = float(os.environ.get('TELECOM_SKETCH_ACCURACY', 0.01))
+DEFAULT_EPSILON = float(os.environ.get('TELECOM_SKETCH_EPSILON', 1e-5))
+DEFAULT_DELTA = float(os.environ.get('TELECOM_SKETCH_DELTA', 0.01))
+
+
+class QuantileSketch:
+    def __init__(self, relative_accuracy=DEFAULT_ACCURACY, groups=1):
+        if not 0 < relative_accuracy < 1:
+            raise ValueError("relative_accuracy must be between 0 and 1")
+        self.relative_accuracy = relative_accuracy
+        self.gamma = (1 + relative_accuracy) / (1 - relative_accuracy)
+        self.log_gamma = np.log(self.gamma)
+        self.min_index = int(np.ceil(np.log(MIN_VALUE) / self.log_gamma))
+        self.buckets = int(np.ceil(np.log(MAX_VALUE) / self.log_gamma)) - self.min_index + 2  # + zero bucket
+        self.counts = np.zeros((groups, self.buckets), dtype=np.int64)
+
+    @property
+    def groups(self):
+        return self.counts.shape[0]
+
+    def resize(self, groups):
+        if groups > self.groups:
+            extra = np.zeros((groups - self.groups, self.buckets), dtype=np.int64)
+            self.counts = np.vstack([self.counts, extra])
+
+    def _bucket(self, values):
+        positive = values > MIN_VALUE
+        index = np.zeros(len(values), dtype=np.int64)
+        index[positive] = np.ceil(np.log(values[positive]) / self.log_gamma).astype(np.int64) - self.min_index + 1
+        return np.clip(index, 0, self.buckets - 1)
+
+    def add(self, values, groups=None):
+        """Adds `values` (NaNs ignored); `groups` are per-value group numbers (default group 0)."""
+        values = np.asarray(values, dtype=np.float64)
+        valid = ~np.isnan(values)
+        bucket = self._bucket(values[valid])
+        if groups is None:
+            self.counts[0] += np.bincount(bucket, minlength=self.buckets)
+            return self
+        groups = np.asarray(groups, dtype=np.int64)[valid]
+        flat = np.bincount(groups * self.buckets + bucket, minlength=self.groups * self.buckets)
+        self.counts += flat.reshape(self.groups, self.buckets)
+        return self
+
+    def merge(self, other):
+        if other.relative_accuracy != self.relative_accuracy:
+            raise ValueError("Cannot merge sketches built with different accuracies")
+        self.resize(other.groups)
+        self.counts[:other.groups] += other.counts
+        return self
+
+    def _value(self, bucket):
+        if bucket == 0:
+            return 0.0
+        return 2 * self.gamma ** (bucket - 1 + self.min_index) / (self.gamma + 1)
+
+    def quantiles(self, quantiles=QUANTILES, group=None):
+        """Estimates for one group (None = all groups combined); NaN when the group is empty."""
+        counts = self.counts.sum(axis=0) if group is None else self.counts[group]
+        total = counts.sum()
+        if not total:
+            return [float('nan')] * len(quantiles)
+        cumulative = np.cumsum(counts)
+        return [self._value(int(np.searchsorted(cumulative, q * (total - 1), side='right')))
+                for q in quantiles]
+
+    def quantile_table(self, quantiles=QUANTILES):
+        """Estimates for every group at once: a (groups, len(quantiles)) array, NaN rows for empty groups."""
+        cumulative = np.cumsum(self.counts, axis=1)
+        total = cumulative[:, -1]
+        table = np.full((self.groups, len(quantiles)), np.nan)
+        for column, q in enumerate(quantiles):
+            bucket = (cumulative <= (q * (total - 1))[:, None]).sum(axis=1)
+            values = np.where(bucket == 0, 0.0,
+                              2 * self.gamma ** (bucket - 1 + self.min_index) / (self.gamma + 1))
+            table[:, column] = np.where(total > 0, values, np.nan)
+        return table
+
+    def count(self, group=None):
+        return int(self.counts.sum() if group is None else self.counts[group].sum())
+
+
+class CountMinSketch:
+    def __init__(self, epsilon=DEFAULT_EPSILON, delta=DEFAULT_DELTA, seed=CMS_SEED):
+        self.epsilon = epsilon
+        self.delta = delta
+        self.bits = int(np.ceil(np.log2(np.e / epsilon)))
+        self.width = 1 << self.bits
+        self.depth = int(np.ceil(np.log(1 / delta)))
+        rng = np.random.default_rng(seed)
+        self.multipliers = rng.integers(1, 2 ** 63, size=self.depth, dtype=np.uint64) | np.uint64(1)
+        self.offsets = rng.integers(0, 2 ** 63, size=self.depth, dtype=np.uint64)
+        self.table = np.zeros((self.depth, self.width), dtype=np.int64)
+        self.total = 0
+
+    def _hash(self, keys):
+        """Multiply-shift hash of int64 keys, one row per table row."""
+        keys = np.asarray(keys, dtype=np.int64).view(np.uint64)
+        mixed = keys[None, :] * self.multipliers[:, None] + self.offsets[:, None]  # wraps mod 2**64
+        return (mixed >> np.uint64(64 - self.bits)).astype(np.int64)
+
+    def add(self, keys, counts=None):
+        """Adds distinct `keys` with their `counts` (default 1 each)."""
+        counts = np.ones(len(keys), dtype=np.int64) if counts is None else np.asarray(counts, dtype=np.int64)
+        for row, cells in enumerate(self._hash(keys)):
+            self.table[row] += np.bincount(cells, weights=counts, minlength=self.width).astype(np.int64)
+        self.total += int(counts.sum())
+        return self
+
+    def estimate(self, keys):
+        cells = self._hash(keys)
+        return self.table[np.arange(self.depth)[:, None], cells].min(axis=0)
+
+    def merge(self, other):
+        if (other.width, other.depth) != (self.width, self.depth):
+            raise ValueError("Cannot merge count-min sketches of different shapes")
+        self.table += other.table
+        self.total += other.total
+        return self
+
+
+class HeavyHitters:
+    """
+    The `top` keys with the largest count-min estimates. `pool` (default
+    CANDIDATE_FACTOR x top) candidates are tracked, so a key that is only
+    moderately busy in each of several merged parts still reaches the top.
+    """
+
+    def __init__(self, sketch, top=10, pool=None):
+        self.sketch = sketch
+        self.top = top
+        self.pool = pool or top * CANDIDATE_FACTOR
+        self.keys = np.zeros(0, dtype=np.int64)
+
+    def _refresh(self, candidates):
+        candidates = np.union1d(self.keys, candidates)
+        estimates = self.sketch.estimate(candidates)
+        keep = np.lexsort((candidates, -estimates))[:self.pool]
+        self.keys = candidates[keep]
+
+    def update(self, keys):
+        unique, counts = np.unique(np.asarray(keys, dtype=np.int64), return_counts=True)
+        self.sketch.add(unique, counts)
+        self._refresh(unique)
+        return self
+
+    def merge(self, other):
+        self.sketch.merge(other.sketch)
+        self._refresh(other.keys)
+        return self
+
+    def items(self):
+        """(key, estimated count) pairs of the `top` keys, largest first."""
+        keys = self.keys[:self.top]
+        return list(zip(keys.tolist(), self.sketch.estimate(keys).tolist()))
+
+
+class ApproxSummary:
+    """Percentile and heavy-hitter sketches of cleaned CDR frames, fed in one pass."""
+
+    def __init__(self, relative_accuracy=DEFAULT_ACCURACY, epsilon=DEFAULT_EPSILON, delta=DEFAULT_DELTA, top=10):
+        self.relative_accuracy = relative_accuracy
+        self.call_types = []
+        self.by_type = {measure: QuantileSketch(relative_accuracy, 0) for measure in MEASURES}
+        self.by_hour = {measure: QuantileSketch(relative_accuracy, 24) for measure in MEASURES}
+        self.minutes = HeavyHitters(CountMinSketch(epsilon, delta), top)
+        self.rows = 0
+
+    def _type_groups(self, call_types):
+        """Call_Type column -> group numbers, registering unseen labels."""
+        if not isinstance(call_types.dtype, pd.CategoricalDtype):
+            call_types = call_types.astype('category')
+        lookup = []
+        for label in call_types.cat.categories:
+            if label not in self.call_types:
+                self.call_types.append(label)
+            lookup.append(self.call_types.index(label))
+        for sketch in self.by_type.values():
+            sketch.resize(len(self.call_types))
+        return np.asarray(lookup, dtype=np.int64)[call_types.cat.codes.to_numpy()]
+
+    def update(self, df, valid=None):
+        """Folds a cleaned frame (Date, Duration, Data_Usage, Call_Type) into the sketches (its `valid` rows, if given)."""
+        rows = len(df) if valid is None else int(np.count_nonzero(valid))
+        if not rows:
+            return self
+        groups = kernel.masked(self._type_groups(df['Call_Type']), valid)
+        dates = kernel.masked(np.asarray(df['Date'], dtype='datetime64[ns]'), valid)
+        epoch = dates.view(np.int64)
+        hours = kernel.hour_of(dates)
+        for measure in MEASURES:
+            values = kernel.masked(df[measure], valid).astype(np.float64)
+            self.by_type[measure].add(values, groups)
+            self.by_hour[measure].add(values, hours)
+        self.minutes.update(epoch // MINUTE_NS)
+        self.rows += rows
+        return self
+
+    def merge(self, other):
+        """Adds another summary built with the same error bounds (e.g. from a parallel worker)."""
+        for label in other.call_types:
+            if label not in self.call_types:
+                self.call_types.append(label)
+        for measure in MEASURES:
+            remapped = QuantileSketch(other.relative_accuracy, len(self.call_types))
+            for group, label in enumerate(other.call_types):
+                remapped.counts[self.call_types.index(label)] = other.by_type[measure].counts[group]
+            self.by_type[measure].merge(remapped)
+            self.by_hour[measure].merge(other.by_hour[measure])
+        self.minutes.merge(other.minutes)
+        self.rows += other.rows
+        return self
+
+    def overall(self, measure, quantiles=QUANTILES):
+        """{'p50': ..., 'p95': ..., 'p99': ...} over every row."""
+        return dict(zip(_labels(quantiles), self.by_type[measure].quantiles(quantiles)))
+
+    def percentiles(self, measure, by='Call_Type', quantiles=QUANTILES):
+        """Percentile table of `measure` per Call_Type or per Hour (empty groups omitted)."""
+        sketch = self.by_type[measure] if by == 'Call_Type' else self.by_hour[measure]
+        labels = self.call_types if by == 'Call_Type' else list(range(24))
+        rows = {label: [sketch.count(group)] + sketch.quantiles(quantiles, group)
+                for group, label in enumerate(labels) if sketch.count(group)}
+        table = pd.DataFrame.from_dict(rows, orient='index', columns=['count'] + _labels(quantiles))
+        table.index.name = by
+        return table.sort_index()
+
+    def busiest_minutes(self):
+        """Estimated calls of the busiest minutes, largest first."""
+        items = self.minutes.items()
+        index = pd.DatetimeIndex([pd.Timestamp(key * MINUTE_NS) for key, _ in items], name='Minute')
+        return pd.Series([count for _, count in items], index=index, name='calls (est.)')
+
+    def describe_bounds(self):
+        cms = self.minutes.sketch
+        return (f"quantiles within ±{self.relative_accuracy:.1%} (relative); minute counts overestimated by at most "
+                f"{cms.epsilon * cms.total:,.0f} calls with {1 - cms.delta:.0%} probability")
+
+
+def _labels(quantiles):
+    return [f"p{q * 100:g}" for q in quantiles]
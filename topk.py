@@ -0,0 +1,152 @@
+"""
+Top-K rows by a score, in linear time and O(K) memory.
+
+    top_k(df, 100, by='Data_Usage')     # in memory: one argpartition, then a sort of K rows
+
+    best = TopK(5, by='anomaly')        # chunked / parallel runs: bounded min-heap of K rows
+    for chunk in chunks:
+        best.update(chunk)
+    best.merge(other_worker_topk)
+    best.to_frame()
+
+Rankings: 'Data_Usage', 'Duration', 'anomaly', which is the sum of both
+measures scaled to their generated range (Duration / 3600s + Data_Usage / 500MB),
+or 'zscore', the Z_Score column that anomaly.AnomalyScorer results are stored in.
+Ties go to the earlier row, so every path returns the same rows.
+"""
+import io
+import heapq
+import numpy as np
+import pandas as pd
+
+import schema
+import anomaly
+
+ANOMALY_SCALES = {'Duration': 3600.0, 'Data_Usage': 500.0}
+RANKINGS = ['anomaly', 'zscore', 'Data_Usage', 'Duration']
+RANK_LABELS = {'anomaly': 'Anomaly score', 'zscore': 'Robust z-score', 'Data_Usage': 'Data usage',
+               'Duration': 'Duration'}
+
+
+def scores(df, by='anomaly'):
+    """float64 ranking score of every row."""
+    if by == 'anomaly':
+        return sum(df[column].to_numpy(dtype=np.float64) / scale for column, scale in ANOMALY_SCALES.items())
+    if by == 'zscore':
+        return df[anomaly.SCORE_COLUMN].to_numpy(dtype=np.float64)
+    if by not in RANKINGS:
+        raise ValueError(f"Unknown ranking {by!r}; expected one of {RANKINGS}")
+    return df[by].to_numpy(dtype=np.float64)
+
+
+def top_positions(values, k):
+    """
+    Positions of the k largest values, best first (ties: lower position first).
+    argpartition finds the k-th value in O(n); only the <= k winners are sorted.
+    """
+    n = len(values)
+    if k <= 0 or n == 0:
+        return np.zeros(0, dtype=np.int64)
+    if k < n:
+        threshold = np.partition(values, n - k)[n - k]
+        above = np.flatnonzero(values > threshold)
+        ties = np.flatnonzero(values == threshold)[:k - len(above)]
+        candidates = np.concatenate([above, ties])
+    else:
+        candidates = np.arange(n)
+    return candidates[np.lexsort((candidates, -values[candidates]))]
+
+
+def top_k(df, k, by='anomaly'):
+    """The k highest-ranked rows of `df`, best first."""
+    return df.iloc[top_positions(scores(df, by), k)]
+
+
+class TopK:
+    """
+    Running top-K over a stream of chunks: a min-heap of (score, -seq) keys,
+    so the weakest kept row is evicted in O(log K). Each chunk is first cut
+    down to its own top K with argpartition, so per-chunk cost stays linear.
+    `seq` is the row's position in the stream and breaks ties.
+    """
+
+    def __init__(self, k, by='anomaly'):
+        if by not in RANKINGS:
+            raise ValueError(f"Unknown ranking {by!r}; expected one of {RANKINGS}")
+        self.k = k
+        self.by = by
+        self.seen = 0
+        self.columns = None
+        self.heap = []  # (score, -seq, row tuple)
+
+    def _push(self, score, seq, row):
+        entry = (score, -seq, row)
+        if len(self.heap) < self.k:
+            heapq.heappush(self.heap, entry)
+        elif entry[:2] > self.heap[0][:2]:
+            heapq.heapreplace(self.heap, entry)
+
+    def update(self, df):
+        """Offers every row of `df` (the next rows of the stream)."""
+        if self.columns is None:
+            self.columns = list(df.columns)
+        values = scores(df, self.by)
+        if len(self.heap) == self.k and self.k:
+            # only rows that can beat the current minimum are worth a heap operation
+            floor = self.heap[0][0]
+            candidates = np.flatnonzero(values >= floor)
+            positions = candidates[top_positions(values[candidates], self.k)]
+        else:
+            positions = top_positions(values, self.k)
+        rows = df.iloc[positions]
+        for position, row in zip(positions, rows.itertuples(index=True, name=None)):
+            self._push(float(values[position]), self.seen + int(position), row)
+        self.seen += len(df)
+        return self
+
+    def merge(self, other):
+        """Adds another TopK that covered the rows after this one (e.g. from a parallel worker)."""
+        if self.columns is None:
+            self.columns = other.columns
+        for score, neg_seq, row in other.heap:
+            self._push(score, self.seen - neg_seq, row)
+        self.seen += other.seen
+        return self
+
+    def shift_index(self, offset):
+        """Adds `offset` to the index labels of the kept rows (a byte range parsed with its own RangeIndex)."""
+        self.heap = [(score, neg_seq, (row[0] + offset,) + row[1:]) for score, neg_seq, row in self.heap]
+        return self
+
+    def to_frame(self):
+        """The kept rows, best first, in the compact schema (original index kept)."""
+        entries = sorted(self.heap, key=lambda entry: (-entry[0], -entry[1]))
+        if self.columns is None:
+            return pd.DataFrame()
+        rows = [entry[2] for entry in entries]
+        frame = pd.DataFrame([row[1:] for row in rows], columns=self.columns,
+                             index=[row[0] for row in rows])
+        return schema.compact_frame(frame)
+
+    def to_dict(self):
+        """JSON-serialisable snapshot (see from_dict)."""
+        entries = sorted(self.heap, key=lambda entry: (-entry[0], -entry[1]))
+        return {
+            'k': self.k,
+            'by': self.by,
+            'seen': self.seen,
+            'seq': [-entry[1] for entry in entries],
+            'rows': None if self.columns is None else self.to_frame().to_csv(index=True),
+        }
+
+    @classmethod
+    def from_dict(cls, data):
+        best = cls(data['k'], data['by'])
+        best.seen = data['seen']
+        if data['rows'] is not None:
+            frame = schema.compact_frame(pd.read_csv(io.StringIO(data['rows']), index_col=0, parse_dates=['Date']))
+            best.columns = list(frame.columns)
+            values = scores(frame, best.by)
+            for value, seq, row in zip(values, data['seq'], frame.itertuples(index=True, name=None)):
+                best._push(float(value), seq, row)
+        return best
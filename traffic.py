@@ -0,0 +1,233 @@
+"""
+Traffic engineering of CDRs: call attempts and offered load per interval,
+and the daily busy hour with its BHCA and Erlangs, per Call_Type.
+
+    bins = traffic.TrafficBins('15min').update(df)    # or chunk by chunk; mergeable
+    bins.busy_hours()                                 # one row per day and Call_Type (+ 'All')
+    bins.intervals('Roaming')                         # calls and Erlangs of every 15-minute interval
+
+Call start times are binned on a midnight-aligned grid of 1 min, 15 min or
+1 h intervals, kept per day and only for the days that have calls (a stray
+1971 date next to 2024 data adds one day, not 53 years of empty bins). One
+np.bincount per chunk does the counting, and a second one with Duration as
+weights gives the call-seconds. So the cost is linear in rows plus bins of
+the days present. A call's whole Duration counts toward the interval it starts
+in. The offered load in Erlangs is those call-seconds divided by the interval
+length.
+
+The busy hour of a day is the 60-minute window inside that day with the most offered traffic
+(the daily peak full hour of ITU-T E.500). With sub-hour bins the window
+slides in steps of one bin and is read from prefix sums. BHCA is the number
+of call attempts started inside that window. Trunks are dimensioned from
+these per-day values, which the 24-bucket hour-of-day histogram of main.py
+averages away.
+"""
+import numpy as np
+import pandas as pd
+
+import kernel
+
+RESOLUTIONS = {'1min': 60, '15min': 900, '1h': 3600}
+DEFAULT_RESOLUTION = '15min'
+ALL = 'All'
+NS = 10 ** 9
+HOUR_S = 3600
+DAY_S = 86400
+DENSE_BINS = 1 << 22  # a chunk spanning fewer bins than this (or than its rows) is counted over its whole span
+
+
+class TrafficBins:
+    def __init__(self, resolution=DEFAULT_RESOLUTION):
+        if resolution not in RESOLUTIONS:
+            raise ValueError(f"Unknown resolution {resolution!r}; expected one of {list(RESOLUTIONS)}")
+        self.resolution = resolution
+        self.seconds = RESOLUTIONS[resolution]
+        self.bins_per_day = DAY_S // self.seconds
+        self.call_types = []
+        # days since the epoch -> (calls, call_seconds), each [call type, bin of the day];
+        # only days that have calls are kept, so stray dates years apart cost two days, not the gap
+        self.days = {}
+        self.changed = set()  # days updated since the bins were created or loaded (incremental saves only these)
+
+    def _day(self, day):
+        """(calls, call_seconds) of one day, created or grown to one row per known Call_Type."""
+        calls, call_seconds = self.days.get(day, (None, None))
+        if calls is None or len(calls) < len(self.call_types):
+            shape = (len(self.call_types), self.bins_per_day)
+            grown = np.zeros(shape, dtype=np.int64), np.zeros(shape, dtype=np.float64)
+            if calls is not None:
+                grown[0][:len(calls)], grown[1][:len(calls)] = calls, call_seconds
+            calls, call_seconds = self.days[day] = grown
+        return calls, call_seconds
+
+    def _row(self, label):
+        if label not in self.call_types:
+            self.call_types.append(label)
+        return self.call_types.index(label)
+
+    def _type_groups(self, call_types):
+        """Call_Type column -> row numbers of the grid, registering unseen labels."""
+        if not isinstance(call_types.dtype, pd.CategoricalDtype):
+            call_types = call_types.astype('category')
+        lookup = np.asarray([self._row(label) for label in call_types.cat.categories], dtype=np.int64)
+        return lookup[call_types.cat.codes.to_numpy()]
+
+    def update(self, df, valid=None):
+        """Folds a cleaned frame (Date, Duration, Call_Type) into the bins (its `valid` rows, if given)."""
+        if not len(df) or (valid is not None and not valid.any()):
+            return self
+        groups = kernel.masked(self._type_groups(df['Call_Type']), valid)
+        types = len(self.call_types)
+        epoch = kernel.masked(np.asarray(df['Date'], dtype='datetime64[ns]').view(np.int64), valid)
+        slots = epoch // (self.seconds * NS)
+        first = int(slots.min()) // self.bins_per_day
+        slots = slots - first * self.bins_per_day
+        span = int(slots.max()) // self.bins_per_day + 1
+        days = first + np.arange(span)
+        if span * self.bins_per_day * types > max(len(slots), DENSE_BINS):
+            # dates far apart (e.g. a stray 1971 row): count only the days present, renumbered 0..n-1
+            day = slots // self.bins_per_day
+            present = np.flatnonzero(np.bincount(day))
+            lookup = np.zeros(span, dtype=np.int64)
+            lookup[present] = np.arange(len(present))
+            slots -= (day - lookup[day]) * self.bins_per_day
+            days, span = first + present, len(present)
+        flat = slots * types + groups  # [day, bin, call type]
+        shape = (span, self.bins_per_day, types)
+        calls = np.bincount(flat, minlength=np.prod(shape)).reshape(shape)
+        call_seconds = np.bincount(flat, weights=kernel.masked(df['Duration'], valid).astype(np.float64),
+                                   minlength=np.prod(shape)).reshape(shape)
+        for day, day_calls, day_seconds in zip(days, calls, call_seconds):
+            if day_calls.any():
+                target_calls, target_seconds = self._day(int(day))
+                target_calls += day_calls.T
+                target_seconds += day_seconds.T
+                self.changed.add(int(day))
+        return self
+
+    def merge(self, other):
+        """Adds bins of the same resolution (e.g. from a parallel worker)."""
+        if other.resolution != self.resolution:
+            raise ValueError("Cannot merge traffic bins of different resolutions")
+        rows = [self._row(label) for label in other.call_types]
+        for day, (calls, call_seconds) in other.days.items():
+            target_calls, target_seconds = self._day(day)
+            target_calls[rows[:len(calls)]] += calls
+            target_seconds[rows[:len(calls)]] += call_seconds
+            self.changed.add(day)
+        return self
+
+    def to_dict(self, days=True):
+        """
+        JSON-serialisable snapshot (see from_dict). With days=False only the list of
+        days is included and the per-day arrays are left to day_array() / set_day().
+        """
+        day_numbers = sorted(self.days)
+        data = {
+            'resolution': self.resolution,
+            'call_types': [str(label) for label in self.call_types],
+            'days': day_numbers,
+        }
+        if days:
+            data['calls'] = [self._day(day)[0].tolist() for day in day_numbers]
+            data['call_seconds'] = [self._day(day)[1].tolist() for day in day_numbers]
+        return data
+
+    @classmethod
+    def from_dict(cls, data):
+        """Bins from to_dict(); without the arrays (days=False) only the call types are restored."""
+        bins = cls(data['resolution'])
+        bins.call_types = list(data['call_types'])
+        if 'first_day' in data:
+            # snapshots before the per-day layout: one dense [call type, bin] grid from first_day on
+            if data['first_day'] is not None:
+                calls = np.asarray(data['calls'], dtype=np.int64).reshape(len(bins.call_types), -1, bins.bins_per_day)
+                call_seconds = np.asarray(data['call_seconds'], dtype=np.float64).reshape(calls.shape)
+                for offset in np.flatnonzero(calls.sum(axis=(0, 2))):
+                    bins.days[data['first_day'] + int(offset)] = (calls[:, offset].copy(),
+                                                                  call_seconds[:, offset].copy())
+        elif 'calls' in data:
+            for day, calls, call_seconds in zip(data['days'], data['calls'], data['call_seconds']):
+                bins.days[day] = (np.asarray(calls, dtype=np.int64), np.asarray(call_seconds, dtype=np.float64))
+        bins.changed = set(bins.days)
+        return bins
+
+    def day_array(self, day):
+        """One day as a [2, call type, bin] float64 array: calls, then call-seconds (counts stay exact)."""
+        calls, call_seconds = self._day(day)
+        return np.stack([calls.astype(np.float64), call_seconds])
+
+    def set_day(self, day, array):
+        """Restores a day saved with day_array()."""
+        self.days[day] = (array[0].astype(np.int64), np.array(array[1], dtype=np.float64))
+
+    # --- Views ---
+
+    def _grid(self):
+        """(sorted days, calls, call_seconds) with the arrays stacked to [day, call type, bin]."""
+        days = sorted(self.days)
+        calls = np.stack([self._day(day)[0] for day in days])
+        call_seconds = np.stack([self._day(day)[1] for day in days])
+        return days, calls, call_seconds
+
+    def _rows(self, call_type, calls, call_seconds):
+        """[day, bin] calls and call_seconds for one Call_Type, or every type for ALL."""
+        if call_type == ALL:
+            return calls.sum(axis=1), call_seconds.sum(axis=1)
+        row = self.call_types.index(call_type)
+        return calls[:, row], call_seconds[:, row]
+
+    def intervals(self, call_type=ALL):
+        """Calls and offered Erlangs of every interval of the days seen (days without calls are skipped)."""
+        if not self.days:
+            return pd.DataFrame({'calls': [], 'erlangs': []}, index=pd.DatetimeIndex([], name='Interval'))
+        days, calls, call_seconds = self._grid()
+        calls, call_seconds = self._rows(call_type, calls, call_seconds)
+        starts = np.asarray(days, dtype=np.int64)[:, None] * DAY_S + np.arange(self.bins_per_day) * self.seconds
+        index = pd.DatetimeIndex(pd.to_datetime(starts.ravel(), unit='s'), name='Interval')
+        return pd.DataFrame({'calls': calls.ravel(), 'erlangs': call_seconds.ravel() / self.seconds}, index=index)
+
+    def busy_hours(self):
+        """
+        Daily busy hour per Call_Type and for ALL types together: Busy_Hour (window
+        start), Erlangs and BHCA of that hour, and the day's Calls. Empty days are omitted.
+        """
+        if not self.days:
+            return pd.DataFrame(columns=['Busy_Hour', 'Erlangs', 'BHCA', 'Calls'],
+                                index=pd.MultiIndex.from_arrays([[], []], names=['Day', 'Call_Type']))
+        window = HOUR_S // self.seconds
+        day_numbers, all_calls, all_call_seconds = self._grid()
+        day_starts = np.asarray(day_numbers, dtype=np.int64) * DAY_S
+        frames = []
+        for call_type in sorted(self.call_types) + [ALL]:
+            calls, call_seconds = self._rows(call_type, all_calls, all_call_seconds)
+            load = np.zeros((len(day_starts), self.bins_per_day + 1))
+            np.cumsum(call_seconds, axis=1, out=load[:, 1:])
+            attempts = np.zeros((len(day_starts), self.bins_per_day + 1), dtype=np.int64)
+            np.cumsum(calls, axis=1, out=attempts[:, 1:])
+            hour_load = load[:, window:] - load[:, :-window]
+            start = hour_load.argmax(axis=1)
+            days = np.arange(len(day_starts))
+            frame = pd.DataFrame({
+                'Day': pd.to_datetime(day_starts, unit='s'),
+                'Call_Type': call_type,
+                'Busy_Hour': pd.to_datetime(day_starts + start * self.seconds, unit='s'),
+                'Erlangs': hour_load[days, start] / HOUR_S,
+                'BHCA': attempts[days, start + window] - attempts[days, start],
+                'Calls': attempts[:, -1],
+            })
+            frames.append(frame[frame['Calls'] > 0])
+        return pd.concat(frames, ignore_index=True).set_index(['Day', 'Call_Type']).sort_index()
+
+    def summary(self, busy_hours=None):
+        """Per Call_Type: busy-hour Erlangs and BHCA, peak and mean over the days seen."""
+        busy_hours = self.busy_hours() if busy_hours is None else busy_hours
+        grouped = busy_hours.groupby(level='Call_Type', sort=False)
+        table = pd.DataFrame({
+            'days': grouped.size(),
+            'peak_erlangs': grouped['Erlangs'].max(),
+            'mean_bh_erlangs': grouped['Erlangs'].mean(),
+            'peak_bhca': grouped['BHCA'].max(),
+            'mean_bhca': grouped['BHCA'].mean(),
+        })
+        return table.reindex([t for t in sorted(self.call_types) + [ALL] if t in table.index])